@@ -1,9 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends, Path, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
+from datetime import datetime
 
 from app.database import get_db
 from app.services.data_fetcher import DataFetcher
+from app.services.stock_index import stock_index
 from app.utils.redis_client import get_cache, set_cache
 from app.schemas.stock import StockDetailResponse, StockKlineResponse, StockKlineRequest
 from app.config import settings
@@ -16,15 +18,13 @@ async def get_stock_detail(
     db: AsyncSession = Depends(get_db)
 ):
     """获取个股详情"""
-    from app.models.stock import Stock
     from app.models.scan_result import WeekendScanResult, DailyPool
     from app.models.signal import TradeSignal
     from sqlalchemy import select, and_, func
 
-    # 获取股票基本信息
-    stmt = select(Stock).where(Stock.code == code)
-    result = await db.execute(stmt)
-    stock = result.scalar_one_or_none()
+    # 获取股票基本信息（内存索引）
+    await stock_index.ensure_loaded(db)
+    stock = stock_index.get(code)
 
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
@@ -65,9 +65,12 @@ async def get_stock_detail(
     latest_price = None
 
     return StockDetailResponse(
-        code=stock.code,
-        name=stock.name,
-        market=stock.market,
+        code=stock['code'],
+        name=stock['name'],
+        market=stock['market'],
+        board=stock['board'],
+        list_date=stock['list_date'],
+        is_st=stock['is_st'],
         latest_price=latest_price,
         in_weekend_pool=in_weekend_pool,
         in_daily_pool=in_daily_pool,
@@ -81,14 +84,13 @@ async def get_stock_klines(
     db: AsyncSession = Depends(get_db)
 ):
     """获取个股K线数据"""
-    from app.models.stock import Stock, DailyKline, WeeklyKline, Kline120min
+    from app.models.stock import DailyKline, WeeklyKline, Kline120min
     from sqlalchemy import select, and_
-    from datetime import datetime, timedelta
+    from datetime import timedelta
 
     # 验证股票是否存在
-    stmt = select(Stock).where(Stock.code == code)
-    result = await db.execute(stmt)
-    stock = result.scalar_one_or_none()
+    await stock_index.ensure_loaded(db)
+    stock = stock_index.get(code)
 
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
@@ -189,8 +191,8 @@ async def get_stock_klines(
         raise HTTPException(status_code=400, detail="Invalid kline type")
 
     return StockKlineResponse(
-        code=stock.code,
-        name=stock.name,
+        code=stock['code'],
+        name=stock['name'],
         type=request.type,
         data=data
     )
\ No newline at end of file
@@ -4,6 +4,7 @@ from typing import Optional
 
 from app.database import get_db
 from app.services.weekend_scanner import WeekendScanner
+from app.services.threshold_screen import ThresholdScreen
 from app.utils.redis_client import get_redis
 from app.schemas.signal import WeekendScanResponse, WeekendScanResult
 
@@ -28,13 +29,19 @@ async def get_latest_weekend_scan(db: AsyncSession = Depends(get_db)):
     )
 
 @router.post("/trigger")
-async def trigger_weekend_scan(db: AsyncSession = Depends(get_db)):
-    """手动触发周末扫描"""
+async def trigger_weekend_scan(
+    mode: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """手动触发周末扫描（mode: fetch / local / sql / threshold / auto，默认按配置）"""
+    if mode is not None and mode not in ('fetch', 'local', 'sql', 'threshold', 'auto'):
+        raise HTTPException(status_code=400, detail="Invalid mode parameter")
+
     redis = await get_redis()
     scanner = WeekendScanner(db, redis)
 
     try:
-        result = await scanner.scan_all_stocks()
+        result = await scanner.scan_all_stocks(mode)
         return {
             "message": "Weekend scan completed successfully",
             "scan_date": result['scan_date'],
@@ -45,6 +52,21 @@ async def trigger_weekend_scan(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Scan failed: {str(e)}")
 
+@router.get("/near-qualifying")
+async def get_near_qualifying(
+    margin: Optional[float] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """盘中即将满足周末扫描条件的股票（收盘价距预计算阈值不超过 margin）"""
+    if margin is not None and not 0 < margin < 1:
+        raise HTTPException(status_code=400, detail="Invalid margin parameter")
+
+    try:
+        results = await ThresholdScreen(db).near_qualifying(margin)
+        return {"count": len(results), "results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to check thresholds: {str(e)}")
+
 @router.get("/history")
 async def get_weekend_scan_history(
     page: int = 1,
@@ -16,6 +16,20 @@ class Settings(BaseSettings):
 
     # 数据源配置
     tushare_token: Optional[str] = None
+    data_provider: str = "akshare"  # akshare / synthetic
+
+    # 合成数据源配置（离线运行与压测）
+    synthetic_stock_count: int = 5000
+    synthetic_years: int = 10
+    synthetic_seed: int = 20240101
+    synthetic_end_date: Optional[str] = None  # YYYY-MM-DD，默认今天
+
+    # 上游响应录制/回放配置
+    data_capture_mode: str = "off"  # off / record / replay
+    data_archive_dir: str = "data/archive"
+    data_archive_session: Optional[str] = None  # 录制默认当天日期，回放默认最近一次
+    data_replay_latency_ms: float = 0.0  # 回放时模拟的上游延迟
+    data_replay_fallback: bool = False  # 回放未命中时是否请求真实数据源
 
     # 任务调度配置
     weekend_scan_hour: int = 20
@@ -25,6 +39,58 @@ class Settings(BaseSettings):
 
     # 并行处理配置
     max_workers: int = 8
+    scan_item_timeout: float = 120.0  # 单只股票处理超时（秒）
+    scan_processes: int = 0  # 扫描计算进程数，0 表示在主进程内计算
+    scan_batch_size: int = 500  # 每批交给子进程的股票数
+
+    # AKShare调用线程池配置
+    akshare_max_workers: int = 16  # 线程池大小
+    akshare_timeout: float = 30.0  # 单次调用超时（秒）
+
+    # 上游请求限流配置（令牌桶 + AIMD并发控制）
+    upstream_rate_limit: float = 20.0  # 每秒请求数
+    upstream_burst: int = 40  # 令牌桶容量
+    upstream_initial_concurrency: int = 8
+    upstream_min_concurrency: int = 1
+    upstream_max_concurrency: int = 16
+
+    # 重试与熔断配置
+    retry_max_delay: float = 10.0  # 单次重试退避上限（秒）
+    scan_retry_budget: int = 200  # 一次扫描/同步内的重试总次数
+    circuit_breaker_error_threshold: float = 0.5  # 窗口内错误率达到该值时熔断
+    circuit_breaker_min_requests: int = 20  # 窗口内请求数达到该值才判断
+    circuit_breaker_window: float = 60.0  # 统计窗口（秒）
+    circuit_breaker_open_seconds: float = 30.0  # 熔断后多久进入半开
+    circuit_breaker_half_open_calls: int = 3  # 半开状态的试探请求数
+
+    # 全市场行情快照刷新周期（秒）
+    spot_snapshot_ttl: int = 60
+
+    # 股票索引（代码 -> 名称/市场/板块等）从库中重新加载的周期（秒）
+    stock_index_ttl: int = 86400
+
+    # 每日更新时用库中日线合成本周周线（不再逐只请求周线接口）
+    weekly_from_daily: bool = True
+
+    # 周末扫描数据来源: fetch（逐只获取周线）/ local（只读 weekly_klines）/
+    # sql（数据库窗口函数计算均线，只返回通过的股票）/ threshold（快照对比预计算阈值，阈值附近的完整计算）/
+    # auto（本周已有周线的股票占比不低于 local_scan_min_coverage 时用 local）
+    weekend_scan_mode: str = "auto"
+    local_scan_min_coverage: float = 0.95
+    threshold_margin: float = 0.02  # 与阈值相差不超过该比例的股票需要完整计算
+    threshold_alert_margin: float = 0.03  # 盘中收盘价距阈值不超过该比例时提示即将满足条件
+
+    # 本地K线存储配置（Parquet）
+    bar_store_enabled: bool = True
+    bar_store_dir: str = "data/bars"
+
+    # 技术指标计算后端: pandas / numpy / talib（未安装 TA-Lib 时回退到 numpy）
+    indicator_backend: str = "pandas"
+
+    # 指标结果缓存（进程内LRU，可选写入Redis）
+    indicator_cache_size: int = 20000
+    indicator_cache_redis: bool = False
+    indicator_cache_ttl: int = 604800  # Redis中保留7天
 
     # 日志配置
     log_level: str = "INFO"
@@ -33,6 +99,7 @@ class Settings(BaseSettings):
     cache_ttl_daily: int = 86400  # 24小时
     cache_ttl_120min: int = 7200   # 2小时
     cache_ttl_weekend: int = 604800  # 7天
+    indicator_state_ttl: int = 2592000  # 增量指标状态保留30天，过期后从库中重建
 
     # 股票筛选参数
     ma_period_weekly: int = 233
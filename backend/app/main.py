@@ -8,6 +8,8 @@ from dotenv import load_dotenv
 from app.database import engine, Base
 from app.api import weekend_scan, daily_pool, signals, stocks
 from app.scheduler.jobs import setup_scheduler
+from app.utils.executor import shutdown_executor
+from app.utils.process_pool import warm_up_process_pool, shutdown_process_pool
 
 load_dotenv()
 
@@ -17,12 +19,17 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    # 预先启动扫描计算进程（SCAN_PROCESSES > 0 时）
+    await warm_up_process_pool()
+
     # 启动定时任务
     setup_scheduler()
 
     yield
 
     # 关闭时清理资源
+    shutdown_executor(wait=False)
+    shutdown_process_pool(wait=False)
     await engine.dispose()
 
 app = FastAPI(
@@ -55,6 +62,12 @@ async def root():
 async def health_check():
     from app.database import check_db_connection
     from app.utils.redis_client import check_redis_connection
+    from app.utils.rate_limiter import upstream_limiter
+    from app.utils.singleflight import singleflight_stats
+    from app.utils.resilience import upstream_breaker
+    from app.utils.indicator_cache import indicator_cache
+    from app.utils.worker_pool import worker_pool_stats
+    from app.services.stock_index import stock_index
 
     db_status = await check_db_connection()
     redis_status = await check_redis_connection()
@@ -63,5 +76,11 @@ async def health_check():
         "status": "healthy" if db_status and redis_status else "unhealthy",
         "database": "connected" if db_status else "disconnected",
         "redis": "connected" if redis_status else "disconnected",
+        "upstream": upstream_limiter.metrics(),
+        "circuit_breaker": upstream_breaker.snapshot(),
+        "singleflight": singleflight_stats(),
+        "indicator_cache": indicator_cache.stats(),
+        "worker_pools": worker_pool_stats(),
+        "stock_index": stock_index.stats(),
         "timestamp": datetime.now().isoformat()
     }
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, DECIMAL, BigInteger, Boolean, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, DateTime, Date, DECIMAL, BigInteger, Boolean, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
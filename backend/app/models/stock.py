@@ -10,6 +10,7 @@ class Stock(Base):
     code = Column(String(10), unique=True, nullable=False, index=True)
     name = Column(String(50), nullable=False)
     market = Column(String(10))  # 'SH' or 'SZ'
+    list_date = Column(Date)  # 上市日期
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -47,6 +48,19 @@ class WeeklyKline(Base):
         Index("idx_weekly_klines_code_date", "stock_code", "trade_date"),
     )
 
+class WeeklyThreshold(Base):
+    """周末扫描通过阈值：由本周之前的周线预先计算，本周收盘价和成交量都超过阈值即满足条件"""
+    __tablename__ = "weekly_thresholds"
+
+    stock_code = Column(String(10), ForeignKey("stocks.code"), primary_key=True)
+    week_start = Column(Date, nullable=False)  # 阈值适用的周（周一）
+    base_date = Column(Date, nullable=False)  # 计算所用最后一根周线的日期
+    base_close = Column(DECIMAL(10, 2))  # 计算时 base_date 的日线收盘价（复权基准）
+    history_weeks = Column(Integer)  # 计算所用的周线数量
+    close_threshold = Column(DECIMAL(12, 4))  # 前232周收盘价之和 / 232，历史不足时为空
+    volume_threshold = Column(DECIMAL(20, 2))  # 前19周成交量之和 / 19
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class DailyKline(Base):
     __tablename__ = "daily_klines"
 
@@ -6,7 +6,13 @@ import os
 from datetime import datetime
 
 from app.services.signal_generator import SignalGenerator
+from app.services.kline_sync import KlineSyncer
+from app.services.daily_scanner import DailyScanner
+from app.services.threshold_screen import ThresholdScreen
+from app.database import AsyncSessionLocal
+from app.utils.redis_client import get_redis
 from app.utils.helpers import is_trading_day
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -78,10 +84,36 @@ async def daily_data_update_job():
             logger.info("Not a trading day, skipping daily data update")
             return
 
-        # 这里可以添加数据更新逻辑
-        # 例如：更新日线数据、计算指标等
+        async with AsyncSessionLocal() as db:
+            syncer = KlineSyncer(db)
 
-        logger.info("Daily data update completed")
+            # 一次全市场快照写入当日日线
+            ingest = await syncer.ingest_spot_daily()
+
+            # 只有缺口或新上市的股票才逐只请求历史接口回补
+            backfill_count = 0
+            if ingest['backfill']:
+                backfill_count = await syncer.sync_daily(stock_codes=ingest['backfill'])
+
+            if settings.weekly_from_daily:
+                # 本周周线由库中日线合成，只有没有周线历史的股票请求网络
+                weekly = await syncer.build_weekly_from_daily()
+                weekly_count = weekly['written']
+                if weekly['missing_history']:
+                    weekly_count += await syncer.sync_weekly(stock_codes=weekly['missing_history'])
+            else:
+                weekly_count = await syncer.sync_weekly()
+
+            # 增量续算新日线的均量线
+            await DailyScanner(db, await get_redis()).update_daily_klines()
+
+            # 周末扫描阈值（新的一周才会整体重算）
+            await ThresholdScreen(db).refresh()
+
+        logger.info(
+            f"Daily data update completed: {ingest['ingested']} from snapshot, "
+            f"{backfill_count} backfilled, {weekly_count} weekly klines"
+        )
 
     except Exception as e:
         logger.error(f"Daily data update failed: {e}")
@@ -50,6 +50,9 @@ class StockDetailResponse(BaseModel):
     code: str
     name: str
     market: Optional[str]
+    board: Optional[str] = Field(None, description="板块: 主板/创业板/科创板/北交所")
+    list_date: Optional[date] = Field(None, description="上市日期")
+    is_st: bool = Field(False, description="是否ST")
     latest_price: Optional[Decimal] = Field(None, description="最新价格")
     in_weekend_pool: bool = Field(False, description="是否在周末筛选池中")
     in_daily_pool: bool = Field(False, description="是否在日常筛选池中")
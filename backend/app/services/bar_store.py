@@ -0,0 +1,182 @@
+import pandas as pd
+from typing import Dict, Optional
+from pathlib import Path
+import json
+import os
+import threading
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 支持的周期及其时间列
+PERIOD_KEYS = {
+    'daily': 'date',
+    'weekly': 'date',
+    '30min': 'datetime',
+}
+
+class BarStore:
+    """本地K线存储（Parquet），按周期/股票代码分区
+
+    目录结构:
+        {root}/{period}/{code}.parquet
+        {root}/{period}/_index.json   # code -> {"last": 最后一根K线时间, "start": 覆盖起点}
+    """
+
+    # 索引累计多少次修改后落盘一次
+    INDEX_FLUSH_EVERY = 200
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.bar_store_dir)
+        self._indexes: Dict[str, Dict[str, Dict]] = {}
+        self._dirty: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _check_period(self, period: str) -> str:
+        if period not in PERIOD_KEYS:
+            raise ValueError(f"Unsupported period: {period}")
+        return PERIOD_KEYS[period]
+
+    def _period_dir(self, period: str) -> Path:
+        return self.root / period
+
+    def _bar_path(self, period: str, code: str) -> Path:
+        return self._period_dir(period) / f"{code}.parquet"
+
+    def _index_path(self, period: str) -> Path:
+        return self._period_dir(period) / "_index.json"
+
+    def _load_index(self, period: str) -> Dict[str, Dict]:
+        """加载周期索引（每个周期只读一次磁盘）"""
+        if period not in self._indexes:
+            path = self._index_path(period)
+            index = {}
+            if path.exists():
+                try:
+                    index = json.loads(path.read_text(encoding='utf-8'))
+                except Exception as e:
+                    logger.error(f"Error loading bar store index {path}: {e}")
+            self._indexes[period] = index
+        return self._indexes[period]
+
+    def _save_index(self, period: str):
+        path = self._index_path(period)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self._indexes[period]), encoding='utf-8')
+        os.replace(tmp_path, path)
+        self._dirty[period] = 0
+
+    def _mark_dirty(self, period: str):
+        """记录索引修改，累计到阈值后落盘"""
+        self._dirty[period] = self._dirty.get(period, 0) + 1
+        if self._dirty[period] >= self.INDEX_FLUSH_EVERY:
+            self._save_index(period)
+
+    def flush(self):
+        """将所有未落盘的索引写入磁盘"""
+        with self._lock:
+            for period, count in list(self._dirty.items()):
+                if count:
+                    self._save_index(period)
+
+    def last_date(self, period: str, code: str) -> Optional[pd.Timestamp]:
+        """获取已存储的最后一根K线时间（只查索引，不读数据文件）"""
+        self._check_period(period)
+        with self._lock:
+            entry = self._load_index(period).get(code)
+        if not entry or not entry.get('last'):
+            return None
+        return pd.Timestamp(entry['last'])
+
+    def last_dates(self, period: str) -> Dict[str, pd.Timestamp]:
+        """获取该周期下全部股票的最后K线时间"""
+        self._check_period(period)
+        with self._lock:
+            index = dict(self._load_index(period))
+        return {
+            code: pd.Timestamp(entry['last'])
+            for code, entry in index.items()
+            if entry.get('last')
+        }
+
+    def covered_start(self, period: str, code: str) -> Optional[pd.Timestamp]:
+        """获取已存储数据覆盖的起始时间，None表示全部历史"""
+        self._check_period(period)
+        with self._lock:
+            entry = self._load_index(period).get(code) or {}
+        return pd.Timestamp(entry['start']) if entry.get('start') else None
+
+    def has(self, period: str, code: str) -> bool:
+        """是否已有该股票的数据"""
+        self._check_period(period)
+        with self._lock:
+            return code in self._load_index(period)
+
+    def read(self, period: str, code: str) -> pd.DataFrame:
+        """读取某只股票的全部K线"""
+        key = self._check_period(period)
+        path = self._bar_path(period, code)
+        if not path.exists():
+            return pd.DataFrame()
+
+        try:
+            df = pd.read_parquet(path)
+        except Exception as e:
+            logger.error(f"Error reading bar store {path}: {e}")
+            return pd.DataFrame()
+
+        df[key] = pd.to_datetime(df[key])
+        return df.sort_values(key).reset_index(drop=True)
+
+    def write(self, period: str, code: str, df: pd.DataFrame, start: Optional[pd.Timestamp] = None):
+        """覆盖写入某只股票的K线
+
+        Args:
+            start: 数据覆盖的起始时间，None表示全部历史
+        """
+        key = self._check_period(period)
+        if df.empty:
+            return
+
+        df = df.sort_values(key).drop_duplicates(subset=[key], keep='last').reset_index(drop=True)
+
+        period_dir = self._period_dir(period)
+        period_dir.mkdir(parents=True, exist_ok=True)
+
+        path = self._bar_path(period, code)
+        # 同一股票可能被并发写入，临时文件按线程区分
+        tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            index = self._load_index(period)
+            index[code] = {
+                'last': pd.Timestamp(df[key].iloc[-1]).isoformat(),
+                'start': pd.Timestamp(start).isoformat() if start is not None else None,
+            }
+            self._mark_dirty(period)
+
+    def delete(self, period: str, code: str):
+        """删除某只股票的K线"""
+        self._check_period(period)
+        path = self._bar_path(period, code)
+        if path.exists():
+            path.unlink()
+
+        with self._lock:
+            index = self._load_index(period)
+            if index.pop(code, None) is not None:
+                self._mark_dirty(period)
+
+_bar_store: Optional[BarStore] = None
+
+def get_bar_store() -> BarStore:
+    """获取全局K线存储实例"""
+    global _bar_store
+    if _bar_store is None:
+        _bar_store = BarStore()
+    return _bar_store
@@ -1,19 +1,44 @@
 import pandas as pd
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+from datetime import date, datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, update, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import asyncio
 import logging
 
 from app.models.stock import Stock, DailyKline, Kline120min
 from app.models.scan_result import WeekendScanResult, DailyPool
-from app.utils.indicators import calculate_ma, calculate_macd, detect_golden_cross
-from app.utils.redis_client import get_cache, set_cache
+from app.services.data_fetcher import DataFetcher
+from app.services.stock_index import stock_index
+from app.utils.bar_builder import SessionBarBuilder
+from app.utils.indicators import rising_positive_streak
+from app.utils.panel import IndicatorPanel
+from app.utils.indicator_cache import memoize_rows
+from app.utils.screening import volume_golden_cross_batch
+from app.utils.process_pool import map_batches
+from app.utils.streaming import IndicatorState, RollingMean, MACD
+from app.utils.resilience import retry_budget
+from app.utils.worker_pool import BoundedRunner
+from app.utils.redis_client import get_cache, set_cache, get_hash_fields, set_hash_fields
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 重建120分钟MACD状态时读取的历史K线数量
+MACD_HISTORY_BARS = 120
+
+# 重建日线均量线状态时读取的日线数量
+DAILY_SEED_BARS = 100
+
+# 增量指标状态在Redis中的哈希表（字段为股票代码）
+DAILY_STATE_KEY = "indicator_state:daily"
+MACD_STATE_KEY = "indicator_state:120min"
+
+# 进程内共享的增量120分钟K线合成器，盘中每次更新只处理新到达的30分钟K线
+session_bar_builder = SessionBarBuilder()
+
 class DailyScanner:
     """工作日筛选器"""
 
@@ -23,6 +48,7 @@ class DailyScanner:
         self.vol_ma_short = settings.vol_ma_period_daily_short
         self.vol_ma_long = settings.vol_ma_period_daily_long
         self.macd_days = settings.macd_consecutive_days
+        self.fetcher = DataFetcher()
 
     async def scan_daily_pool(self, weekend_results: List[Dict]) -> Dict:
         """
@@ -34,28 +60,29 @@ class DailyScanner:
         logger.info(f"Starting daily scan with {len(weekend_results)} weekend results...")
         start_time = datetime.now()
 
-        results = []
-
-        # 异步处理每只股票
-        tasks = []
-        for stock in weekend_results:
-            task = asyncio.create_task(self._process_single_stock(stock))
-            tasks.append(task)
-
-            # 限制并发数量
-            if len(tasks) >= 10:
-                completed = await asyncio.gather(*tasks[:10])
-                for result in completed:
-                    if result:
-                        results.append(result)
-                tasks = tasks[10:]
-
-        # 处理剩余任务
-        if tasks:
-            completed = await asyncio.gather(*tasks)
-            for result in completed:
-                if result:
-                    results.append(result)
+        codes = [stock['code'] for stock in weekend_results]
+        names = {stock['code']: stock['name'] for stock in weekend_results}
+        await stock_index.ensure_loaded(self.db)
+
+        # 1. 均量线金叉（所有股票在同一面板上判断）
+        crossed = await self._volume_golden_cross_panel(codes)
+
+        # 2. 120分钟MACD红柱连续放大（先为候选股票补齐120分钟K线）
+        candidates = [code for code in codes if crossed.get(code)]
+        if candidates:
+            await self.update_120min_macd(candidates)
+        macd_status = await self._macd_status_panel(candidates)
+
+        results = [
+            {
+                'code': code,
+                'name': stock_index.name(code, names[code]),
+                'golden_cross': True,
+                'macd_120min_status': status
+            }
+            for code, status in macd_status.items()
+            if status
+        ]
 
         # 保存结果到数据库
         await self._save_daily_pool(results)
@@ -76,125 +103,84 @@ class DailyScanner:
             'duration': scan_duration
         }
 
-    async def _process_single_stock(self, stock: Dict) -> Optional[Dict]:
-        """处理单只股票"""
-        code = stock['code']
-
-        try:
-            # 1. 检查均量线金叉
-            golden_cross = await self._check_volume_golden_cross(code)
-            if not golden_cross:
-                return None
-
-            # 2. 检查120分钟MACD
-            macd_status = await self._check_120min_macd(code)
-            if not macd_status:
-                return None
-
-            return {
-                'code': code,
-                'name': stock['name'],
-                'golden_cross': True,
-                'macd_120min_status': macd_status
-            }
-
-        except Exception as e:
-            logger.error(f"Error processing stock {code}: {e}")
-            return None
+    async def _get_recent_rows(self, model, time_column, columns: List[str], codes: List[str], limit: int) -> pd.DataFrame:
+        """一次查询获取多只股票最近N根K线"""
+        time_attr = getattr(model, time_column)
+        row_number = func.row_number().over(
+            partition_by=model.stock_code,
+            order_by=time_attr.desc()
+        ).label('rn')
+        subq = select(
+            model.stock_code,
+            time_attr,
+            *[getattr(model, c) for c in columns],
+            row_number
+        ).where(model.stock_code.in_(codes)).subquery()
+
+        stmt = select(
+            subq.c.stock_code,
+            subq.c[time_column],
+            *[subq.c[c] for c in columns]
+        ).where(subq.c.rn <= limit)
+
+        result = await self.db.execute(stmt)
+        return pd.DataFrame(result.all(), columns=['stock_code', time_column] + columns)
+
+    async def _volume_golden_cross_panel(self, codes: List[str]) -> Dict[str, bool]:
+        """检查均量线金叉：20日均量在最近10天内上穿60日均量"""
+        if not codes:
+            return {}
 
-    async def _check_volume_golden_cross(self, stock_code: str) -> bool:
-        """检查均量线金叉"""
         try:
-            # 检查缓存
-            cache_key = f"vol_golden_cross:{stock_code}:{datetime.now().strftime('%Y%m%d')}"
-            cached_result = await get_cache(cache_key)
-            if cached_result is not None:
-                return cached_result
-
-            # 获取日线数据
-            stmt = select(DailyKline).where(
-                DailyKline.stock_code == stock_code
-            ).order_by(DailyKline.trade_date.desc()).limit(100)
-
-            result = await self.db.execute(stmt)
-            klines = result.scalars().all()
-
-            if len(klines) < 70:  # 至少需要70天数据
-                await set_cache(cache_key, False, ttl=3600)
-                return False
-
-            # 创建DataFrame
-            df = pd.DataFrame([{
-                'date': k.trade_date,
-                'volume': k.volume
-            } for k in reversed(klines)])
-
-            # 计算均量线
-            df['vol_ma20'] = calculate_ma(df['volume'], self.vol_ma_short)
-            df['vol_ma60'] = calculate_ma(df['volume'], self.vol_ma_long)
-
-            # 检查最近是否金叉（5天内）
-            recent = df.tail(10)
-
-            has_cross = False
-            for i in range(len(recent) - 1):
-                if (recent['vol_ma20'].iloc[i] <= recent['vol_ma60'].iloc[i] and
-                    recent['vol_ma20'].iloc[i + 1] > recent['vol_ma60'].iloc[i + 1]):
-                    has_cross = True
-                    break
+            rows = await self._get_recent_rows(DailyKline, 'trade_date', ['volume'], codes, 100)
+            panel = IndicatorPanel.from_long(rows, fields=['volume'], time_column='trade_date')
+            if not panel.codes:
+                return {}
+
+            async def _compute(sub: IndicatorPanel) -> Dict[str, bool]:
+                # 检查最近10根K线内是否金叉，至少需要 长周期+10 天数据；启用进程池时分批在子进程中计算
+                return await map_batches(
+                    volume_golden_cross_batch, sub.codes, {'volume': sub['volume']},
+                    short_period=self.vol_ma_short, long_period=self.vol_ma_long, days_back=9
+                )
 
-            # 缓存结果
-            await set_cache(cache_key, has_cross, ttl=3600)
-            return has_cross
+            # 成交量未变化的股票直接取缓存结果
+            return await memoize_rows(
+                panel, 'daily', 'volume_golden_cross',
+                {'short': self.vol_ma_short, 'long': self.vol_ma_long, 'days_back': 9},
+                ['volume'], _compute
+            )
 
         except Exception as e:
-            logger.error(f"Error checking volume golden cross for {stock_code}: {e}")
-            return False
+            logger.error(f"Error checking volume golden cross: {e}")
+            return {}
 
-    async def _check_120min_macd(self, stock_code: str) -> Optional[str]:
+    async def _macd_status_panel(self, codes: List[str]) -> Dict[str, Optional[str]]:
         """检查120分钟MACD红柱连续放大"""
-        try:
-            # 获取最近10天的120分钟数据
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=10)
-
-            stmt = select(Kline120min).where(
-                and_(
-                    Kline120min.stock_code == stock_code,
-                    Kline120min.datetime >= start_date,
-                    Kline120min.datetime <= end_date
-                )
-            ).order_by(Kline120min.datetime.desc())
-
-            result = await self.db.execute(stmt)
-            klines = result.scalars().all()
+        if not codes:
+            return {}
 
-            if len(klines) < 20:  # 至少需要20根120分钟K线
-                return None
-
-            # 创建DataFrame
-            df = pd.DataFrame([{
-                'datetime': k.datetime,
-                'macd_hist': k.macd_hist
-            } for k in reversed(klines)])
+        try:
+            # 每只股票最近20根120分钟K线（每天两根，约10个交易日）
+            rows = await self._get_recent_rows(Kline120min, 'datetime', ['macd_hist'], codes, 20)
+            panel = IndicatorPanel.from_long(rows, fields=['macd_hist'], time_column='datetime')
+            if not panel.codes:
+                return {}
 
-            # 检查红柱连续放大
-            consecutive_count = 0
-            for i in range(len(df) - 1, 0, -1):
-                if (df['macd_hist'].iloc[i] > 0 and  # 红柱
-                    df['macd_hist'].iloc[i] > df['macd_hist'].iloc[i-1]):  # 放大
-                    consecutive_count += 1
-                else:
-                    break
+            # 红柱且比前一根放大，从最新一根往前数连续满足的根数
+            consecutive = rising_positive_streak(panel['macd_hist'])
 
-            if consecutive_count >= self.macd_days:
-                return f"红柱连续放大{consecutive_count}根"
+            # 至少需要20根120分钟K线
+            enough = panel.lengths('macd_hist') >= 20
 
-            return None
+            return {
+                code: f"红柱连续放大{int(count)}根" if ok and count >= self.macd_days else None
+                for code, count, ok in zip(panel.codes, consecutive, enough)
+            }
 
         except Exception as e:
-            logger.error(f"Error checking 120min MACD for {stock_code}: {e}")
-            return None
+            logger.error(f"Error checking 120min MACD: {e}")
+            return {}
 
     async def _save_daily_pool(self, results: List[Dict]):
         """保存日筛选池结果"""
@@ -298,8 +284,42 @@ class DailyScanner:
             logger.error(f"Error getting latest daily pool: {e}")
             return None
 
+    def _daily_state(self) -> IndicatorState:
+        """日线均量线的增量指标组合"""
+        return IndicatorState({
+            'vol_ma20': RollingMean(self.vol_ma_short),
+            'vol_ma60': RollingMean(self.vol_ma_long)
+        })
+
+    async def _load_states(self, key: str, codes: List[str], template: IndicatorState) -> Dict[str, IndicatorState]:
+        """从Redis读取增量指标状态，参数与模板不一致或无法解析的状态丢弃"""
+        states = {}
+        for code, data in (await get_hash_fields(key, codes)).items():
+            try:
+                state = IndicatorState.from_dict(data)
+            except Exception as e:
+                logger.warning(f"Discarding invalid indicator state for {code}: {e}")
+                continue
+            if state.matches(template) and state.last_time:
+                states[code] = state
+        return states
+
+    async def _first_missing_vol_ma(self) -> Dict[str, date]:
+        """每只股票最早一根缺均量线的日线日期"""
+        stmt = select(
+            DailyKline.stock_code, func.min(DailyKline.trade_date)
+        ).where(DailyKline.vol_ma20.is_(None)).group_by(DailyKline.stock_code)
+        result = await self.db.execute(stmt)
+        return dict(result.all())
+
     async def update_daily_klines(self):
-        """更新日线数据（包括均量线）"""
+        """更新日线数据的均量线（增量）
+
+        日线均量线只由这里计算（KlineSyncer 写入日线时置空）。每只股票的均量线状态
+        保存在Redis，只读取上次处理之后的新日线逐根续算，漏跑几天也会依次补齐；
+        没有状态（首次运行、状态过期、参数变化）的股票用最近 DAILY_SEED_BARS 根日线
+        重建状态，更早的K线也缺均量线时（如复权修复覆盖了历史）按完整历史重建。
+        """
         try:
             logger.info("Updating daily klines with volume MA...")
 
@@ -308,97 +328,273 @@ class DailyScanner:
             result = await self.db.execute(stmt)
             stock_codes = result.scalars().all()
 
-            updated_count = 0
-
-            for stock_code in stock_codes:
-                try:
-                    # 获取最新日线数据
-                    stmt = select(DailyKline).where(
-                        DailyKline.stock_code == stock_code
-                    ).order_by(DailyKline.trade_date.desc()).limit(100)
+            states = await self._load_states(DAILY_STATE_KEY, stock_codes, self._daily_state())
+
+            # 状态日期之前的K线缺均量线，说明历史被重写，状态作废
+            first_missing = await self._first_missing_vol_ma()
+            for code, first in first_missing.items():
+                state = states.get(code)
+                if state is not None and first <= date.fromisoformat(state.last_time):
+                    del states[code]
+            seed_codes = [code for code in stock_codes if code not in states]
+
+            # 有状态的股票只读取新K线：按上次处理日期分组查询（通常只有一两组）
+            frames = []
+            by_last_date: Dict[str, List[str]] = {}
+            for code, state in states.items():
+                by_last_date.setdefault(state.last_time, []).append(code)
+            for last_time, codes in by_last_date.items():
+                stmt = select(
+                    DailyKline.stock_code, DailyKline.trade_date, DailyKline.id, DailyKline.volume
+                ).where(
+                    and_(
+                        DailyKline.stock_code.in_(codes),
+                        DailyKline.trade_date > date.fromisoformat(last_time)
+                    )
+                )
+                result = await self.db.execute(stmt)
+                frames.append(pd.DataFrame(result.all(), columns=['stock_code', 'trade_date', 'id', 'volume']))
+
+            full_codes = set()
+            if seed_codes:
+                logger.info(f"Rebuilding volume MA state for {len(seed_codes)} stocks")
+                seed_rows = await self._get_recent_rows(
+                    DailyKline, 'trade_date', ['id', 'volume'], seed_codes, DAILY_SEED_BARS
+                )
 
+                # 缺均量线的K线早于重建时回写的范围（见下方 skip）的股票读取完整历史
+                written_from = {}
+                for code, dates in seed_rows.groupby('stock_code')['trade_date']:
+                    dates = dates.sort_values()
+                    partial = len(dates) >= DAILY_SEED_BARS
+                    written_from[code] = dates.iloc[self.vol_ma_long - 1 if partial else 0]
+                full_codes = {
+                    code for code, first in first_missing.items()
+                    if code in written_from and first < written_from[code]
+                }
+                if full_codes:
+                    seed_rows = seed_rows[~seed_rows['stock_code'].isin(full_codes)]
+                    stmt = select(
+                        DailyKline.stock_code, DailyKline.trade_date, DailyKline.id, DailyKline.volume
+                    ).where(DailyKline.stock_code.in_(full_codes))
                     result = await self.db.execute(stmt)
-                    klines = result.scalars().all()
-
-                    if len(klines) >= 60:  # 至少有60天数据
-                        # 更新均量线
-                        df = pd.DataFrame([{
-                            'date': k.trade_date,
-                            'volume': k.volume
-                        } for k in reversed(klines)])
-
-                        # 计算均量线
-                        df['vol_ma20'] = calculate_ma(df['volume'], 20)
-                        df['vol_ma60'] = calculate_ma(df['volume'], 60)
-
-                        # 更新数据库
-                        for i, kline in enumerate(klines):
-                            if i >= 60:  # 从第60天开始更新
-                                kline.vol_ma20 = int(df['vol_ma20'].iloc[i])
-                                kline.vol_ma60 = int(df['vol_ma60'].iloc[i])
-
-                        updated_count += 1
-
-                except Exception as e:
-                    logger.error(f"Error updating daily kline for {stock_code}: {e}")
-
+                    frames.append(pd.DataFrame(result.all(), columns=['stock_code', 'trade_date', 'id', 'volume']))
+                frames.append(seed_rows)
+
+            rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            if rows.empty:
+                logger.info("No new daily klines for volume MA")
+                return
+
+            rows = rows.dropna(subset=['volume']).sort_values(['stock_code', 'trade_date'], kind='stable')
+            seeded = set(seed_codes)
+            records = []
+            touched = {}
+
+            for code, group in rows.groupby('stock_code', sort=False):
+                state = states.get(code) or self._daily_state()
+                bars = [
+                    (trade_date, {'vol_ma20': volume, 'vol_ma60': volume})
+                    for trade_date, volume in zip(group['trade_date'], group['volume'].astype('float64'))
+                ]
+                updates = state.catch_up(bars)
+
+                # 重建状态时只有最近一段K线：窗口不完整的早期K线不回写（完整历史除外）
+                skip = 0
+                if code in seeded and code not in full_codes and len(group) >= DAILY_SEED_BARS:
+                    skip = self.vol_ma_long - 1
+
+                for kline_id, (_, values) in list(zip(group['id'], updates))[skip:]:
+                    records.append({
+                        'id': int(kline_id),
+                        'vol_ma20': int(round(values['vol_ma20'])),
+                        'vol_ma60': int(round(values['vol_ma60']))
+                    })
+                touched[code] = state.to_dict()
+
+            # 按主键批量更新
+            for start in range(0, len(records), 1000):
+                await self.db.execute(update(DailyKline), records[start:start + 1000])
             await self.db.commit()
-            logger.info(f"Updated volume MA for {updated_count} stocks")
+
+            # 数据库写入成功后再保存状态，失败时下次会重新计入这些K线
+            await set_hash_fields(DAILY_STATE_KEY, touched, ttl=settings.indicator_state_ttl)
+            logger.info(f"Updated volume MA for {len(records)} klines of {len(touched)} stocks")
 
         except Exception as e:
             logger.error(f"Error updating daily klines: {e}")
             await self.db.rollback()
 
-    async def update_120min_macd(self):
-        """更新120分钟MACD数据"""
-        try:
-            logger.info("Updating 120min MACD data...")
+    async def update_120min_macd(self, stock_codes: Optional[List[str]] = None):
+        """更新120分钟K线及MACD
 
-            # 获取日筛选池中的股票
-            today = datetime.now().date()
-            stmt = select(DailyPool.stock_code).where(
-                DailyPool.scan_date == today
-            ).distinct()
+        获取股票的30分钟K线，由 session_bar_builder 增量合成受影响的120分钟K线，
+        结合库中已有的120分钟收盘价续算MACD后写入。
 
-            result = await self.db.execute(stmt)
-            stock_codes = result.scalars().all()
-
-            updated_count = 0
-
-            for stock_code in stock_codes:
-                try:
-                    # 获取最新的120分钟K线
-                    stmt = select(Kline120min).where(
-                        Kline120min.stock_code == stock_code
-                    ).order_by(Kline120min.datetime.desc()).limit(50)
-
-                    result = await self.db.execute(stmt)
-                    klines = result.scalars().all()
-
-                    if len(klines) >= 26:  # 至少需要26根K线计算MACD
-                        # 计算MACD
-                        df = pd.DataFrame([{
-                            'close': k.close
-                        } for k in reversed(klines)])
-
-                        macd_data = calculate_macd(df['close'])
-
-                        # 更新最新的MACD值
-                        for i, kline in enumerate(klines):
-                            if i >= len(macd_data):
-                                break
-                            kline.macd = float(macd_data['macd'].iloc[i])
-                            kline.macd_signal = float(macd_data['macd_signal'].iloc[i])
-                            kline.macd_hist = float(macd_data['macd_hist'].iloc[i])
-
-                        updated_count += 1
+        Args:
+            stock_codes: 需要更新的股票，默认为当日筛选池
+        """
+        try:
+            logger.info("Updating 120min MACD data...")
 
-                except Exception as e:
-                    logger.error(f"Error updating 120min MACD for {stock_code}: {e}")
+            if stock_codes is None:
+                # 获取日筛选池中的股票
+                today = datetime.now().date()
+                stmt = select(DailyPool.stock_code).where(
+                    DailyPool.scan_date == today
+                ).distinct()
+
+                result = await self.db.execute(stmt)
+                stock_codes = result.scalars().all()
+            if not stock_codes:
+                logger.info("No stocks in daily pool, skipping 120min update")
+                return
+
+            bars_30min = await self._fetch_30min_bars(stock_codes)
+            if bars_30min.empty:
+                return
+
+            # 一次合成所有股票受影响的120分钟K线
+            bars = session_bar_builder.update(bars_30min)
+            if bars.empty:
+                logger.info("No new 120min bars")
+                return
+
+            bars, states = await self._attach_macd(bars)
+            if bars.empty:
+                logger.info("No new 120min bars")
+                return
+
+            records = [
+                {
+                    'stock_code': row.stock_code,
+                    'datetime': row.datetime.to_pydatetime(),
+                    'open': float(row.open),
+                    'close': float(row.close),
+                    'high': float(row.high),
+                    'low': float(row.low),
+                    'volume': int(row.volume),
+                    'macd': float(row.macd),
+                    'macd_signal': float(row.macd_signal),
+                    'macd_hist': float(row.macd_hist)
+                }
+                for row in bars.itertuples(index=False)
+            ]
+
+            for start in range(0, len(records), 1000):
+                stmt = pg_insert(Kline120min).values(records[start:start + 1000])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['stock_code', 'datetime'],
+                    set_={
+                        c: stmt.excluded[c]
+                        for c in ['open', 'close', 'high', 'low', 'volume', 'macd', 'macd_signal', 'macd_hist']
+                    }
+                )
+                await self.db.execute(stmt)
 
             await self.db.commit()
-            logger.info(f"Updated MACD for {updated_count} stocks")
+
+            await set_hash_fields(MACD_STATE_KEY, states, ttl=settings.indicator_state_ttl)
+            logger.info(f"Updated {len(records)} 120min bars for {bars['stock_code'].nunique()} stocks")
 
         except Exception as e:
             logger.error(f"Error updating 120min MACD: {e}")
-            await self.db.rollback()
\ No newline at end of file
+            await self.db.rollback()
+
+    async def _fetch_30min_bars(self, stock_codes: List[str]) -> pd.DataFrame:
+        """并发获取多只股票的30分钟K线，合并为一张表"""
+        async def _fetch_one(code: str) -> Optional[pd.DataFrame]:
+            df = await self.fetcher.fetch_30min_data(code)
+            return df.assign(stock_code=code) if not df.empty else None
+
+        frames = []
+        runner = BoundedRunner('daily_30min_fetch', settings.max_workers, timeout=settings.scan_item_timeout)
+        with retry_budget():
+            async for code, df, error in runner.stream(stock_codes, _fetch_one):
+                if error is not None:
+                    logger.error(f"Error fetching 30min data for {code}: {error!r}")
+                elif df is not None:
+                    frames.append(df)
+        self.fetcher.flush_store()
+
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    async def _attach_macd(self, bars: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Dict]]:
+        """用增量MACD状态计算新K线的MACD
+
+        走完的K线计入状态，仍在进行中的K线只试算（peek），不改变状态；
+        已计入过的K线不再输出。没有状态的股票，以及重发修正的K线已计入状态的股票，
+        用库中更早的120分钟收盘价重建状态。
+
+        Returns:
+            (带 macd/macd_signal/macd_hist 的K线, 需要保存的状态)
+        """
+        bars = bars.sort_values(['stock_code', 'datetime'], kind='stable')
+        codes = bars['stock_code'].unique().tolist()
+        template = IndicatorState({'macd': MACD()})
+        states = await self._load_states(MACD_STATE_KEY, codes, template)
+
+        first_bars = bars.groupby('stock_code')['datetime'].min()
+        missing = [
+            code for code in codes
+            if code not in states or not states[code].is_new(first_bars[code])
+        ]
+        if missing:
+            states.update(await self._seed_macd_states(bars[bars['stock_code'].isin(missing)]))
+
+        keep = []
+        values = []
+        for row in bars.itertuples(index=False):
+            state = states[row.stock_code]
+            if not state.is_new(row.datetime):
+                keep.append(False)
+                continue
+            if row.complete:
+                values.append(state.update(row.datetime, {'macd': row.close})['macd'])
+            else:
+                values.append(state['macd'].peek(row.close))
+            keep.append(True)
+
+        bars = bars[keep].copy()
+        bars[['macd', 'macd_signal', 'macd_hist']] = values if values else np.empty((0, 3))
+        touched = {code: states[code].to_dict() for code in bars['stock_code'].unique()}
+        return bars, touched
+
+    async def _seed_macd_states(self, bars: pd.DataFrame) -> Dict[str, IndicatorState]:
+        """由库中新K线之前的最近 MACD_HISTORY_BARS 根120分钟收盘价重建MACD状态"""
+        first_new = bars.groupby('stock_code')['datetime'].min()
+        logger.info(f"Rebuilding 120min MACD state for {len(first_new)} stocks")
+
+        row_number = func.row_number().over(
+            partition_by=Kline120min.stock_code,
+            order_by=Kline120min.datetime.desc()
+        ).label('rn')
+        subq = select(
+            Kline120min.stock_code,
+            Kline120min.datetime,
+            Kline120min.close,
+            row_number
+        ).where(
+            and_(
+                Kline120min.stock_code.in_(first_new.index.tolist()),
+                Kline120min.datetime < first_new.max().to_pydatetime()
+            )
+        ).subquery()
+        stmt = select(subq.c.stock_code, subq.c.datetime, subq.c.close).where(
+            subq.c.rn <= MACD_HISTORY_BARS
+        )
+        result = await self.db.execute(stmt)
+        history = pd.DataFrame(result.all(), columns=['stock_code', 'datetime', 'close'])
+        history['datetime'] = pd.to_datetime(history['datetime'])
+        history['close'] = history['close'].astype('float64')
+        history = history[history['datetime'] < history['stock_code'].map(first_new)]
+        history = history.sort_values(['stock_code', 'datetime'], kind='stable')
+
+        states = {code: IndicatorState({'macd': MACD()}) for code in first_new.index}
+        for code, group in history.groupby('stock_code', sort=False):
+            states[code].catch_up(
+                (dt, {'macd': close}) for dt, close in zip(group['datetime'], group['close'])
+            )
+        return states
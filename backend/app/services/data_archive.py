@@ -0,0 +1,279 @@
+import pandas as pd
+from typing import Dict, List, Optional
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import logging
+
+from app.services.market_data import MarketDataProvider
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 表示请求日期范围的参数，以及响应中对应的时间列
+RANGE_ARGS = ('start_date', 'end_date')
+RANGE_COLUMNS = {
+    'stock_zh_a_hist': '日期',
+    'stock_zh_a_hist_min_em': '时间',
+}
+
+class ArchiveMissError(KeyError):
+    """回放时归档中没有对应的响应"""
+
+class DataArchive:
+    """上游响应归档，按 调用+参数 索引
+
+    目录结构:
+        {root}/{session}/{method}/{key}-{seq}.parquet
+        {root}/{session}/manifest.jsonl   # 每次录制追加一行: key, method, args, file, rows
+
+    同一调用多次录制（如盘中多次拉取的行情快照）按顺序保存，回放时依次返回，
+    超出录制次数后一直返回最后一次的响应。无参数调用（如交易日历、行情快照）内容与上一次
+    相同时不重复写文件，清单中追加一条指向上一次文件的记录，回放顺序不变。
+
+    K线请求的起止日期通常由当前时间推算，换一天回放时参数不会完全一致，
+    因此另按 去掉日期范围的参数 建立序列索引，精确未命中时从覆盖该范围的录制中截取。
+    """
+
+    def __init__(self, root: Optional[str] = None, session: Optional[str] = None):
+        self.root = Path(root or settings.data_archive_dir)
+        self.session = session or datetime.now().strftime('%Y%m%d')
+        self._entries: Optional[Dict[str, List[str]]] = None
+        self._series: Dict[str, List[Dict]] = {}
+        self._digests: Dict[str, str] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session_dir(self) -> Path:
+        return self.root / self.session
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.session_dir / "manifest.jsonl"
+
+    @classmethod
+    def latest_session(cls, root: Optional[str] = None) -> Optional[str]:
+        """最近一次录制的会话名"""
+        root_path = Path(root or settings.data_archive_dir)
+        if not root_path.exists():
+            return None
+        sessions = sorted(p.name for p in root_path.iterdir() if (p / "manifest.jsonl").exists())
+        return sessions[-1] if sessions else None
+
+    @staticmethod
+    def normalize_args(method: str, args: tuple, kwargs: dict) -> Dict:
+        """按基类方法签名补全默认参数，保证位置/关键字调用得到相同的键"""
+        signature = inspect.signature(getattr(MarketDataProvider, method))
+        bound = signature.bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        normalized = dict(bound.arguments)
+        normalized.pop('self')
+        return {k: str(v) for k, v in normalized.items()}
+
+    @staticmethod
+    def make_key(method: str, arguments: Dict) -> str:
+        payload = json.dumps({'method': method, 'args': arguments}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def make_series_key(cls, method: str, arguments: Dict) -> str:
+        """去掉日期范围后的键，同一股票同一周期的录制共用"""
+        series_args = {k: v for k, v in arguments.items() if k not in RANGE_ARGS}
+        return cls.make_key(method, series_args)
+
+    def _load_entries(self) -> Dict[str, List[str]]:
+        """读取清单（每个会话只读一次磁盘）"""
+        if self._entries is None:
+            entries: Dict[str, List[str]] = {}
+            if self.manifest_path.exists():
+                with open(self.manifest_path, encoding='utf-8') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        record = json.loads(line)
+                        self._add_record(entries, record)
+            self._entries = entries
+        return self._entries
+
+    @staticmethod
+    def content_digest(df: pd.DataFrame) -> str:
+        """响应内容的摘要（含列名），用于识别重复录制"""
+        digest = hashlib.sha1(json.dumps([str(c) for c in df.columns], ensure_ascii=False).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return digest.hexdigest()
+
+    def _add_record(self, entries: Dict[str, List[str]], record: Dict):
+        entries.setdefault(record['key'], []).append(record['file'])
+        if record.get('digest'):
+            self._digests[record['key']] = record['digest']
+        series_key = self.make_series_key(record['method'], record['args'])
+        self._series.setdefault(series_key, []).append(record)
+
+    def save(self, method: str, arguments: Dict, df: pd.DataFrame):
+        """保存一次上游响应"""
+        key = self.make_key(method, arguments)
+        # 无参数的调用内容经常不变，与上一次录制相同时复用上一次的文件
+        digest = self.content_digest(df) if not arguments else None
+
+        with self._lock:
+            entries = self._load_entries()
+            files = entries.get(key, [])
+            if digest is not None and files and self._digests.get(key) == digest:
+                relative = files[-1]
+            else:
+                relative = f"{method}/{key}-{len(files)}.parquet"
+                path = self.session_dir / relative
+                path.parent.mkdir(parents=True, exist_ok=True)
+
+                tmp_path = path.with_suffix('.tmp')
+                df.to_parquet(tmp_path, index=False, compression='zstd')
+                os.replace(tmp_path, path)
+
+            record = {
+                'key': key,
+                'method': method,
+                'args': arguments,
+                'file': relative,
+                'rows': len(df),
+                'digest': digest,
+                'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._add_record(entries, record)
+
+    def load(self, method: str, arguments: Dict) -> pd.DataFrame:
+        """按录制顺序取出一次响应"""
+        key = self.make_key(method, arguments)
+
+        with self._lock:
+            files = self._load_entries().get(key)
+            if not files:
+                raise ArchiveMissError(f"No archived response for {method}({arguments})")
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            relative = files[min(cursor, len(files) - 1)]
+
+        return pd.read_parquet(self.session_dir / relative)
+
+    def load_range(self, method: str, arguments: Dict) -> pd.DataFrame:
+        """从完整覆盖请求范围的最近一次录制中截取请求范围内的K线"""
+        time_column = RANGE_COLUMNS.get(method)
+        if time_column is None:
+            raise ArchiveMissError(f"No archived response for {method}({arguments})")
+
+        start = pd.Timestamp(arguments['start_date'])
+        end = pd.Timestamp(arguments['end_date'])
+        series_key = self.make_series_key(method, arguments)
+
+        with self._lock:
+            self._load_entries()
+            candidates = [
+                r for r in self._series.get(series_key, [])
+                if pd.Timestamp(r['args']['start_date']) <= start
+                and pd.Timestamp(r['args']['end_date']) >= end
+            ]
+        if not candidates:
+            raise ArchiveMissError(f"No archived response covering {method}({arguments})")
+
+        df = pd.read_parquet(self.session_dir / candidates[-1]['file'])
+        times = pd.to_datetime(df[time_column])
+        return df[(times >= start) & (times <= end)].reset_index(drop=True)
+
+    def has(self, method: str, arguments: Dict) -> bool:
+        with self._lock:
+            return self.make_key(method, arguments) in self._load_entries()
+
+    def rewind(self):
+        """重置回放位置"""
+        with self._lock:
+            self._cursors.clear()
+
+class RecordingProvider(MarketDataProvider):
+    """录制模式：透传到真实数据源，并把每次响应写入归档"""
+
+    def __init__(self, inner: MarketDataProvider, archive: DataArchive):
+        self.inner = inner
+        self.archive = archive
+        self.name = f"record({inner.name})"
+
+    def _call(self, method: str, *args, **kwargs) -> pd.DataFrame:
+        df = getattr(self.inner, method)(*args, **kwargs)
+        if isinstance(df, pd.DataFrame):
+            try:
+                self.archive.save(method, DataArchive.normalize_args(method, args, kwargs), df)
+            except Exception as e:
+                # 录制失败不影响正常请求
+                logger.error(f"Error archiving {method} response: {e}")
+        return df
+
+    def stock_zh_a_hist(self, *args, **kwargs):
+        return self._call('stock_zh_a_hist', *args, **kwargs)
+
+    def stock_zh_a_hist_min_em(self, *args, **kwargs):
+        return self._call('stock_zh_a_hist_min_em', *args, **kwargs)
+
+    def stock_zh_a_spot_em(self, *args, **kwargs):
+        return self._call('stock_zh_a_spot_em', *args, **kwargs)
+
+    def tool_trade_date_hist_sina(self, *args, **kwargs):
+        return self._call('tool_trade_date_hist_sina', *args, **kwargs)
+
+class ReplayProvider(MarketDataProvider):
+    """回放模式：从归档返回响应，可模拟上游延迟
+
+    Args:
+        archive: 录制的归档
+        latency_ms: 每次调用模拟的延迟（毫秒）
+        fallback: 归档未命中时使用的数据源，为空时抛出 ArchiveMissError
+    """
+
+    def __init__(
+        self,
+        archive: DataArchive,
+        latency_ms: float = 0.0,
+        fallback: Optional[MarketDataProvider] = None
+    ):
+        self.archive = archive
+        self.latency_ms = latency_ms
+        self.fallback = fallback
+        self.name = f"replay({archive.session})"
+        self.hits = 0
+        self.misses = 0
+
+    def _call(self, method: str, *args, **kwargs) -> pd.DataFrame:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+
+        arguments = DataArchive.normalize_args(method, args, kwargs)
+        try:
+            if self.archive.has(method, arguments):
+                df = self.archive.load(method, arguments)
+            else:
+                df = self.archive.load_range(method, arguments)
+            self.hits += 1
+            return df
+        except ArchiveMissError:
+            self.misses += 1
+            if self.fallback is None:
+                raise
+            logger.warning(f"Archive miss for {method}({arguments}), using {self.fallback.name}")
+            return getattr(self.fallback, method)(*args, **kwargs)
+
+    def stock_zh_a_hist(self, *args, **kwargs):
+        return self._call('stock_zh_a_hist', *args, **kwargs)
+
+    def stock_zh_a_hist_min_em(self, *args, **kwargs):
+        return self._call('stock_zh_a_hist_min_em', *args, **kwargs)
+
+    def stock_zh_a_spot_em(self, *args, **kwargs):
+        return self._call('stock_zh_a_spot_em', *args, **kwargs)
+
+    def tool_trade_date_hist_sina(self, *args, **kwargs):
+        return self._call('tool_trade_date_hist_sina', *args, **kwargs)
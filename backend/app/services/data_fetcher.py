@@ -1,94 +1,283 @@
-import akshare as ak
 import pandas as pd
-from typing import Optional, List, Dict
-from datetime import datetime, timedelta
+import numpy as np
+from typing import Optional, List, Dict, Callable, Awaitable
+from datetime import date, datetime, timedelta
+import asyncio
 import logging
 from app.utils.helpers import retry
+from app.utils.executor import run_blocking
+from app.utils.bar_builder import build_120min_bars
+from app.utils.singleflight import coalesce, fetch_flight
+from app.services.bar_store import BarStore, PERIOD_KEYS, get_bar_store
+from app.services.spot_snapshot import spot_snapshot
+from app.services.market_data import MarketDataProvider, get_provider
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+def _fetch_key(data_type: str):
+    """请求合并键：与 get_cache_key 同样的格式"""
+    def key_func(arguments: Dict) -> str:
+        fetcher = arguments.pop('self')
+        stock_code = arguments.pop('stock_code')
+        return fetcher.get_cache_key(data_type, stock_code, **arguments)
+    return key_func
+
+# AKShare K线列名映射
+HIST_COLUMNS = {
+    '日期': 'date',
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '振幅': 'amplitude',
+    '涨跌幅': 'pct_change',
+    '涨跌额': 'change',
+    '换手率': 'turnover'
+}
+
+# 全市场实时行情列名映射（收盘后即为当日日线）
+SPOT_COLUMNS = {
+    '代码': 'code',
+    '名称': 'name',
+    '今开': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '最新价': 'close',
+    '昨收': 'prev_close',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '涨跌幅': 'pct_change'
+}
+
+# A股代码（沪深主板、创业板）
+A_SHARE_PATTERN = r'^(60|00|30)\d{4}$'
+
+MINUTE_COLUMNS = {
+    '时间': 'datetime',
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'volume',
+    '成交额': 'amount'
+}
+
 class DataFetcher:
     """数据获取器"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        bar_store: Optional[BarStore] = None,
+        provider: Optional[MarketDataProvider] = None
+    ):
         self.default_adjust = "qfq"  # 前复权
 
+        # 行情数据源（AKShare或合成数据），由 settings.data_provider 决定
+        self.provider = provider or get_provider()
+
+        # 本地K线存储，作为网络请求前的读穿缓存
+        if bar_store is None and settings.bar_store_enabled:
+            bar_store = get_bar_store()
+        self.bar_store = bar_store
+
     @retry(max_attempts=3, delay=2)
-    async def fetch_daily_data(self, stock_code: str, days: int = 250) -> pd.DataFrame:
-        """获取日线数据"""
+    async def _fetch_hist(
+        self,
+        stock_code: str,
+        period: str,
+        start_date: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """从AKShare获取日线/周线数据（start_date之后，含当天）"""
+        kwargs = {
+            'symbol': stock_code,
+            'period': period,
+            'adjust': self.default_adjust
+        }
+        if start_date is not None:
+            kwargs['start_date'] = start_date.strftime("%Y%m%d")
+
+        df = await run_blocking(self.provider.stock_zh_a_hist, **kwargs)
+
+        if df is None or df.empty:
+            return pd.DataFrame()
+
+        # 重命名列
+        df = df.rename(columns=HIST_COLUMNS)
+
+        # 转换日期格式
+        df['date'] = pd.to_datetime(df['date'])
+        return df.sort_values('date').reset_index(drop=True)
+
+    @retry(max_attempts=3, delay=2)
+    async def _fetch_30min(
+        self,
+        stock_code: str,
+        start_time: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """从AKShare获取30分钟K线（start_time之后，含当根）"""
+        kwargs = {
+            'symbol': stock_code,
+            'period': "30",
+            'adjust': self.default_adjust
+        }
+        if start_time is not None:
+            kwargs['start_date'] = start_time.strftime("%Y-%m-%d %H:%M:%S")
+
+        df = await run_blocking(self.provider.stock_zh_a_hist_min_em, **kwargs)
+
+        if df is None or df.empty:
+            return pd.DataFrame()
+
+        # 重命名列
+        df = df.rename(columns=MINUTE_COLUMNS)
+
+        # 转换时间格式
+        df['datetime'] = pd.to_datetime(df['datetime'])
+        return df.sort_values('datetime').reset_index(drop=True)
+
+    async def _read_through(
+        self,
+        period: str,
+        stock_code: str,
+        fetch: Callable[[Optional[datetime]], Awaitable[pd.DataFrame]],
+        start: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """优先读取本地存储，只向网络请求最后一根K线之后的数据
+
+        Args:
+            fetch: fetch(since) 返回since之后（含）的K线，since为None表示全部历史
+            start: 需要覆盖的起始时间，None表示全部历史
+        """
+        if self.bar_store is None:
+            return await fetch(start)
+
+        key = PERIOD_KEYS[period]
+        cached = pd.DataFrame()
+        store_start = start
+
+        if self.bar_store.has(period, stock_code):
+            covered = self.bar_store.covered_start(period, stock_code)
+            if covered is None or (start is not None and covered <= pd.Timestamp(start)):
+                cached = await asyncio.to_thread(self.bar_store.read, period, stock_code)
+                store_start = covered
+
+        if len(cached) < 2:
+            df = await fetch(start)
+            if not df.empty:
+                await asyncio.to_thread(self.bar_store.write, period, stock_code, df, start)
+            return df
+
+        # 从倒数第二根K线开始增量获取：最后一根可能尚未走完，倒数第二根用于校验复权是否变化
+        anchor = cached[key].iloc[-2]
+        new = await fetch(anchor.to_pydatetime())
+        if new.empty:
+            return cached
+
+        if not self._same_adjustment(cached, new, key, anchor):
+            # 除权除息后前复权价格整体变化，需全量重取
+            logger.info(f"Adjusted prices changed for {stock_code} ({period}), refetching")
+            df = await fetch(store_start)
+            if not df.empty:
+                await asyncio.to_thread(self.bar_store.write, period, stock_code, df, store_start)
+            return df
+
+        df = pd.concat(
+            [cached[cached[key] < new[key].iloc[0]], new],
+            ignore_index=True
+        )
+        await asyncio.to_thread(self.bar_store.write, period, stock_code, df, store_start)
+        return df
+
+    def _same_adjustment(
+        self,
+        cached: pd.DataFrame,
+        new: pd.DataFrame,
+        key: str,
+        anchor: pd.Timestamp
+    ) -> bool:
+        """比较锚点K线的收盘价，判断本地数据与最新数据的复权基准是否一致"""
+        old_close = cached.loc[cached[key] == anchor, 'close']
+        new_close = new.loc[new[key] == anchor, 'close']
+        if old_close.empty or new_close.empty:
+            return False
+        return bool(np.isclose(float(old_close.iloc[0]), float(new_close.iloc[0]), rtol=1e-4, atol=1e-3))
+
+    def flush_store(self):
+        """将本地存储索引写入磁盘"""
+        if self.bar_store is not None:
+            self.bar_store.flush()
+
+    @coalesce(fetch_flight, _fetch_key('daily'))
+    async def fetch_daily_data(
+        self,
+        stock_code: str,
+        days: int = 250,
+        start_date: Optional[date] = None
+    ) -> pd.DataFrame:
+        """获取日线数据
+
+        Args:
+            days: 获取最近N天
+            start_date: 起始日期（含），指定后忽略days，用于增量同步
+        """
         try:
-            end_date = datetime.now().strftime("%Y%m%d")
-            start_date = (datetime.now() - timedelta(days=days)).strftime("%Y%m%d")
-
-            df = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="daily",
-                start_date=start_date,
-                end_date=end_date,
-                adjust=self.default_adjust
+            if start_date is None:
+                start_date = (datetime.now() - timedelta(days=days)).date()
+            start = datetime.combine(start_date, datetime.min.time())
+
+            df = await self._read_through(
+                'daily',
+                stock_code,
+                lambda since: self._fetch_hist(stock_code, "daily", since),
+                start=start
             )
 
             if df.empty:
                 logger.warning(f"No daily data found for {stock_code}")
                 return pd.DataFrame()
 
-            # 重命名列
-            df = df.rename(columns={
-                '日期': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'volume',
-                '成交额': 'amount',
-                '振幅': 'amplitude',
-                '涨跌幅': 'pct_change',
-                '涨跌额': 'change',
-                '换手率': 'turnover'
-            })
-
-            # 转换日期格式
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date').reset_index(drop=True)
-
-            return df
+            return df[df['date'] >= start].reset_index(drop=True)
 
         except Exception as e:
             logger.error(f"Error fetching daily data for {stock_code}: {e}")
             raise
 
-    @retry(max_attempts=3, delay=2)
-    async def fetch_weekly_data(self, stock_code: str, weeks: int = 250) -> pd.DataFrame:
-        """获取周线数据"""
+    @coalesce(fetch_flight, _fetch_key('weekly'))
+    async def fetch_weekly_data(
+        self,
+        stock_code: str,
+        weeks: int = 250,
+        start_date: Optional[date] = None
+    ) -> pd.DataFrame:
+        """获取周线数据
+
+        Args:
+            weeks: 获取最近N周
+            start_date: 起始日期（含），指定后忽略weeks，只返回该日期之后的周线
+        """
         try:
-            df = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="weekly",
-                adjust=self.default_adjust
+            start = datetime.combine(start_date, datetime.min.time()) if start_date else None
+
+            df = await self._read_through(
+                'weekly',
+                stock_code,
+                lambda since: self._fetch_hist(stock_code, "weekly", since),
+                start=start
             )
 
             if df.empty:
                 logger.warning(f"No weekly data found for {stock_code}")
                 return pd.DataFrame()
 
-            # 重命名列
-            df = df.rename(columns={
-                '日期': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'volume',
-                '成交额': 'amount'
-            })
-
-            # 转换日期格式
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date').reset_index(drop=True)
+            if start is not None:
+                return df[df['date'] >= start].reset_index(drop=True)
 
             # 只保留最近N周数据
             if len(df) > weeks:
-                df = df.tail(weeks)
+                df = df.tail(weeks).reset_index(drop=True)
 
             return df
 
@@ -96,74 +285,82 @@ class DataFetcher:
             logger.error(f"Error fetching weekly data for {stock_code}: {e}")
             raise
 
-    @retry(max_attempts=3, delay=2)
+    @coalesce(fetch_flight, _fetch_key('120min'))
     async def fetch_120min_data(self, stock_code: str, days: int = 30) -> pd.DataFrame:
-        """获取120分钟K线数据"""
+        """获取120分钟K线数据
+
+        AKShare没有直接的120分钟数据，按交易时段将30分钟K线合成为每天两根
+        （11:30、15:00），最后一根可能尚未走完（complete=False）。
+        """
         try:
-            # AKShare没有直接的120分钟数据，使用30分钟数据并重新采样
-            df = ak.stock_zh_a_hist_min_em(
-                symbol=stock_code,
-                period="30",
-                adjust=self.default_adjust
-            )
+            df = await self.fetch_30min_data(stock_code, days=days)
 
             if df.empty:
                 logger.warning(f"No 30min data found for {stock_code}")
                 return pd.DataFrame()
 
-            # 重命名列
-            df = df.rename(columns={
-                '时间': 'datetime',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'volume',
-                '成交额': 'amount'
-            })
-
-            # 转换时间格式
-            df['datetime'] = pd.to_datetime(df['datetime'])
-            df = df.sort_values('datetime').set_index('datetime')
-
-            # 重新采样为120分钟（2小时）数据
-            # 4个30分钟 = 2小时
-            resampled = df.resample('2H').agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'volume': 'sum',
-                'amount': 'sum'
-            }).dropna()
-
-            # 重置索引
-            resampled = resampled.reset_index()
-
-            # 只保留交易时间段的数据（9:30-11:30, 13:00-15:00）
-            resampled['time'] = resampled['datetime'].dt.time
-            resampled = resampled[
-                ((resampled['time'] >= pd.to_datetime('09:30').time()) &
-                 (resampled['time'] <= pd.to_datetime('11:30').time())) |
-                ((resampled['time'] >= pd.to_datetime('13:00').time()) &
-                 (resampled['time'] <= pd.to_datetime('15:00').time()))
-            ]
-
-            # 只保留最近N天的数据
-            cutoff_date = datetime.now() - timedelta(days=days)
-            resampled = resampled[resampled['datetime'] >= cutoff_date]
-
-            return resampled.reset_index(drop=True)
+            bars = build_120min_bars(df.assign(stock_code=stock_code))
+            return bars.drop(columns=['stock_code'])
 
         except Exception as e:
             logger.error(f"Error fetching 120min data for {stock_code}: {e}")
             raise
 
+    @coalesce(fetch_flight, _fetch_key('30min'))
+    async def fetch_30min_data(self, stock_code: str, days: int = 30) -> pd.DataFrame:
+        """获取最近N天的30分钟K线数据"""
+        df = await self._read_through(
+            '30min',
+            stock_code,
+            lambda since: self._fetch_30min(stock_code, since)
+        )
+        if df.empty:
+            return df
+
+        cutoff_date = pd.Timestamp(datetime.now().date() - timedelta(days=days))
+        return df[df['datetime'] >= cutoff_date].reset_index(drop=True)
+
+    async def fetch_spot_daily_bars(self, trade_date: Optional[date] = None) -> pd.DataFrame:
+        """用一次全市场行情快照构建当日日线（收盘后调用）
+
+        Returns:
+            DataFrame with columns: code, name, trade_date, open, high, low, close,
+            prev_close, volume, amount, pct_change
+        """
+        try:
+            # 收盘后需要最新快照，最多接受1分钟前的数据
+            spot = await spot_snapshot.get_frame(max_age=60)
+
+            if spot is None or spot.empty:
+                logger.error("Failed to fetch spot snapshot")
+                return pd.DataFrame()
+
+            return self.build_daily_bars_from_spot(spot, trade_date or datetime.now().date())
+
+        except Exception as e:
+            logger.error(f"Error fetching spot daily bars: {e}")
+            raise
+
+    def build_daily_bars_from_spot(self, spot: pd.DataFrame, trade_date: date) -> pd.DataFrame:
+        """将全市场行情快照转换为当日日线"""
+        df = spot.rename(columns=SPOT_COLUMNS)[list(SPOT_COLUMNS.values())]
+        df = df[df['code'].str.match(A_SHARE_PATTERN)].copy()
+
+        numeric_columns = ['open', 'high', 'low', 'close', 'prev_close', 'volume', 'amount', 'pct_change']
+        df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+
+        # 停牌股票没有成交，价格为空
+        df = df.dropna(subset=['open', 'high', 'low', 'close', 'volume'])
+        df = df[df['volume'] > 0]
+
+        df['trade_date'] = trade_date
+        return df.reset_index(drop=True)
+
     async def fetch_stock_list(self) -> pd.DataFrame:
         """获取A股股票列表"""
         try:
             # 获取实时行情数据作为股票列表
-            df = ak.stock_zh_a_spot_em()
+            df = await spot_snapshot.get_frame()
 
             if df.empty:
                 logger.error("Failed to fetch stock list")
@@ -176,7 +373,7 @@ class DataFetcher:
             })
 
             # 过滤掉非A股代码
-            df = df[df['code'].str.match(r'^(60|00|30)\d{4}$')]
+            df = df[df['code'].str.match(A_SHARE_PATTERN)]
 
             return df
 
@@ -187,16 +384,13 @@ class DataFetcher:
     async def fetch_realtime_data(self, stock_codes: List[str]) -> pd.DataFrame:
         """获取实时行情数据"""
         try:
-            # 批量获取实时数据
-            df = ak.stock_zh_a_spot_em()
+            # 从共享行情快照中获取
+            df = await spot_snapshot.get_quotes(stock_codes)
 
             if df.empty:
                 logger.error("Failed to fetch realtime data")
                 return pd.DataFrame()
 
-            # 过滤指定的股票
-            df = df[df['代码'].isin(stock_codes)]
-
             # 重命名列
             df = df.rename(columns={
                 '代码': 'code',
@@ -0,0 +1,540 @@
+import pandas as pd
+from typing import List, Dict, Optional
+from datetime import date, datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import asyncio
+import logging
+
+from app.models.stock import Stock, DailyKline, WeeklyKline
+from app.services.data_fetcher import DataFetcher
+from app.utils.indicators import calculate_ma, calculate_grouped_ma
+from app.utils.bar_builder import resample_weekly, week_start
+from app.utils.helpers import get_trading_calendar
+from app.utils.executor import run_blocking
+from app.utils.resilience import retry_budget
+from app.utils.worker_pool import BoundedRunner
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def _daily_records(code: str, df: pd.DataFrame) -> List[Dict]:
+    """日线K线转为写入记录，均量线置空（由 DailyScanner.update_daily_klines 统一计算）"""
+    return [
+        {
+            'stock_code': code,
+            'trade_date': pd.Timestamp(row.date).date(),
+            'open': float(row.open),
+            'close': float(row.close),
+            'high': float(row.high),
+            'low': float(row.low),
+            'volume': int(row.volume),
+            'vol_ma20': None,
+            'vol_ma60': None
+        }
+        for row in df.itertuples(index=False)
+    ]
+
+class KlineSyncer:
+    """K线增量同步器
+
+    读取数据库中每只股票的 max(trade_date)，只获取缺失区间并追加写入，
+    每晚刷新只需几根K线而非全部历史。
+    """
+
+    def __init__(self, db_session: AsyncSession, fetcher: Optional[DataFetcher] = None):
+        self.db = db_session
+        self.fetcher = fetcher or DataFetcher()
+        self.max_workers = settings.max_workers
+        self.ma_period = settings.ma_period_weekly
+        self.vol_ma_weekly = settings.vol_ma_period_weekly
+
+    async def get_last_dates(self, model) -> Dict[str, date]:
+        """一次查询获取每只股票已存储的最后交易日"""
+        stmt = select(
+            model.stock_code,
+            func.max(model.trade_date)
+        ).group_by(model.stock_code)
+
+        result = await self.db.execute(stmt)
+        return {code: last_date for code, last_date in result.all()}
+
+    async def _get_tail_rows(
+        self,
+        model,
+        columns: List[str],
+        limit: int,
+        before: Optional[date] = None
+    ) -> pd.DataFrame:
+        """一次查询获取每只股票最近N根K线（用于续算均线）
+
+        Args:
+            before: 只取该日期之前的K线
+        """
+        if limit <= 0:
+            return pd.DataFrame(columns=['stock_code', 'trade_date', 'rn'] + columns)
+
+        row_number = func.row_number().over(
+            partition_by=model.stock_code,
+            order_by=model.trade_date.desc()
+        ).label('rn')
+
+        inner = select(
+            model.stock_code,
+            model.trade_date,
+            *[getattr(model, c) for c in columns],
+            row_number
+        )
+        if before is not None:
+            inner = inner.where(model.trade_date < before)
+        subq = inner.subquery()
+
+        stmt = select(
+            subq.c.stock_code,
+            subq.c.trade_date,
+            subq.c.rn,
+            *[subq.c[c] for c in columns]
+        ).where(subq.c.rn <= limit)
+
+        result = await self.db.execute(stmt)
+        rows = result.all()
+        df = pd.DataFrame(rows, columns=['stock_code', 'trade_date', 'rn'] + columns)
+        return df.sort_values(['stock_code', 'trade_date']).reset_index(drop=True)
+
+    async def _get_stock_codes(self, stock_codes: Optional[List[str]]) -> List[str]:
+        if stock_codes:
+            return list(stock_codes)
+        result = await self.db.execute(select(Stock.code))
+        return list(result.scalars().all())
+
+    async def _fetch_all(self, stock_codes: List[str], fetch) -> Dict[str, pd.DataFrame]:
+        """并发获取多只股票的缺失K线"""
+        results = {}
+        runner = BoundedRunner('kline_sync', self.max_workers, timeout=settings.scan_item_timeout)
+        with retry_budget():
+            async for code, df, error in runner.stream(stock_codes, fetch):
+                if error is not None:
+                    logger.error(f"Error syncing klines for {code}: {error!r}")
+                elif df is not None and not df.empty:
+                    results[code] = df
+        return results
+
+    async def _upsert(self, model, records: List[Dict], update_columns: List[str]):
+        """批量写入，(stock_code, trade_date) 冲突时更新"""
+        if not records:
+            return
+
+        stmt = pg_insert(model).values(records)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['stock_code', 'trade_date'],
+            set_={c: stmt.excluded[c] for c in update_columns}
+        )
+        await self.db.execute(stmt)
+
+    async def sync_daily(self, stock_codes: Optional[List[str]] = None, full_days: int = 365) -> int:
+        """增量同步日线数据
+
+        日线均量线统一由 DailyScanner.update_daily_klines 计算，写入（或覆盖）的K线
+        均量线置空，等待其续算。
+
+        Args:
+            full_days: 数据库中没有记录的股票回补的天数
+
+        Returns:
+            写入的K线数量
+        """
+        logger.info("Starting incremental daily kline sync...")
+        codes = await self._get_stock_codes(stock_codes)
+        last_dates = await self.get_last_dates(DailyKline)
+
+        async def _fetch(code: str) -> pd.DataFrame:
+            last = last_dates.get(code)
+            if last is None:
+                return await self.fetcher.fetch_daily_data(code, days=full_days)
+            return await self.fetcher.fetch_daily_data(code, start_date=last + timedelta(days=1))
+
+        new_bars = await self._fetch_all(codes, _fetch)
+        if not new_bars:
+            logger.info("Daily klines are up to date")
+            return 0
+
+        records = []
+        for code, df in new_bars.items():
+            records.extend(_daily_records(code, df))
+
+        try:
+            for start in range(0, len(records), 1000):
+                await self._upsert(
+                    DailyKline,
+                    records[start:start + 1000],
+                    ['open', 'close', 'high', 'low', 'volume', 'vol_ma20', 'vol_ma60']
+                )
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error saving synced daily klines: {e}")
+            await self.db.rollback()
+            raise
+
+        logger.info(f"Synced {len(records)} daily klines for {len(new_bars)} stocks")
+        return len(records)
+
+    async def ingest_spot_daily(self, trade_date: Optional[date] = None) -> Dict:
+        """用一次全市场快照写入当日日线
+
+        只有上一交易日数据完整且复权基准未变的股票直接写入；
+        有缺口或新上市的股票需要回补，昨收与库中收盘价不一致（除权除息）的股票
+        通过个股历史接口修复。
+
+        Returns:
+            {'ingested': 写入数量, 'backfill': 需要回补的代码, 'repaired': 已修复的代码}
+        """
+        trade_date = trade_date or datetime.now().date()
+        logger.info(f"Ingesting daily bars for {trade_date} from spot snapshot...")
+
+        bars = await self.fetcher.fetch_spot_daily_bars(trade_date)
+        if bars.empty:
+            return {'ingested': 0, 'backfill': [], 'repaired': []}
+
+        # 每只股票最近一根K线
+        last = await self._get_tail_rows(DailyKline, ['close'], 1, before=trade_date)
+        last['close'] = last['close'].astype('float64')
+        last = last.set_index('stock_code')
+        prev_trade_date = last['trade_date'].max() if not last.empty else None
+
+        bars = bars.set_index('code')
+        bars['last_date'] = last['trade_date'].reindex(bars.index)
+        bars['last_close'] = last['close'].reindex(bars.index)
+
+        # 上一交易日有数据的股票才能直接追加，否则需要回补
+        continuous = bars['last_date'] == prev_trade_date
+        backfill = bars.index[~continuous].tolist()
+
+        # 昨收与库中收盘价不一致说明发生了除权除息，前复权历史需要整体修复
+        same_basis = (bars['prev_close'] - bars['last_close']).abs() <= 0.011
+        repair = bars.index[continuous & ~same_basis].tolist()
+
+        bars = bars[continuous & same_basis]
+
+        # 均量线置空，由 DailyScanner.update_daily_klines 续算
+        records = [
+            {
+                'stock_code': code,
+                'trade_date': trade_date,
+                'open': float(row.open),
+                'close': float(row.close),
+                'high': float(row.high),
+                'low': float(row.low),
+                'volume': int(row.volume),
+                'vol_ma20': None,
+                'vol_ma60': None
+            }
+            for code, row in zip(bars.index, bars.itertuples(index=False))
+        ]
+
+        try:
+            for start in range(0, len(records), 1000):
+                await self._upsert(
+                    DailyKline,
+                    records[start:start + 1000],
+                    ['open', 'close', 'high', 'low', 'volume', 'vol_ma20', 'vol_ma60']
+                )
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error saving spot daily bars: {e}")
+            await self.db.rollback()
+            raise
+
+        repaired = await self.repair_daily(repair) if repair else []
+
+        logger.info(
+            f"Ingested {len(records)} daily bars from spot snapshot, "
+            f"{len(backfill)} need backfill, {len(repaired)} repaired"
+        )
+        return {'ingested': len(records), 'backfill': backfill, 'repaired': repaired}
+
+    async def repair_daily(self, stock_codes: List[str], days: int = 365) -> List[str]:
+        """复权基准变化后，重新获取并覆盖日线历史，并全量重建周线
+
+        前复权下除权除息会改变全部历史价格，日线从库中最早一根开始重新获取
+        （库中没有日线时取最近 days 天），周线删除后按新股票的方式回补完整历史。
+        覆盖的日线均量线置空，DailyScanner.update_daily_klines 发现后按完整历史重算。
+        """
+        result = await self.db.execute(
+            select(DailyKline.stock_code, func.min(DailyKline.trade_date))
+            .where(DailyKline.stock_code.in_(stock_codes))
+            .group_by(DailyKline.stock_code)
+        )
+        first_dates = dict(result.all())
+
+        # 本地K线存储中的旧复权数据作废
+        if self.fetcher.bar_store is not None:
+            for code in stock_codes:
+                self.fetcher.bar_store.delete('daily', code)
+                self.fetcher.bar_store.delete('weekly', code)
+
+        async def _fetch(code: str) -> pd.DataFrame:
+            first = first_dates.get(code)
+            if first is None:
+                return await self.fetcher.fetch_daily_data(code, days=days)
+            return await self.fetcher.fetch_daily_data(code, start_date=first)
+
+        new_bars = await self._fetch_all(stock_codes, _fetch)
+        if not new_bars:
+            return []
+
+        records = []
+        for code, df in new_bars.items():
+            records.extend(_daily_records(code, df))
+
+        try:
+            for start in range(0, len(records), 1000):
+                await self._upsert(
+                    DailyKline,
+                    records[start:start + 1000],
+                    ['open', 'close', 'high', 'low', 'volume', 'vol_ma20', 'vol_ma60']
+                )
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error repairing daily klines: {e}")
+            await self.db.rollback()
+            raise
+
+        repaired = list(new_bars.keys())
+        await self.resync_weekly(repaired)
+        return repaired
+
+    async def resync_weekly(self, stock_codes: List[str]) -> int:
+        """删除并重新获取周线完整历史（复权基准变化后，233周均线需要同一基准的历史）"""
+        if not stock_codes:
+            return 0
+        try:
+            for start in range(0, len(stock_codes), 1000):
+                await self.db.execute(
+                    WeeklyKline.__table__.delete().where(
+                        WeeklyKline.stock_code.in_(stock_codes[start:start + 1000])
+                    )
+                )
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error deleting weekly klines for resync: {e}")
+            await self.db.rollback()
+            raise
+
+        logger.info(f"Resyncing full weekly history for {len(stock_codes)} stocks")
+        return await self.sync_weekly(stock_codes=stock_codes)
+
+    async def sync_weekly(self, stock_codes: Optional[List[str]] = None) -> int:
+        """增量同步周线数据
+
+        最后一根周线可能是未走完的一周，从该周周一开始重新获取并替换。
+
+        Returns:
+            写入的K线数量
+        """
+        logger.info("Starting incremental weekly kline sync...")
+        codes = await self._get_stock_codes(stock_codes)
+        last_dates = await self.get_last_dates(WeeklyKline)
+
+        week_starts = {
+            code: last - timedelta(days=last.weekday())
+            for code, last in last_dates.items()
+        }
+
+        async def _fetch(code: str) -> pd.DataFrame:
+            week_start = week_starts.get(code)
+            if week_start is None:
+                return await self.fetcher.fetch_weekly_data(code, weeks=self.ma_period + 20)
+            return await self.fetcher.fetch_weekly_data(code, start_date=week_start)
+
+        new_bars = await self._fetch_all(codes, _fetch)
+        if not new_bars:
+            logger.info("Weekly klines are up to date")
+            return 0
+
+        # 续算233周均线和周均量需要的历史数据
+        tail = await self._get_tail_rows(WeeklyKline, ['close', 'volume'], self.ma_period)
+        tail_groups = {code: g for code, g in tail.groupby('stock_code')}
+
+        records = []
+        for code, df in new_bars.items():
+            df = df.copy()
+            df['trade_date'] = pd.to_datetime(df['date']).dt.date
+
+            history = tail_groups.get(code)
+            if history is not None and code in week_starts:
+                # 去掉将被替换的本周数据
+                history = history[history['trade_date'] < week_starts[code]]
+                history = history.tail(self.ma_period - 1)
+            else:
+                history = pd.DataFrame(columns=['close', 'volume'])
+
+            close = pd.concat([history['close'], df['close']], ignore_index=True).astype('float64')
+            volume = pd.concat([history['volume'], df['volume']], ignore_index=True).astype('float64')
+
+            n_new = len(df)
+            ma233 = calculate_ma(close, self.ma_period).tail(n_new).values
+            vol_ma20 = calculate_ma(volume, self.vol_ma_weekly).tail(n_new).values
+
+            for i, row in enumerate(df.itertuples(index=False)):
+                records.append({
+                    'stock_code': code,
+                    'trade_date': row.trade_date,
+                    'open': float(row.open),
+                    'close': float(row.close),
+                    'high': float(row.high),
+                    'low': float(row.low),
+                    'volume': int(row.volume),
+                    'ma233': float(ma233[i]),
+                    'vol_ma20': int(vol_ma20[i])
+                })
+
+        try:
+            # 删除需要替换的本周数据（周线日期会随本周交易日推移）
+            for code in new_bars:
+                week_start = week_starts.get(code)
+                if week_start is None:
+                    continue
+                await self.db.execute(
+                    WeeklyKline.__table__.delete().where(
+                        and_(
+                            WeeklyKline.stock_code == code,
+                            WeeklyKline.trade_date >= week_start
+                        )
+                    )
+                )
+
+            for start in range(0, len(records), 1000):
+                await self._upsert(
+                    WeeklyKline,
+                    records[start:start + 1000],
+                    ['open', 'close', 'high', 'low', 'volume', 'ma233', 'vol_ma20']
+                )
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error saving synced weekly klines: {e}")
+            await self.db.rollback()
+            raise
+
+        logger.info(f"Synced {len(records)} weekly klines for {len(new_bars)} stocks")
+        return len(records)
+
+    async def build_weekly_from_daily(self, since: Optional[date] = None) -> Dict:
+        """用库中日线合成周线，不请求网络
+
+        默认只重建最新一周（本周周线随每日收盘更新），指定 since 时重建该日期所在周及之后的周线，
+        需保证 daily_klines 覆盖该区间。更早的周线历史与233周均线所需数据保留不动。
+        库中没有周线历史的股票不写入，交给 sync_weekly 回补完整历史。
+
+        Returns:
+            {'written': 写入的周线数量, 'missing_history': 库中没有周线历史的股票}
+        """
+        if since is None:
+            result = await self.db.execute(select(func.max(DailyKline.trade_date)))
+            since = result.scalar()
+            if since is None:
+                logger.info("No daily klines to resample")
+                return {'written': 0, 'missing_history': []}
+
+        monday = pd.Timestamp(week_start(pd.Series([since]))[0]).date()
+        logger.info(f"Building weekly klines from daily bars since {monday}...")
+
+        result = await self.db.execute(
+            select(
+                DailyKline.stock_code,
+                DailyKline.trade_date,
+                DailyKline.open,
+                DailyKline.high,
+                DailyKline.low,
+                DailyKline.close,
+                DailyKline.volume
+            ).where(DailyKline.trade_date >= monday)
+        )
+        daily = pd.DataFrame(
+            result.all(),
+            columns=['stock_code', 'trade_date', 'open', 'high', 'low', 'close', 'volume']
+        )
+        if daily.empty:
+            return {'written': 0, 'missing_history': []}
+
+        calendar = await run_blocking(get_trading_calendar)
+        trading_days = calendar['trade_date'] if not calendar.empty else None
+        weekly = resample_weekly(daily, trading_days)
+
+        # 续算233周均线和周均量需要的历史数据
+        tail = await self._get_tail_rows(
+            WeeklyKline, ['close', 'volume'], self.ma_period - 1, before=monday
+        )
+        missing_history = sorted(set(weekly['stock_code']) - set(tail['stock_code']))
+        # 没有周线历史的股票不写入只有本周一根的周线，否则 sync_weekly 会把它们当作已有历史，
+        # 只请求本周数据而不再回补完整历史
+        weekly = weekly[~weekly['stock_code'].isin(missing_history)].copy()
+
+        history = tail[['stock_code', 'trade_date', 'close', 'volume']].copy()
+        history['trade_date'] = pd.to_datetime(history['trade_date'])
+        history['new'] = False
+        weekly['new'] = True
+
+        combined = pd.concat(
+            [history, weekly[['stock_code', 'trade_date', 'close', 'volume', 'new']]],
+            ignore_index=True
+        ).sort_values(['stock_code', 'trade_date'], kind='stable')
+
+        codes = combined['stock_code'].values
+        combined['ma233'] = calculate_grouped_ma(
+            combined['close'].astype('float64').values, codes, self.ma_period
+        )
+        combined['vol_ma20'] = calculate_grouped_ma(
+            combined['volume'].astype('float64').values, codes, self.vol_ma_weekly
+        )
+        averages = combined[combined['new']].set_index(['stock_code', 'trade_date'])
+
+        weekly = weekly.set_index(['stock_code', 'trade_date'])
+        weekly['ma233'] = averages['ma233']
+        weekly['vol_ma20'] = averages['vol_ma20']
+        weekly = weekly.reset_index()
+
+        records = [
+            {
+                'stock_code': row.stock_code,
+                'trade_date': row.trade_date.date(),
+                'open': float(row.open),
+                'close': float(row.close),
+                'high': float(row.high),
+                'low': float(row.low),
+                'volume': int(row.volume),
+                'ma233': float(row.ma233),
+                'vol_ma20': int(row.vol_ma20)
+            }
+            for row in weekly.itertuples(index=False)
+        ]
+
+        try:
+            # 周线日期随本周交易日推移，先删除重建区间内的旧周线（只删除本次重写的股票）
+            written_codes = weekly['stock_code'].unique().tolist()
+            for start in range(0, len(written_codes), 1000):
+                await self.db.execute(
+                    WeeklyKline.__table__.delete().where(
+                        and_(
+                            WeeklyKline.stock_code.in_(written_codes[start:start + 1000]),
+                            WeeklyKline.trade_date >= monday
+                        )
+                    )
+                )
+            for start in range(0, len(records), 1000):
+                await self._upsert(
+                    WeeklyKline,
+                    records[start:start + 1000],
+                    ['open', 'close', 'high', 'low', 'volume', 'ma233', 'vol_ma20']
+                )
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error saving resampled weekly klines: {e}")
+            await self.db.rollback()
+            raise
+
+        logger.info(
+            f"Built {len(records)} weekly klines from daily bars, "
+            f"{len(missing_history)} stocks without weekly history"
+        )
+        return {'written': len(records), 'missing_history': missing_history}
@@ -0,0 +1,462 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+import threading
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class MarketDataProvider(ABC):
+    """行情数据源接口
+
+    方法签名和返回的列名与 AKShare 保持一致，上层代码无需关心数据来源。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def stock_zh_a_hist(
+        self,
+        symbol: str,
+        period: str = "daily",
+        start_date: str = "19700101",
+        end_date: str = "20500101",
+        adjust: str = ""
+    ) -> pd.DataFrame:
+        """日/周/月K线"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stock_zh_a_hist_min_em(
+        self,
+        symbol: str,
+        start_date: str = "1979-09-01 09:32:00",
+        end_date: str = "2222-01-01 09:32:00",
+        period: str = "5",
+        adjust: str = ""
+    ) -> pd.DataFrame:
+        """分钟K线"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stock_zh_a_spot_em(self) -> pd.DataFrame:
+        """全市场实时行情"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def tool_trade_date_hist_sina(self) -> pd.DataFrame:
+        """交易日历"""
+        raise NotImplementedError
+
+class AkshareProvider(MarketDataProvider):
+    """AKShare数据源"""
+
+    name = "akshare"
+
+    def __init__(self):
+        import akshare as ak
+        self._ak = ak
+
+    def stock_zh_a_hist(self, symbol, period="daily", start_date="19700101", end_date="20500101", adjust=""):
+        return self._ak.stock_zh_a_hist(
+            symbol=symbol,
+            period=period,
+            start_date=start_date,
+            end_date=end_date,
+            adjust=adjust
+        )
+
+    def stock_zh_a_hist_min_em(self, symbol, start_date="1979-09-01 09:32:00",
+                               end_date="2222-01-01 09:32:00", period="5", adjust=""):
+        return self._ak.stock_zh_a_hist_min_em(
+            symbol=symbol,
+            start_date=start_date,
+            end_date=end_date,
+            period=period,
+            adjust=adjust
+        )
+
+    def stock_zh_a_spot_em(self):
+        return self._ak.stock_zh_a_spot_em()
+
+    def tool_trade_date_hist_sina(self):
+        return self._ak.tool_trade_date_hist_sina()
+
+# 30分钟K线的收盘时间（A股交易时段 9:30-11:30, 13:00-15:00）
+MINUTE_30_TIMES = ['10:00', '10:30', '11:00', '11:30', '13:30', '14:00', '14:30', '15:00']
+
+class SyntheticProvider(MarketDataProvider):
+    """确定性合成数据源
+
+    按 (seed, 股票代码) 生成可复现的全市场行情，包含涨停、停牌、次新股上市和ST股，
+    用于离线运行完整的 周末扫描→日筛选→形态识别 流程以及压测。
+    """
+
+    name = "synthetic"
+
+    # 分钟K线只提供最近N个交易日（与东方财富接口一致）
+    MINUTE_DAYS = 60
+
+    # 沪市主板、深市主板、创业板，每个前缀 10000 个代码
+    PREFIXES = ['60', '00', '30']
+
+    # 日线缓存默认条数：10年日线每只约 0.3MB，256 只约 70MB
+    CACHE_SIZE = 256
+
+    def __init__(
+        self,
+        n_stocks: Optional[int] = None,
+        years: Optional[int] = None,
+        seed: Optional[int] = None,
+        end_date: Optional[date] = None,
+        cache_size: Optional[int] = None
+    ):
+        self.n_stocks = n_stocks or settings.synthetic_stock_count
+        if self.n_stocks > len(self.PREFIXES) * 10000:
+            raise ValueError(
+                f"n_stocks={self.n_stocks} exceeds the {len(self.PREFIXES) * 10000} synthetic codes available"
+            )
+        self.years = years or settings.synthetic_years
+        self.seed = settings.synthetic_seed if seed is None else seed
+        if end_date is None:
+            end_date = (
+                datetime.strptime(settings.synthetic_end_date, "%Y-%m-%d").date()
+                if settings.synthetic_end_date else datetime.now().date()
+            )
+        self.end_date = end_date
+
+        self.calendar = self._build_calendar()
+        self.codes = self._build_codes()
+        self._code_index = {code: i for i, code in enumerate(self.codes)}
+
+        self._cache: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        # 缓存条数有上限，全市场扫描时内存不随股票数量增长（重新生成只需几毫秒）
+        self._cache_size = cache_size or self.CACHE_SIZE
+        self._lock = threading.Lock()
+
+    # ---------- 基础数据 ----------
+
+    def _build_calendar(self) -> pd.DatetimeIndex:
+        """工作日去掉固定节假日（元旦、春节、劳动节、国庆）"""
+        start = self.end_date - timedelta(days=365 * self.years)
+        days = pd.bdate_range(start, self.end_date)
+
+        month_day = days.month * 100 + days.day
+        holiday = (
+            (month_day == 101) |
+            ((month_day >= 210) & (month_day <= 216)) |
+            ((month_day >= 501) & (month_day <= 503)) |
+            ((month_day >= 1001) & (month_day <= 1007))
+        )
+        return days[~holiday]
+
+    def _build_codes(self) -> List[str]:
+        """沪市主板、深市主板、创业板代码轮流分配"""
+        n_prefixes = len(self.PREFIXES)
+        return [
+            f"{self.PREFIXES[i % n_prefixes]}{i // n_prefixes:04d}"
+            for i in range(self.n_stocks)
+        ]
+
+    def _name(self, code: str) -> str:
+        index = self._code_index.get(code, 0)
+        return f"ST合成{code}" if index % 50 == 49 else f"合成{code}"
+
+    def _rng(self, code: str, salt: int = 0) -> np.random.Generator:
+        return np.random.default_rng([self.seed, int(code), salt])
+
+    # ---------- 日线生成 ----------
+
+    def _daily(self, code: str) -> pd.DataFrame:
+        """生成（并缓存）某只股票的全部日线"""
+        with self._lock:
+            if code in self._cache:
+                self._cache.move_to_end(code)
+                return self._cache[code]
+
+        df = self._generate_daily(code)
+
+        with self._lock:
+            self._cache[code] = df
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return df
+
+    def _generate_daily(self, code: str) -> pd.DataFrame:
+        if code not in self._code_index:
+            return pd.DataFrame()
+
+        rng = self._rng(code)
+        n = len(self.calendar)
+        limit = 0.20 if code.startswith('30') else 0.10
+
+        # 约20%的股票在区间内上市
+        listing = int(rng.integers(0, int(n * 0.6))) if rng.random() < 0.2 else 0
+
+        # 日收益率：带个股漂移和波动率的正态分布，截断在涨跌停内
+        # 均值扣除涨停日带来的额外收益，避免长区间内价格持续飙升
+        limit_up_prob = 0.015
+        drift = rng.normal(0.0002, 0.0003) - limit_up_prob * limit
+        vol = rng.uniform(0.015, 0.035)
+        returns = np.clip(rng.normal(drift, vol, n), -limit, limit)
+
+        # 涨停日
+        limit_up = rng.random(n) < limit_up_prob
+        returns[limit_up] = limit
+
+        # 停牌：随机开始，持续1-20个交易日
+        suspended = np.zeros(n, dtype=bool)
+        starts = np.flatnonzero(rng.random(n) < 0.002)
+        for s in starts:
+            suspended[s:s + int(rng.integers(1, 21))] = True
+        returns[suspended] = 0.0
+
+        base_price = rng.uniform(3, 80)
+        close = np.round(base_price * np.cumprod(1 + returns), 2)
+        close = np.maximum(close, 0.01)
+        prev_close = np.concatenate([[close[0]], close[:-1]])
+
+        # 涨停价按交易所规则四舍五入
+        close[limit_up] = np.round(prev_close[limit_up] * (1 + limit), 2)
+
+        gap = rng.normal(0, vol / 3, n)
+        open_ = np.round(prev_close * (1 + np.clip(gap, -limit, limit)), 2)
+        open_ = np.where(limit_up, np.minimum(open_, close), open_)
+        high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, vol / 3, n))), 2)
+        high = np.where(limit_up, close, np.minimum(high, np.round(prev_close * (1 + limit), 2)))
+        high = np.maximum(high, np.maximum(open_, close))
+        low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, vol / 3, n))), 2)
+        low = np.minimum(low, np.minimum(open_, close))
+
+        # 成交量（手）：放大于大幅波动和涨停日
+        base_volume = rng.lognormal(11, 0.8)
+        volume = base_volume * rng.lognormal(0, 0.3, n) * (1 + np.abs(returns) / vol)
+        volume[limit_up] *= 2.0
+        volume = np.round(volume).astype(np.int64)
+        amount = np.round(volume * 100 * (open_ + close) / 2, 2)
+
+        keep = ~suspended
+        keep[:listing] = False
+
+        dates = self.calendar[keep]
+        close, prev_close = close[keep], prev_close[keep]
+        open_, high, low = open_[keep], high[keep], low[keep]
+        volume, amount = volume[keep], amount[keep]
+        if len(close) == 0:
+            return pd.DataFrame()
+
+        # 停牌后首日的昨收为停牌前收盘
+        prev_close = np.concatenate([[open_[0]], close[:-1]])
+        change = np.round(close - prev_close, 2)
+
+        return pd.DataFrame({
+            '日期': dates.strftime('%Y-%m-%d'),
+            '股票代码': code,
+            '开盘': open_,
+            '收盘': close,
+            '最高': high,
+            '最低': low,
+            '成交量': volume,
+            '成交额': amount,
+            '振幅': np.round((high - low) / prev_close * 100, 2),
+            '涨跌幅': np.round(change / prev_close * 100, 2),
+            '涨跌额': change,
+            '换手率': np.round(volume / base_volume, 2),
+        })
+
+    def _weekly(self, daily: pd.DataFrame) -> pd.DataFrame:
+        """按自然周聚合日线，周线日期为该周最后一个交易日"""
+        dates = pd.to_datetime(daily['日期'])
+        week = dates.dt.to_period('W-SUN')
+        grouped = daily.assign(_week=week.values).groupby('_week', sort=True)
+
+        weekly = grouped.agg({
+            '日期': 'last',
+            '股票代码': 'last',
+            '开盘': 'first',
+            '收盘': 'last',
+            '最高': 'max',
+            '最低': 'min',
+            '成交量': 'sum',
+            '成交额': 'sum',
+            '换手率': 'sum',
+        }).reset_index(drop=True)
+
+        prev_close = weekly['收盘'].shift(1).fillna(weekly['开盘'])
+        weekly['涨跌额'] = np.round(weekly['收盘'] - prev_close, 2)
+        weekly['涨跌幅'] = np.round(weekly['涨跌额'] / prev_close * 100, 2)
+        weekly['振幅'] = np.round((weekly['最高'] - weekly['最低']) / prev_close * 100, 2)
+        return weekly
+
+    # ---------- 接口实现 ----------
+
+    def stock_zh_a_hist(self, symbol, period="daily", start_date="19700101", end_date="20500101", adjust=""):
+        daily = self._daily(symbol)
+        if daily.empty:
+            return pd.DataFrame()
+
+        if period == "weekly":
+            df = self._weekly(daily)
+        elif period == "daily":
+            df = daily
+        else:
+            raise ValueError(f"Unsupported period: {period}")
+
+        start = pd.Timestamp(start_date).strftime('%Y-%m-%d')
+        end = pd.Timestamp(end_date).strftime('%Y-%m-%d')
+        mask = (df['日期'] >= start) & (df['日期'] <= end)
+        return df[mask].reset_index(drop=True)
+
+    def stock_zh_a_hist_min_em(self, symbol, start_date="1979-09-01 09:32:00",
+                               end_date="2222-01-01 09:32:00", period="5", adjust=""):
+        if str(period) != "30":
+            raise ValueError(f"Unsupported minute period: {period}")
+
+        daily = self._daily(symbol).tail(self.MINUTE_DAYS)
+        if daily.empty:
+            return pd.DataFrame()
+
+        rng = self._rng(symbol, salt=30)
+        n_days, n_bars = len(daily), len(MINUTE_30_TIMES)
+
+        open_ = daily['开盘'].values
+        close = daily['收盘'].values
+
+        # 日内路径：8段收益之和等于日内 log(close/open)
+        steps = rng.normal(0, 0.004, (n_days, n_bars))
+        steps -= steps.mean(axis=1, keepdims=True)
+        steps += (np.log(close / open_) / n_bars)[:, None]
+        path = open_[:, None] * np.exp(np.cumsum(steps, axis=1))
+        path[:, -1] = close
+
+        bar_open = np.concatenate([open_[:, None], path[:, :-1]], axis=1)
+        bar_close = path
+        wiggle = np.abs(rng.normal(0, 0.002, (n_days, n_bars, 2)))
+        bar_high = np.maximum(bar_open, bar_close) * (1 + wiggle[..., 0])
+        bar_low = np.minimum(bar_open, bar_close) * (1 - wiggle[..., 1])
+
+        # 日内成交量U型分布
+        shape = np.array([0.2, 0.13, 0.1, 0.08, 0.1, 0.1, 0.12, 0.17])
+        bar_volume = np.round(daily['成交量'].values[:, None] * shape[None, :]).astype(np.int64)
+
+        times = [
+            f"{d} {t}:00"
+            for d in daily['日期'].values
+            for t in MINUTE_30_TIMES
+        ]
+
+        df = pd.DataFrame({
+            '时间': times,
+            '开盘': np.round(bar_open, 2).ravel(),
+            '收盘': np.round(bar_close, 2).ravel(),
+            '最高': np.round(bar_high, 2).ravel(),
+            '最低': np.round(bar_low, 2).ravel(),
+            '成交量': bar_volume.ravel(),
+        })
+        df['成交额'] = np.round(df['成交量'] * 100 * (df['开盘'] + df['收盘']) / 2, 2)
+        df['最新价'] = df['收盘']
+
+        start = pd.Timestamp(start_date).strftime('%Y-%m-%d %H:%M:%S')
+        end = pd.Timestamp(end_date).strftime('%Y-%m-%d %H:%M:%S')
+        mask = (df['时间'] >= start) & (df['时间'] <= end)
+        return df[mask].reset_index(drop=True)
+
+    def stock_zh_a_spot_em(self):
+        last_trade_date = self.calendar[-1].strftime('%Y-%m-%d')
+        rows = []
+
+        for i, code in enumerate(self.codes):
+            daily = self._daily(code)
+            row = {
+                '序号': i + 1,
+                '代码': code,
+                '名称': self._name(code),
+            }
+
+            if daily.empty or daily['日期'].iloc[-1] != last_trade_date:
+                # 停牌股票没有当日行情
+                prev = daily['收盘'].iloc[-1] if not daily.empty else np.nan
+                row.update({
+                    '最新价': np.nan, '涨跌幅': np.nan, '涨跌额': np.nan,
+                    '成交量': np.nan, '成交额': np.nan, '振幅': np.nan,
+                    '最高': np.nan, '最低': np.nan, '今开': np.nan, '昨收': prev,
+                    '换手率': np.nan,
+                })
+            else:
+                last = daily.iloc[-1]
+                row.update({
+                    '最新价': last['收盘'],
+                    '涨跌幅': last['涨跌幅'],
+                    '涨跌额': last['涨跌额'],
+                    '成交量': last['成交量'],
+                    '成交额': last['成交额'],
+                    '振幅': last['振幅'],
+                    '最高': last['最高'],
+                    '最低': last['最低'],
+                    '今开': last['开盘'],
+                    '昨收': round(last['收盘'] - last['涨跌额'], 2),
+                    '换手率': last['换手率'],
+                })
+            rows.append(row)
+
+        return pd.DataFrame(rows)
+
+    def tool_trade_date_hist_sina(self):
+        return pd.DataFrame({'trade_date': self.calendar.date})
+
+PROVIDERS = {
+    'akshare': AkshareProvider,
+    'synthetic': SyntheticProvider,
+}
+
+_provider: Optional[MarketDataProvider] = None
+_provider_lock = threading.Lock()
+
+def _build_provider() -> MarketDataProvider:
+    """按配置创建数据源，并按 data_capture_mode 包装录制/回放层"""
+    if settings.data_provider not in PROVIDERS:
+        raise ValueError(f"Unknown data provider: {settings.data_provider}")
+
+    mode = settings.data_capture_mode
+    if mode == "off":
+        return PROVIDERS[settings.data_provider]()
+
+    from app.services.data_archive import DataArchive, RecordingProvider, ReplayProvider
+
+    if mode == "record":
+        archive = DataArchive(session=settings.data_archive_session)
+        return RecordingProvider(PROVIDERS[settings.data_provider](), archive)
+
+    if mode == "replay":
+        session = settings.data_archive_session or DataArchive.latest_session()
+        if session is None:
+            raise ValueError(f"No recorded session found in {settings.data_archive_dir}")
+        fallback = PROVIDERS[settings.data_provider]() if settings.data_replay_fallback else None
+        return ReplayProvider(
+            DataArchive(session=session),
+            latency_ms=settings.data_replay_latency_ms,
+            fallback=fallback
+        )
+
+    raise ValueError(f"Unknown data capture mode: {mode}")
+
+def get_provider() -> MarketDataProvider:
+    """获取当前配置的数据源（settings.data_provider / data_capture_mode）"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = _build_provider()
+                logger.info(f"Using market data provider: {_provider.name}")
+    return _provider
+
+def set_provider(provider: MarketDataProvider):
+    """替换当前数据源（用于离线压测）"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
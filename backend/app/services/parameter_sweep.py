@@ -0,0 +1,86 @@
+import pandas as pd
+from typing import List
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+import logging
+
+from app.models.stock import DailyKline, WeeklyKline
+from app.utils.panel import IndicatorPanel
+from app.utils.screening import (
+    PrefixSums,
+    weekly_trend_rule,
+    volume_golden_cross_rule,
+    parameter_grid,
+    sweep,
+)
+
+logger = logging.getLogger(__name__)
+
+class ParameterSweep:
+    """筛选参数寻优：每种K线只读取一次、构建一次前缀和，评估多组周期参数
+
+    结果为 股票 × 参数组 的通过矩阵，规则与 WeekendScanner / DailyScanner 相同。
+    """
+
+    def __init__(self, db_session: AsyncSession):
+        self.db = db_session
+
+    async def _load_panel(self, model, columns: List[str], limit: int) -> IndicatorPanel:
+        """一次查询读取所有股票最近 limit 根K线，构建面板"""
+        row_number = func.row_number().over(
+            partition_by=model.stock_code,
+            order_by=model.trade_date.desc()
+        ).label('rn')
+        subq = select(
+            model.stock_code,
+            model.trade_date,
+            *[getattr(model, c) for c in columns],
+            row_number
+        ).subquery()
+        stmt = select(
+            subq.c.stock_code,
+            subq.c.trade_date,
+            *[subq.c[c] for c in columns]
+        ).where(subq.c.rn <= limit)
+
+        result = await self.db.execute(stmt)
+        rows = pd.DataFrame(result.all(), columns=['stock_code', 'trade_date'] + columns)
+        return IndicatorPanel.from_long(rows, fields=columns, max_bars=limit)
+
+    async def sweep_weekly(self, ma_periods: List[int], vol_ma_periods: List[int]) -> pd.DataFrame:
+        """周末扫描规则（收盘价 > N周均线 且 周成交量 > 周均量）的参数寻优"""
+        start_time = datetime.now()
+        panel = await self._load_panel(WeeklyKline, ['close', 'volume'], max(ma_periods + vol_ma_periods))
+        sums = PrefixSums(panel, ['close', 'volume'])
+
+        grid = parameter_grid(ma_period=ma_periods, vol_ma_period=vol_ma_periods)
+        matrix = sweep(sums, weekly_trend_rule, grid)
+
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Weekly sweep: {len(panel.codes)} stocks x {len(grid)} parameter sets in {duration:.2f}s")
+        return matrix
+
+    async def sweep_daily(
+        self,
+        short_periods: List[int],
+        long_periods: List[int],
+        days_back: int = 9
+    ) -> pd.DataFrame:
+        """日筛选均量线金叉规则的参数寻优（只评估 短周期 < 长周期 的组合）"""
+        start_time = datetime.now()
+        # 规则默认至少需要 长周期+10 根K线
+        panel = await self._load_panel(DailyKline, ['volume'], max(long_periods) + max(days_back + 1, 10))
+        sums = PrefixSums(panel, ['volume'])
+
+        grid = [
+            params for params in parameter_grid(short_period=short_periods, long_period=long_periods)
+            if params['short_period'] < params['long_period']
+        ]
+        for params in grid:
+            params['days_back'] = days_back
+        matrix = sweep(sums, volume_golden_cross_rule, grid)
+
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Daily sweep: {len(panel.codes)} stocks x {len(grid)} parameter sets in {duration:.2f}s")
+        return matrix
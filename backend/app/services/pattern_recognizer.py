@@ -6,12 +6,13 @@ from sqlalchemy import select, and_
 import asyncio
 import logging
 
-from app.models.stock import Stock, DailyKline, LimitUpRecord
-from app.models.scan_result import DailyPool
+from app.models.stock import Stock, DailyKline
+from app.models.scan_result import DailyPool, LimitUpRecord
 from app.models.signal import TradeSignal
-from app.utils.indicators import calculate_price_change, calculate_upper_shadow
-from app.utils.helpers import is_limit_up
+from app.utils.indicators import calculate_price_change, calculate_upper_shadow, is_limit_up
 from app.utils.redis_client import get_cache, set_cache
+from app.utils.worker_pool import BoundedRunner
+from app.services.stock_index import stock_index
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -34,29 +35,17 @@ class PatternRecognizer:
         """
         logger.info(f"Recognizing buy signals for {len(daily_pool)} stocks...")
         start_time = datetime.now()
+        await stock_index.ensure_loaded(self.db)
 
         signals = []
 
-        # 异步处理每只股票
-        tasks = []
-        for stock in daily_pool:
-            task = asyncio.create_task(self._process_buy_signal(stock))
-            tasks.append(task)
-
-            # 限制并发数量
-            if len(tasks) >= 10:
-                completed = await asyncio.gather(*tasks[:10])
-                for signal in completed:
-                    if signal:
-                        signals.append(signal)
-                tasks = tasks[10:]
-
-        # 处理剩余任务
-        if tasks:
-            completed = await asyncio.gather(*tasks)
-            for signal in completed:
-                if signal:
-                    signals.append(signal)
+        # 始终保持 max_workers 只股票在处理中，完成一只补充一只
+        runner = BoundedRunner('buy_signals', settings.max_workers, timeout=settings.scan_item_timeout)
+        async for stock, signal, error in runner.stream(daily_pool, self._process_buy_signal):
+            if error is not None:
+                logger.error(f"Error recognizing buy signal for {stock.get('code')}: {error!r}")
+            elif signal:
+                signals.append(signal)
 
         # 保存信号到数据库
         await self._save_signals(signals)
@@ -72,7 +61,7 @@ class PatternRecognizer:
     async def _process_buy_signal(self, stock: Dict) -> Optional[Dict]:
         """处理单只股票的买入信号"""
         code = stock['code']
-        name = stock['name']
+        name = stock_index.name(code, stock.get('name'))
 
         try:
             # 1. 查找最近涨停板
@@ -0,0 +1,119 @@
+import pandas as pd
+from typing import List, Optional
+import asyncio
+import threading
+import time
+import logging
+
+from app.utils.executor import run_blocking
+from app.services.market_data import get_provider
+from app.services.stock_index import stock_index
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class SpotSnapshot:
+    """全市场行情快照
+
+    每个刷新周期只请求一次 stock_zh_a_spot_em，内存中保存以代码为索引的行情表，
+    名称、代码、报价都从这里读取。并发调用共享同一次进行中的请求。
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.spot_snapshot_ttl if ttl is None else ttl
+        self._frame: Optional[pd.DataFrame] = None
+        self._fetched_at: float = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._sync_lock = threading.Lock()
+
+    def _is_fresh(self, max_age: Optional[float] = None) -> bool:
+        if self._frame is None:
+            return False
+        age = time.monotonic() - self._fetched_at
+        return age < (self.ttl if max_age is None else max_age)
+
+    def _set_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """保存行情表，以代码为索引（保留代码列）"""
+        if df is None or df.empty:
+            raise ValueError("Empty spot snapshot")
+
+        frame = df.copy()
+        frame['代码'] = frame['代码'].astype(str)
+        frame = frame.drop_duplicates(subset=['代码']).set_index('代码', drop=False)
+        frame.index.name = 'code'
+
+        self._frame = frame
+        self._fetched_at = time.monotonic()
+        logger.info(f"Refreshed spot snapshot with {len(frame)} stocks")
+
+        # 顺带更新股票索引中的名称和ST标记
+        stock_index.update_from_spot(frame)
+        return frame
+
+    async def _refresh(self) -> pd.DataFrame:
+        df = await run_blocking(get_provider().stock_zh_a_spot_em)
+        return self._set_frame(df)
+
+    async def get_frame(self, max_age: Optional[float] = None) -> pd.DataFrame:
+        """获取行情表，过期时刷新
+
+        Args:
+            max_age: 可接受的最大缓存时间（秒），默认使用ttl
+        """
+        if self._is_fresh(max_age):
+            return self._frame
+
+        loop = asyncio.get_running_loop()
+        if self._inflight is None or self._inflight.get_loop() is not loop:
+            self._inflight = asyncio.ensure_future(self._refresh())
+            self._inflight.add_done_callback(self._clear_inflight)
+
+        # shield: 单个调用方被取消不影响其他等待者
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future: asyncio.Future):
+        if self._inflight is future:
+            self._inflight = None
+
+    def get_frame_sync(self, max_age: Optional[float] = None) -> pd.DataFrame:
+        """同步获取行情表（用于非异步上下文）"""
+        with self._sync_lock:
+            if not self._is_fresh(max_age):
+                self._set_frame(get_provider().stock_zh_a_spot_em())
+            return self._frame
+
+    def get_cached_frame(self) -> Optional[pd.DataFrame]:
+        """获取当前缓存的行情表，不触发请求"""
+        return self._frame
+
+    async def get_codes(self) -> List[str]:
+        """获取全部股票代码"""
+        frame = await self.get_frame()
+        return frame.index.tolist()
+
+    async def get_name(self, stock_code: str) -> Optional[str]:
+        """获取股票名称"""
+        frame = await self.get_frame()
+        return self._lookup_name(frame, stock_code)
+
+    def get_name_sync(self, stock_code: str) -> Optional[str]:
+        """同步获取股票名称"""
+        return self._lookup_name(self.get_frame_sync(), stock_code)
+
+    def _lookup_name(self, frame: pd.DataFrame, stock_code: str) -> Optional[str]:
+        if stock_code in frame.index:
+            return frame.at[stock_code, '名称']
+        return None
+
+    async def get_quotes(self, stock_codes: List[str]) -> pd.DataFrame:
+        """获取指定股票的行情"""
+        frame = await self.get_frame()
+        return frame.loc[frame.index.intersection(stock_codes)]
+
+    def invalidate(self):
+        """使缓存失效，下次调用时重新请求"""
+        self._frame = None
+        self._fetched_at = 0.0
+
+# 进程内共享的行情快照
+spot_snapshot = SpotSnapshot()
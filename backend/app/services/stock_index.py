@@ -0,0 +1,139 @@
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+import asyncio
+import time
+import logging
+
+from app.models.stock import Stock
+from app.utils.helpers import parse_stock_code
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def board_of(code: str) -> str:
+    """按代码前缀判断板块"""
+    if code.startswith('688') or code.startswith('689'):
+        return '科创板'
+    if code.startswith('300') or code.startswith('301'):
+        return '创业板'
+    if code.startswith(('8', '4', '92')):
+        return '北交所'
+    return '主板'
+
+def is_st_name(name: Optional[str]) -> bool:
+    """名称带 ST（含 *ST、S*ST）的为风险警示股"""
+    return bool(name) and 'ST' in name.upper()
+
+class StockIndex:
+    """股票代码 -> 基础信息（名称、市场、板块、上市日期、ST标记）的内存索引
+
+    扫描开始时从 stocks 表加载一次，之后每次刷新行情快照时顺带更新名称和ST标记，
+    结果补充名称只是一次字典查找，不再逐只查询数据库或行情接口。
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.stock_index_ttl if ttl is None else ttl
+        self._entries: Dict[str, Dict] = {}
+        self._loaded_at: float = 0.0
+        self._lock = asyncio.Lock()
+
+    def _entry(self, code: str, name: Optional[str], market: Optional[str] = None, list_date=None) -> Dict:
+        return {
+            'code': code,
+            'name': name or code,
+            'market': market or parse_stock_code(code)['market'],
+            'board': board_of(code),
+            'list_date': list_date,
+            'is_st': is_st_name(name),
+        }
+
+    async def load(self, db: AsyncSession):
+        """从 stocks 表加载全部股票"""
+        try:
+            result = await db.execute(select(Stock.code, Stock.name, Stock.market, Stock.list_date))
+            rows = result.all()
+        except Exception as e:
+            logger.error(f"Error loading stock index: {e}")
+            return
+
+        entries = {code: self._entry(code, name, market, list_date) for code, name, market, list_date in rows}
+        # 只在快照中出现、库中还没有的股票保留
+        for code, entry in self._entries.items():
+            entries.setdefault(code, entry)
+        self._entries = entries
+        self._loaded_at = time.monotonic()
+        logger.info(f"Loaded stock index with {len(rows)} stocks")
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """未加载或已过期时从 stocks 表加载，并合并当前缓存的行情快照（不触发请求）"""
+        if self._loaded_at and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if self._loaded_at and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            await self.load(db)
+
+            from app.services.spot_snapshot import spot_snapshot
+            frame = spot_snapshot.get_cached_frame()
+            if frame is not None:
+                self.update_from_spot(frame)
+
+    def update_from_spot(self, frame: pd.DataFrame):
+        """用行情快照更新名称和ST标记，新出现的代码加入索引"""
+        if frame is None or frame.empty or '名称' not in frame.columns:
+            return
+
+        added = 0
+        for code, name in zip(frame['代码'].astype(str), frame['名称']):
+            if not isinstance(name, str) or not name:
+                continue
+            entry = self._entries.get(code)
+            if entry is None:
+                self._entries[code] = self._entry(code, name)
+                added += 1
+            elif entry['name'] != name:
+                entry['name'] = name
+                entry['is_st'] = is_st_name(name)
+        if added:
+            logger.info(f"Added {added} stocks to index from spot snapshot")
+
+    def get(self, code: str) -> Optional[Dict]:
+        return self._entries.get(code)
+
+    def name(self, code: str, default: Optional[str] = None) -> str:
+        entry = self._entries.get(code)
+        if entry is not None:
+            return entry['name']
+        return default or code
+
+    def names(self, codes: Iterable[str]) -> Dict[str, str]:
+        return {code: self.name(code) for code in codes}
+
+    def is_st(self, code: str) -> bool:
+        entry = self._entries.get(code)
+        return entry is not None and entry['is_st']
+
+    def codes(self) -> List[str]:
+        return list(self._entries)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self._entries),
+            'st_count': sum(1 for entry in self._entries.values() if entry['is_st']),
+            'age': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+        }
+
+    def invalidate(self):
+        """下次 ensure_loaded 时重新从库中加载"""
+        self._loaded_at = 0.0
+
+# 进程内共享的股票索引
+stock_index = StockIndex()
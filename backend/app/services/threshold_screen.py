@@ -0,0 +1,302 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import logging
+
+from app.models.stock import WeeklyKline, DailyKline, WeeklyThreshold
+from app.services.data_fetcher import DataFetcher
+from app.utils.helpers import week_monday, session_date
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 收盘价 > N周均线 等价于 本周收盘价 > 前 N-1 周收盘价之和 / (N-1)（本周收盘价同时出现在不等式两边），
+# 周成交量 > M周均量 同理。阈值只依赖本周之前的周线，每周计算一次，周内只需对比最新行情。
+
+class ThresholdScreen:
+    """基于预计算阈值的周末扫描筛选
+
+    第一阶段用一次全市场快照对比阈值，明显通过/明显不通过的直接判定；
+    阈值附近（相差不超过 margin）或日线数据不一致的股票交给完整计算。
+    """
+
+    def __init__(self, db_session: AsyncSession, fetcher: Optional[DataFetcher] = None):
+        self.db = db_session
+        self.fetcher = fetcher or DataFetcher()
+        self.ma_period = settings.ma_period_weekly
+        self.vol_ma_period = settings.vol_ma_period_weekly
+
+    async def refresh(self, as_of: Optional[date] = None, force: bool = False) -> int:
+        """增量刷新阈值表
+
+        只重算本周之前最后一根周线发生变化（新的一周、补齐历史）的股票，
+        周内重复调用几乎没有开销。
+
+        Args:
+            as_of: 行情所在交易日，默认 session_date()（与 evaluate 一致）
+
+        Returns:
+            重算的股票数量
+        """
+        monday = week_monday(as_of or session_date())
+
+        result = await self.db.execute(
+            select(WeeklyKline.stock_code, func.max(WeeklyKline.trade_date))
+            .where(WeeklyKline.trade_date < monday)
+            .group_by(WeeklyKline.stock_code)
+        )
+        latest = dict(result.all())
+
+        result = await self.db.execute(
+            select(
+                WeeklyThreshold.stock_code,
+                WeeklyThreshold.week_start,
+                WeeklyThreshold.base_date,
+                WeeklyThreshold.base_close
+            )
+        )
+        # 没有记录复权基准的旧阈值同样重算
+        existing = {
+            code: (week_start, base_date)
+            for code, week_start, base_date, base_close in result.all()
+            if base_close is not None
+        }
+
+        stale = [
+            code for code, base_date in latest.items()
+            if force or existing.get(code) != (monday, base_date)
+        ]
+        if not stale:
+            logger.info(f"Weekly thresholds for {monday} are up to date")
+            return 0
+
+        records = []
+        for start in range(0, len(stale), 1000):
+            history = await self._load_history(stale[start:start + 1000], monday)
+            chunk = self._compute(history, monday)
+            base_closes = await self._load_base_closes(chunk)
+            for record in chunk:
+                record['base_close'] = base_closes.get(record['stock_code'])
+            records.extend(chunk)
+
+        try:
+            for start in range(0, len(records), 1000):
+                stmt = pg_insert(WeeklyThreshold).values(records[start:start + 1000])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['stock_code'],
+                    set_={
+                        c: stmt.excluded[c]
+                        for c in [
+                            'week_start', 'base_date', 'base_close', 'history_weeks',
+                            'close_threshold', 'volume_threshold'
+                        ]
+                    }
+                )
+                await self.db.execute(stmt)
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error saving weekly thresholds: {e}")
+            await self.db.rollback()
+            raise
+
+        logger.info(f"Refreshed weekly thresholds for {len(records)} stocks (week of {monday})")
+        return len(records)
+
+    async def _load_history(self, codes: List[str], monday: date) -> pd.DataFrame:
+        """一次查询获取多只股票本周之前最近 N-1 周的收盘价和成交量"""
+        row_number = func.row_number().over(
+            partition_by=WeeklyKline.stock_code,
+            order_by=WeeklyKline.trade_date.desc()
+        ).label('rn')
+        subq = select(
+            WeeklyKline.stock_code,
+            WeeklyKline.trade_date,
+            WeeklyKline.close,
+            WeeklyKline.volume,
+            row_number
+        ).where(
+            WeeklyKline.stock_code.in_(codes),
+            WeeklyKline.trade_date < monday
+        ).subquery()
+        stmt = select(
+            subq.c.stock_code, subq.c.trade_date, subq.c.rn, subq.c.close, subq.c.volume
+        ).where(subq.c.rn <= max(self.ma_period, self.vol_ma_period) - 1)
+
+        result = await self.db.execute(stmt)
+        df = pd.DataFrame(result.all(), columns=['stock_code', 'trade_date', 'rn', 'close', 'volume'])
+        df['close'] = df['close'].astype('float64')
+        df['volume'] = df['volume'].astype('float64')
+        return df
+
+    async def _load_base_closes(self, records: List[Dict]) -> Dict[str, float]:
+        """计算阈值时各股票 base_date 的日线收盘价，之后日线被除权修复时据此识别阈值已失效"""
+        if not records:
+            return {}
+        keys = [(record['stock_code'], record['base_date']) for record in records]
+        result = await self.db.execute(
+            select(DailyKline.stock_code, DailyKline.close)
+            .where(tuple_(DailyKline.stock_code, DailyKline.trade_date).in_(keys))
+        )
+        return {code: float(close) for code, close in result.all() if close is not None}
+
+    def _compute(self, history: pd.DataFrame, monday: date) -> List[Dict]:
+        n_close = self.ma_period - 1
+        n_volume = self.vol_ma_period - 1
+
+        closes = history[history['rn'] <= n_close].groupby('stock_code')['close'].agg(['sum', 'count'])
+        volumes = history[history['rn'] <= n_volume].groupby('stock_code')['volume'].agg(['sum', 'count'])
+        base_dates = history[history['rn'] == 1].set_index('stock_code')['trade_date']
+
+        records = []
+        for code, base_date in base_dates.items():
+            close_sum, close_count = closes.loc[code]
+            volume_sum, volume_count = volumes.loc[code]
+            records.append({
+                'stock_code': code,
+                'week_start': monday,
+                'base_date': base_date,
+                'history_weeks': int(close_count),
+                # 历史不足 N-1 周时本周无法满足条件（与 weekly_trend_rule 一致）
+                'close_threshold': round(close_sum / n_close, 4) if close_count >= n_close else None,
+                # 均量与 calculate_ma 口径一致（min_periods=1）
+                'volume_threshold': round(volume_sum / volume_count, 2) if volume_count else None,
+            })
+        return records
+
+    async def evaluate(self, session: Optional[date] = None) -> pd.DataFrame:
+        """用一次全市场快照对比阈值
+
+        本周成交量 = 库中本周之前交易日的日线成交量 + 快照成交量。
+        快照中没有本周阈值记录的股票（新上市、周线刚补齐等）标记为不可信，交给完整计算；
+        只有已知历史不足 N-1 周的股票直接排除。
+
+        Returns:
+            以股票代码为索引的 DataFrame: close, week_volume, close_threshold, volume_threshold,
+            close_ratio, volume_ratio, ma, vol_ma, consistent（日线连续且未除权，阈值可信）
+
+        周内日线因除权除息被修复时，库中周线仍是旧的复权基准，
+        base_date 的日线收盘价与计算阈值时记录的不一致，这些股票同样视为不可信。
+        """
+        session = session or session_date()
+        monday = week_monday(session)
+
+        bars = await self.fetcher.fetch_spot_daily_bars(session)
+        if bars.empty:
+            return pd.DataFrame()
+        bars = bars.set_index('code')
+
+        result = await self.db.execute(
+            select(
+                WeeklyThreshold.stock_code,
+                WeeklyThreshold.history_weeks,
+                WeeklyThreshold.close_threshold,
+                WeeklyThreshold.volume_threshold,
+                WeeklyThreshold.base_close,
+                DailyKline.close
+            ).outerjoin(
+                DailyKline,
+                and_(
+                    DailyKline.stock_code == WeeklyThreshold.stock_code,
+                    DailyKline.trade_date == WeeklyThreshold.base_date
+                )
+            ).where(WeeklyThreshold.week_start == monday)
+        )
+        thresholds = pd.DataFrame(
+            result.all(),
+            columns=['code', 'history_weeks', 'close_threshold', 'volume_threshold', 'base_close', 'current_base_close']
+        ).set_index('code').astype('float64')
+
+        # 本周之前交易日的成交量
+        result = await self.db.execute(
+            select(DailyKline.stock_code, func.sum(DailyKline.volume))
+            .where(DailyKline.trade_date >= monday, DailyKline.trade_date < session)
+            .group_by(DailyKline.stock_code)
+        )
+        prior_volume = pd.Series(dict(result.all()), dtype='float64')
+
+        # 每只股票库中最近一根日线，用于检查连续性和复权基准
+        result = await self.db.execute(
+            select(DailyKline.stock_code, DailyKline.trade_date, DailyKline.close)
+            .where(DailyKline.trade_date < session)
+            .distinct(DailyKline.stock_code)
+            .order_by(DailyKline.stock_code, DailyKline.trade_date.desc())
+        )
+        last = pd.DataFrame(result.all(), columns=['code', 'trade_date', 'close']).set_index('code')
+
+        # 复权基准未变：base_date 的日线收盘价与计算阈值时一致（缺失时无法确认，按不一致处理）
+        same_basis = (thresholds.pop('base_close') - thresholds.pop('current_base_close')).abs() <= 0.011
+
+        frame = bars[['close', 'volume', 'prev_close']].join(thresholds, how='left')
+        # 历史不足 N-1 周的股票本周无法满足条件；没有阈值记录的保留（history_weeks 为空）
+        frame = frame[~(frame['history_weeks'] < self.ma_period - 1)]
+        frame['week_volume'] = prior_volume.reindex(frame.index).fillna(0) + frame['volume']
+
+        last_date = last['trade_date'].reindex(frame.index)
+        last_close = last['close'].astype('float64').reindex(frame.index)
+        frame['consistent'] = (
+            (last_date == last['trade_date'].max()) &
+            ((frame['prev_close'] - last_close).abs() <= 0.011) &
+            same_basis.reindex(frame.index, fill_value=False)
+        )
+
+        n_close = self.ma_period - 1
+        n_volume = np.minimum(frame['history_weeks'], self.vol_ma_period - 1)
+        frame['close_ratio'] = frame['close'] / frame['close_threshold']
+        frame['volume_ratio'] = frame['week_volume'] / frame['volume_threshold']
+        frame['ma'] = (frame['close_threshold'] * n_close + frame['close']) / self.ma_period
+        frame['vol_ma'] = (frame['volume_threshold'] * n_volume + frame['week_volume']) / (n_volume + 1)
+        return frame
+
+    async def screen(self, margin: Optional[float] = None, session: Optional[date] = None) -> Dict:
+        """两阶段筛选的第一阶段
+
+        Returns:
+            {'total': 参与对比的股票数, 'passed': 明显通过的行（DataFrame）, 'borderline': 需要完整计算的代码}
+        """
+        margin = settings.threshold_margin if margin is None else margin
+        frame = await self.evaluate(session)
+        if frame.empty:
+            return {'total': 0, 'passed': frame, 'borderline': []}
+
+        close_ratio, volume_ratio = frame['close_ratio'], frame['volume_ratio']
+        consistent = frame['consistent']
+        clear_pass = consistent & (close_ratio > 1 + margin) & (volume_ratio > 1 + margin)
+        clear_fail = consistent & ((close_ratio < 1 - margin) | (volume_ratio < 1 - margin))
+        borderline = frame.index[~clear_pass & ~clear_fail].tolist()
+
+        logger.info(
+            f"Threshold screen: {int(clear_pass.sum())} passed, {int(clear_fail.sum())} failed, "
+            f"{len(borderline)} borderline of {len(frame)}"
+        )
+        return {'total': len(frame), 'passed': frame[clear_pass], 'borderline': borderline}
+
+    async def near_qualifying(self, margin: Optional[float] = None) -> List[Dict]:
+        """盘中即将满足条件的股票：尚未通过，收盘价距阈值不超过 margin
+
+        周内成交量仍在累计，成交量比例只作参考。
+        """
+        margin = settings.threshold_alert_margin if margin is None else margin
+        frame = await self.evaluate()
+        if frame.empty:
+            return []
+
+        passing = (frame['close_ratio'] > 1) & (frame['volume_ratio'] > 1)
+        near = frame[frame['consistent'] & ~passing & (frame['close_ratio'] >= 1 - margin)]
+        near = near.sort_values('close_ratio', ascending=False)
+
+        return [
+            {
+                'code': code,
+                'close': float(row.close),
+                'close_threshold': float(row.close_threshold),
+                'close_ratio': round(float(row.close_ratio), 4),
+                'week_volume': int(row.week_volume),
+                'volume_threshold': float(row.volume_threshold),
+                'volume_ratio': round(float(row.volume_ratio), 4),
+            }
+            for code, row in zip(near.index, near.itertuples(index=False))
+        ]
@@ -1,23 +1,69 @@
-import akshare as ak
 import pandas as pd
-from typing import List, Dict, Optional
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from datetime import datetime, timedelta
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+from datetime import date, datetime, timedelta
 import asyncio
 import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, func, and_
+from sqlalchemy import select, insert, func, and_, cast, Float, text
 
 from app.database import AsyncSessionLocal
-from app.models.stock import Stock
+from app.models.stock import Stock, WeeklyKline
 from app.models.scan_result import WeekendScanResult
-from app.utils.indicators import calculate_ma
-from app.utils.helpers import is_trading_day, get_trading_calendar
+from app.utils.panel import IndicatorPanel
+from app.utils.indicator_cache import memoize_rows
+from app.utils.screening import weekly_trend_batch
+from app.utils.process_pool import map_batches
+from app.utils.helpers import is_trading_day, get_trading_calendar, week_monday, session_date
 from app.utils.redis_client import get_cache, set_cache
+from app.services.data_fetcher import DataFetcher
+from app.services.spot_snapshot import spot_snapshot
+from app.services.threshold_screen import ThresholdScreen
+from app.services.stock_index import stock_index
+from app.utils.resilience import retry_budget
+from app.utils.worker_pool import BoundedRunner
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+def weekly_ma_view(ma_period: int, vol_ma_period: int) -> Tuple[str, List[str]]:
+    """由数据库窗口函数计算的每只股票最新一周均线（物化视图）
+
+    视图每只股票一行：最新周线的日期、收盘价、成交量、N周均线、周均量和周线总数，
+    股票代码上有唯一索引（REFRESH ... CONCURRENTLY 需要）。视图名包含周期参数，
+    修改周期后会使用新视图。退市、停牌股票的最新周线停留在过去，查询时按日期过滤。
+
+    Returns:
+        (视图名, 创建语句)
+    """
+    name = f"weekly_ma_latest_{ma_period}_{vol_ma_period}"
+    return name, [
+        f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS
+        SELECT stock_code, trade_date, close, volume, ma, vol_ma, bars
+        FROM (
+            SELECT
+                stock_code,
+                trade_date,
+                close,
+                volume,
+                AVG(close) OVER (
+                    PARTITION BY stock_code ORDER BY trade_date
+                    ROWS BETWEEN {ma_period - 1} PRECEDING AND CURRENT ROW
+                ) AS ma,
+                AVG(volume) OVER (
+                    PARTITION BY stock_code ORDER BY trade_date
+                    ROWS BETWEEN {vol_ma_period - 1} PRECEDING AND CURRENT ROW
+                ) AS vol_ma,
+                COUNT(*) OVER (PARTITION BY stock_code) AS bars,
+                ROW_NUMBER() OVER (PARTITION BY stock_code ORDER BY trade_date DESC) AS rn
+            FROM weekly_klines
+        ) t
+        WHERE rn = 1
+        """,
+        f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{name}_code ON {name} (stock_code)",
+    ]
+
 class WeekendScanner:
     """周末全市场扫描器"""
 
@@ -27,12 +73,31 @@ class WeekendScanner:
         self.max_workers = settings.max_workers
         self.ma_period = settings.ma_period_weekly
         self.vol_ma_period = settings.vol_ma_period_weekly
+        self.fetcher = DataFetcher()
 
-    async def scan_all_stocks(self) -> Dict:
+    async def scan_all_stocks(self, mode: Optional[str] = None) -> Dict:
         """
         扫描全部A股，筛选符合条件的股票
         条件: 收盘价 > 233周均线 且 周成交量 > 周MA20
+
+        Args:
+            mode: fetch（逐只获取周线）/ local（只读 weekly_klines）/
+                sql（数据库计算均线）/ threshold（快照对比预计算阈值）/ auto，
+                默认 settings.weekend_scan_mode
         """
+        # 扫描开始时加载股票索引，结果补充名称不再逐只查询
+        await stock_index.ensure_loaded(self.db)
+
+        mode = mode or settings.weekend_scan_mode
+        if mode == 'sql':
+            return await self.scan_sql()
+        if mode == 'threshold':
+            return await self.scan_threshold()
+        if mode == 'local' or (
+            mode == 'auto' and await self._local_weekly_coverage() >= settings.local_scan_min_coverage
+        ):
+            return await self.scan_local()
+
         logger.info("Starting weekend scan...")
         start_time = datetime.now()
 
@@ -40,168 +105,303 @@ class WeekendScanner:
         stock_list = await self._get_all_stocks()
         logger.info(f"Total stocks to scan: {len(stock_list)}")
 
-        # 2. 并行处理每只股票
+        # 2. 获取周线并判断条件
+        results = await self._fetch_and_evaluate(stock_list)
+
+        # 3. 保存结果到数据库并缓存到Redis
+        return await self._finish(results, len(stock_list), start_time)
+
+    async def _fetch_and_evaluate(self, stock_list: List[str]) -> List[Dict]:
+        """并行获取每只股票的周线（已有当日缓存结果的直接使用），在面板上判断条件"""
         results = []
+        frames: Dict[str, pd.DataFrame] = {}
 
-        # 使用异步任务处理
-        tasks = []
-        for stock_code in stock_list:
-            task = asyncio.create_task(self._scan_single_stock_async(stock_code))
-            tasks.append(task)
-
-            # 限制并发数量
-            if len(tasks) >= self.max_workers:
-                completed = await asyncio.gather(*tasks[:self.max_workers])
-                for result in completed:
-                    if result and result['pass_condition']:
-                        results.append(result)
-                tasks = tasks[self.max_workers:]
-
-        # 处理剩余任务
-        if tasks:
-            completed = await asyncio.gather(*tasks)
-            for result in completed:
-                if result and result['pass_condition']:
-                    results.append(result)
-
-        # 3. 保存结果到数据库
-        await self._save_results(results)
+        # 整次扫描共享一个重试预算，上游故障时不会每只股票都重试到底
+        with retry_budget():
+            # 始终保持 max_workers 只股票在获取中，完成一只补充一只
+            runner = BoundedRunner('weekend_scan', self.max_workers, timeout=settings.scan_item_timeout)
+            async for stock_code, loaded, error in runner.stream(stock_list, self._load_stock):
+                if error is not None:
+                    logger.error(f"Error loading {stock_code}: {error!r}")
+                    continue
+                self._collect([loaded], results, frames)
+
+        # 本地K线存储索引落盘
+        self.fetcher.flush_store()
+
+        # 在全市场面板上一次性计算指标并判断条件
+        results.extend(await self._evaluate_panel(frames))
+        return results
+
+    async def scan_local(self) -> Dict:
+        """只用库中周线扫描（不请求数据源）
+
+        一次查询读取本周有周线的股票最近 233 周的收盘价和成交量，在面板上向量化判断条件，结果批量写入。
+        """
+        logger.info("Starting local weekend scan from weekly_klines...")
+        start_time = datetime.now()
+
+        panel = await self._load_weekly_panel(
+            max(self.ma_period, self.vol_ma_period), since=week_monday(session_date())
+        )
+        logger.info(f"Loaded weekly panel: {len(panel.codes)} stocks x {panel.n_bars} weeks")
+
+        evaluated = await self._evaluate(panel)
+        results = await self._passed_results(panel, evaluated)
+
+        return await self._finish(results, len(panel.codes), start_time)
+
+    async def scan_threshold(self) -> Dict:
+        """基于预计算阈值的两阶段扫描
+
+        第一阶段用一次全市场快照对比阈值表，明显通过/不通过的直接判定；
+        第二阶段只对阈值附近或日线数据不一致的股票获取周线做完整计算。
+        """
+        logger.info("Starting threshold weekend scan...")
+        start_time = datetime.now()
+
+        # 刷新阈值和对比快照使用同一个交易日
+        session = session_date()
+        screen = ThresholdScreen(self.db, self.fetcher)
+        await screen.refresh(as_of=session)
+        phase = await screen.screen(session=session)
+
+        passed = phase['passed']
+        results = [
+            {
+                'code': code,
+                'name': stock_index.name(code),
+                'close_price': float(row.close),
+                'ma233_weekly': float(row.ma),
+                'volume': int(row.week_volume),
+                'vol_ma20_weekly': int(row.vol_ma),
+                'pass_condition': True
+            }
+            for code, row in zip(passed.index, passed.itertuples(index=False))
+        ]
+
+        if phase['borderline']:
+            logger.info(f"Fully evaluating {len(phase['borderline'])} borderline stocks")
+            results.extend(await self._fetch_and_evaluate(phase['borderline']))
+
+        return await self._finish(results, phase['total'], start_time)
+
+    async def scan_sql(self) -> Dict:
+        """由数据库计算均线并筛选，只把通过的股票传回
+
+        先刷新（首次为创建）weekly_ma_view 物化视图，再按索引查询通过条件的股票。
+        只统计最新周线在本周的股票，退市、停牌股票不参与。
+        """
+        logger.info("Starting SQL weekend scan...")
+        start_time = datetime.now()
 
-        # 4. 缓存到Redis
+        view = await self.refresh_weekly_ma_view()
+        monday = week_monday(session_date())
+        result = await self.db.execute(text(f"""
+            SELECT stock_code, close::float, ma::float, volume, vol_ma::float
+            FROM {view}
+            WHERE trade_date >= :monday AND bars >= :ma_period AND close > ma AND volume > vol_ma
+            ORDER BY stock_code
+        """), {'monday': monday, 'ma_period': self.ma_period})
+        rows = result.all()
+
+        total = (await self.db.execute(
+            text(f"SELECT COUNT(*) FROM {view} WHERE trade_date >= :monday"), {'monday': monday}
+        )).scalar_one()
+        results = [
+            {
+                'code': code,
+                'name': stock_index.name(code),
+                'close_price': close,
+                'ma233_weekly': ma,
+                'volume': int(volume),
+                'vol_ma20_weekly': int(vol_ma),
+                'pass_condition': True
+            }
+            for code, close, ma, volume, vol_ma in rows
+        ]
+
+        return await self._finish(results, total, start_time)
+
+    async def refresh_weekly_ma_view(self) -> str:
+        """创建或刷新最新周均线物化视图，返回视图名"""
+        view, ddl = weekly_ma_view(self.ma_period, self.vol_ma_period)
+        exists = (await self.db.execute(
+            text("SELECT to_regclass(:name) IS NOT NULL"), {'name': view}
+        )).scalar_one()
+
+        if exists:
+            # 并发刷新，刷新期间视图仍可查询
+            await self.db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+        else:
+            for statement in ddl:
+                await self.db.execute(text(statement))
+            logger.info(f"Created materialized view {view}")
+        await self.db.commit()
+        return view
+
+    async def _finish(self, results: List[Dict], total: int, start_time: datetime) -> Dict:
+        """保存、缓存结果并汇总"""
+        await self._save_results(results)
         await self._cache_results(results)
 
         end_time = datetime.now()
         scan_duration = (end_time - start_time).total_seconds()
 
         logger.info(f"Weekend scan completed in {scan_duration:.2f} seconds")
-        logger.info(f"Total scanned: {len(stock_list)}, Passed: {len(results)}")
+        logger.info(f"Total scanned: {total}, Passed: {len(results)}")
 
         return {
             'scan_date': datetime.now().date(),
-            'total_scanned': len(stock_list),
+            'total_scanned': total,
             'passed_count': len(results),
             'results': results,
             'duration': scan_duration
         }
 
-    async def _scan_single_stock_async(self, stock_code: str) -> Optional[Dict]:
-        """异步扫描单只股票"""
+    async def _local_weekly_coverage(self) -> float:
+        """库中周线对本周的覆盖率：本周已有周线的股票数 / 股票列表中的股票数"""
+        monday = week_monday(session_date())
+        result = await self.db.execute(
+            select(func.count(func.distinct(WeeklyKline.stock_code)))
+            .where(WeeklyKline.trade_date >= monday)
+        )
+        current = result.scalar_one()
+
+        listed = (await self.db.execute(select(func.count(Stock.code)))).scalar_one() or len(stock_index)
+        coverage = current / listed if listed else 0.0
+        logger.info(f"Weekly klines cover {current}/{listed} stocks for the week of {monday}")
+        return coverage
+
+    async def _load_weekly_panel(self, limit: int, since: Optional[date] = None) -> IndicatorPanel:
+        """一次流式查询读取所有股票最近 limit 周的收盘价和成交量，构建面板
+
+        指定 since 时只读取最新周线不早于该日期的股票（排除退市、停牌的股票）。
+        """
+        row_number = func.row_number().over(
+            partition_by=WeeklyKline.stock_code,
+            order_by=WeeklyKline.trade_date.desc()
+        ).label('rn')
+        latest = func.max(WeeklyKline.trade_date).over(
+            partition_by=WeeklyKline.stock_code
+        ).label('latest')
+        subq = select(
+            WeeklyKline.stock_code,
+            WeeklyKline.trade_date,
+            # 在库中转为浮点，避免逐值构造 Decimal
+            cast(WeeklyKline.close, Float).label('close'),
+            cast(WeeklyKline.volume, Float).label('volume'),
+            row_number,
+            latest
+        ).subquery()
+        stmt = select(
+            subq.c.stock_code, subq.c.trade_date, subq.c.close, subq.c.volume
+        ).where(subq.c.rn <= limit)
+        if since is not None:
+            stmt = stmt.where(subq.c.latest >= since)
+
+        columns = ['stock_code', 'trade_date', 'close', 'volume']
+        chunks = []
+        result = await self.db.stream(stmt)
+        async for rows in result.partitions(100000):
+            chunks.append(pd.DataFrame(rows, columns=columns))
+
+        rows = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+        return IndicatorPanel.from_long(rows, fields=['close', 'volume'], max_bars=limit)
+
+    async def _load_stock(self, stock_code: str) -> Tuple[str, Optional[Dict], Optional[pd.DataFrame]]:
+        """获取单只股票的当日缓存结果或周线数据
+
+        Returns:
+            (股票代码, 缓存的扫描结果, 周线数据)
+        """
         try:
             # 检查缓存
             cache_key = f"weekend_scan:{stock_code}:{datetime.now().strftime('%Y%m%d')}"
             cached_result = await get_cache(cache_key)
             if cached_result:
-                return cached_result
+                return stock_code, cached_result, None
 
             # 获取周线数据
-            df_weekly = await self._get_weekly_data(stock_code)
-
-            if df_weekly is None or len(df_weekly) < self.ma_period:
-                return None
-
-            # 计算指标
-            df_weekly['ma233'] = calculate_ma(df_weekly['close'], self.ma_period)
-            df_weekly['vol_ma20'] = calculate_ma(df_weekly['volume'], self.vol_ma_period)
-
-            # 最新一周数据
-            latest = df_weekly.iloc[-1]
-
-            # 判断条件
-            pass_condition = (
-                latest['close'] > latest['ma233'] and
-                latest['volume'] > latest['vol_ma20']
-            )
-
-            if pass_condition:
-                result = {
-                    'code': stock_code,
-                    'name': await self._get_stock_name(stock_code),
-                    'close_price': float(latest['close']),
-                    'ma233_weekly': float(latest['ma233']),
-                    'volume': int(latest['volume']),
-                    'vol_ma20_weekly': int(latest['vol_ma20']),
-                    'pass_condition': True
-                }
-
-                # 缓存结果（7天）
-                await set_cache(cache_key, result, ttl=604800)
-
-                return result
-
-            return None
+            return stock_code, None, await self._get_weekly_data(stock_code)
 
         except Exception as e:
             logger.error(f"Error scanning {stock_code}: {e}")
-            return None
-
-    def _scan_single_stock(self, stock_code: str) -> Optional[Dict]:
-        """扫描单只股票（同步版本，用于进程池）"""
-        try:
-            # 获取周线数据
-            df_weekly = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="weekly",
-                adjust="qfq"
-            )
-
-            if df_weekly is None or len(df_weekly) < self.ma_period:
-                return None
-
-            # 重命名列
-            df_weekly = df_weekly.rename(columns={
-                '收盘': 'close',
-                '成交量': 'volume'
-            })
-
-            # 计算指标
-            df_weekly['ma233'] = calculate_ma(df_weekly['close'], self.ma_period)
-            df_weekly['vol_ma20'] = calculate_ma(df_weekly['volume'], self.vol_ma_period)
+            return stock_code, None, None
 
-            # 最新一周数据
-            latest = df_weekly.iloc[-1]
+    def _collect(self, completed: List[Tuple], results: List[Dict], frames: Dict[str, pd.DataFrame]):
+        """归集获取结果"""
+        for stock_code, cached_result, df_weekly in completed:
+            if cached_result is not None:
+                if cached_result.get('pass_condition'):
+                    results.append(cached_result)
+            elif df_weekly is not None and len(df_weekly) >= self.ma_period:
+                frames[stock_code] = df_weekly
 
-            # 判断条件
-            pass_condition = (
-                latest['close'] > latest['ma233'] and
-                latest['volume'] > latest['vol_ma20']
-            )
-
-            if pass_condition:
-                return {
-                    'code': stock_code,
-                    'name': self._get_stock_name_sync(stock_code),
-                    'close_price': float(latest['close']),
-                    'ma233_weekly': float(latest['ma233']),
-                    'volume': int(latest['volume']),
-                    'vol_ma20_weekly': int(latest['vol_ma20']),
-                    'pass_condition': True
-                }
+    async def _evaluate_panel(self, frames: Dict[str, pd.DataFrame]) -> List[Dict]:
+        """在股票 × 周 面板上计算233周均线和周均量，判断条件
 
-            return None
+        条件: 收盘价 > 233周均线 且 周成交量 > 周MA20
+        """
+        if not frames:
+            return []
+
+        panel = IndicatorPanel.from_frames(frames, time_column='date', max_bars=self.ma_period + 20)
+
+        # K线未变化的股票直接取缓存的结果
+        evaluated = await memoize_rows(
+            panel, 'weekly', 'weekly_trend',
+            {'ma': self.ma_period, 'vol_ma': self.vol_ma_period},
+            ['close', 'volume'], self._evaluate
+        )
+        results = await self._passed_results(panel, evaluated)
+
+        # 缓存结果（7天）
+        for result in results:
+            cache_key = f"weekend_scan:{result['code']}:{datetime.now().strftime('%Y%m%d')}"
+            await set_cache(cache_key, result, ttl=604800)
+
+        logger.info(f"Evaluated {len(panel.codes)} stocks on weekly panel, {len(results)} passed")
+        return results
+
+    async def _evaluate(self, panel: IndicatorPanel) -> Dict[str, list]:
+        """判断条件，返回 股票代码 -> [是否通过, 均线, 均量]；启用进程池时分批在子进程中计算"""
+        return await map_batches(
+            weekly_trend_batch, panel.codes,
+            {'close': panel['close'], 'volume': panel['volume']},
+            ma_period=self.ma_period, vol_ma_period=self.vol_ma_period
+        )
+
+    async def _passed_results(self, panel: IndicatorPanel, evaluated: Dict[str, list]) -> List[Dict]:
+        """由判断结果生成通过股票的扫描结果（最新一周数据）"""
+        close = panel['close'][:, -1]
+        volume = panel['volume'][:, -1]
+        passed = [i for i, code in enumerate(panel.codes) if evaluated[code][0]]
 
-        except Exception as e:
-            logger.error(f"Error scanning {stock_code}: {e}")
-            return None
+        results = []
+        for i in passed:
+            stock_code = panel.codes[i]
+            _, ma233, vol_ma20 = evaluated[stock_code]
+            results.append({
+                'code': stock_code,
+                'name': stock_index.name(stock_code),
+                'close_price': float(close[i]),
+                'ma233_weekly': float(ma233),
+                'volume': int(volume[i]),
+                'vol_ma20_weekly': int(vol_ma20),
+                'pass_condition': True
+            })
+        return results
 
     async def _get_weekly_data(self, stock_code: str) -> Optional[pd.DataFrame]:
-        """获取周线数据"""
+        """获取周线数据（优先读取本地K线存储）"""
         try:
-            df = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="weekly",
-                adjust="qfq"
-            )
+            df = await self.fetcher.fetch_weekly_data(stock_code, weeks=self.ma_period + 20)
 
             if df is None or df.empty:
                 return None
 
-            # 重命名列
-            df = df.rename(columns={
-                '收盘': 'close',
-                '成交量': 'volume'
-            })
-
-            return df[['close', 'volume']]
+            return df[['date', 'close', 'volume']]
 
         except Exception as e:
             logger.error(f"Error getting weekly data for {stock_code}: {e}")
@@ -219,7 +419,7 @@ class WeekendScanner:
 
         # 从API获取股票列表
         try:
-            stock_info = ak.stock_zh_a_spot_em()
+            stock_info = await spot_snapshot.get_frame()
             if stock_info is not None and not stock_info.empty:
                 stocks = stock_info['代码'].tolist()
                 # 保存到数据库
@@ -238,31 +438,6 @@ class WeekendScanner:
         # 返回默认列表
         return ['600519', '000858', '000002', '600036', '000001']
 
-    def _get_stock_name_sync(self, stock_code: str) -> str:
-        """同步获取股票名称"""
-        try:
-            # 从缓存的股票列表中获取
-            stock_info = ak.stock_zh_a_spot_em()
-            if stock_info is not None and not stock_info.empty:
-                stock = stock_info[stock_info['代码'] == stock_code]
-                if not stock.empty:
-                    return stock['名称'].iloc[0]
-        except:
-            pass
-        return stock_code
-
-    async def _get_stock_name(self, stock_code: str) -> str:
-        """获取股票名称"""
-        # 先从数据库查询
-        stmt = select(Stock.name).where(Stock.code == stock_code)
-        result = await self.db.execute(stmt)
-        name = result.scalar_one_or_none()
-        if name:
-            return name
-
-        # 从API获取
-        return self._get_stock_name_sync(stock_code)
-
     async def _save_results(self, results: List[Dict]):
         """保存扫描结果到数据库"""
         if not results:
@@ -277,19 +452,20 @@ class WeekendScanner:
                 )
             )
 
-            # 插入新记录
-            for result in results:
-                scan_result = WeekendScanResult(
-                    scan_date=today,
-                    stock_code=result['code'],
-                    stock_name=result['name'],
-                    close_price=result['close_price'],
-                    ma233_weekly=result['ma233_weekly'],
-                    volume=result['volume'],
-                    vol_ma20_weekly=result['vol_ma20_weekly'],
-                    pass_condition=True
-                )
-                self.db.add(scan_result)
+            # 批量插入新记录
+            await self.db.execute(insert(WeekendScanResult), [
+                {
+                    'scan_date': today,
+                    'stock_code': result['code'],
+                    'stock_name': result['name'],
+                    'close_price': result['close_price'],
+                    'ma233_weekly': result['ma233_weekly'],
+                    'volume': result['volume'],
+                    'vol_ma20_weekly': result['vol_ma20_weekly'],
+                    'pass_condition': True
+                }
+                for result in results
+            ])
 
             await self.db.commit()
             logger.info(f"Saved {len(results)} weekend scan results")
@@ -0,0 +1,210 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A股120分钟K线：上午 9:30-11:30、下午 13:00-15:00 各一根，以收盘时间标记
+SESSION_CLOSE_MINUTES = (11 * 60 + 30, 15 * 60)
+# 30分钟K线以结束时间标记，11:30（含）之前属于上午
+MORNING_LAST_MINUTE = 11 * 60 + 30
+BARS_PER_SESSION = 4
+
+MINUTE_BAR_COLUMNS = ['stock_code', 'datetime', 'open', 'high', 'low', 'close', 'volume', 'amount']
+
+def _aggregate(
+    df: pd.DataFrame,
+    boundary: np.ndarray,
+    columns: List[str]
+) -> Dict[str, np.ndarray]:
+    """按分桶起点一次性聚合OHLCV（df需已按股票、时间排序）
+
+    Returns:
+        各列聚合结果，另附 starts/ends（每个桶的首尾行号）
+    """
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], len(df)) - 1
+
+    result = {
+        'starts': starts,
+        'ends': ends,
+        'open': df['open'].to_numpy(dtype='float64')[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype='float64'), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype='float64'), starts),
+        'close': df['close'].to_numpy(dtype='float64')[ends],
+    }
+    for column in columns:
+        result[column] = np.add.reduceat(df[column].to_numpy(dtype='float64'), starts)
+    return result
+
+def week_start(dates: pd.Series) -> np.ndarray:
+    """每个日期所在周的周一（datetime64[D]）
+
+    1970-01-01 是周四，按天数偏移 3 取模即可得到距周一的天数。
+    """
+    days = pd.to_datetime(dates).values.astype('datetime64[D]')
+    offset = (days.astype(np.int64) + 3) % 7
+    return days - offset.astype('timedelta64[D]')
+
+def resample_weekly(
+    daily: pd.DataFrame,
+    trading_days: Optional[Iterable] = None
+) -> pd.DataFrame:
+    """将多只股票的日线一次性合成为周线
+
+    按 (股票代码, 自然周) 分桶，节假日造成的短周只包含实际交易日，
+    整周休市的周不产生K线；周线日期为该股票本周最后一个交易日（与东方财富周线口径一致）。
+
+    Args:
+        daily: 包含 stock_code, trade_date, open, high, low, close, volume 列
+        trading_days: 交易日历，提供时丢弃非交易日的K线
+
+    Returns:
+        DataFrame with columns: stock_code, trade_date, open, high, low, close, volume
+    """
+    columns = ['stock_code', 'trade_date', 'open', 'high', 'low', 'close', 'volume']
+    if daily is None or daily.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = daily[columns].copy()
+    df['trade_date'] = pd.to_datetime(df['trade_date'])
+
+    if trading_days is not None:
+        calendar = pd.DatetimeIndex(pd.to_datetime(list(trading_days)))
+        if len(calendar):
+            invalid = ~df['trade_date'].isin(calendar)
+            if invalid.any():
+                logger.warning(f"Dropping {int(invalid.sum())} daily bars on non-trading days")
+                df = df[~invalid]
+            if df.empty:
+                return pd.DataFrame(columns=columns)
+
+    df = df.sort_values(['stock_code', 'trade_date'], kind='stable').reset_index(drop=True)
+
+    codes = df['stock_code'].values
+    weeks = week_start(df['trade_date'])
+
+    # 股票代码或周变化的位置即为新一根周线的起点
+    boundary = np.ones(len(df), dtype=bool)
+    boundary[1:] = (codes[1:] != codes[:-1]) | (weeks[1:] != weeks[:-1])
+    agg = _aggregate(df, boundary, ['volume'])
+
+    return pd.DataFrame({
+        'stock_code': codes[agg['starts']],
+        'trade_date': df['trade_date'].values[agg['ends']],
+        'open': agg['open'],
+        'high': agg['high'],
+        'low': agg['low'],
+        'close': agg['close'],
+        'volume': agg['volume'],
+    })
+
+def session_bar_ids(datetimes: pd.Series) -> np.ndarray:
+    """30分钟K线所属的120分钟K线编号：交易日序号 * 2 + 时段（上午0，下午1）"""
+    values = pd.to_datetime(datetimes).values
+    days = values.astype('datetime64[D]')
+    minutes = (values - days).astype('timedelta64[m]').astype(np.int64)
+    session = (minutes > MORNING_LAST_MINUTE).astype(np.int64)
+    return days.astype(np.int64) * 2 + session
+
+def session_bar_times(bar_ids: np.ndarray) -> np.ndarray:
+    """120分钟K线编号转换为收盘时间（11:30 / 15:00）"""
+    bar_ids = np.asarray(bar_ids, dtype=np.int64)
+    days = (bar_ids // 2).astype('datetime64[D]').astype('datetime64[m]')
+    close_minutes = np.where(bar_ids % 2 == 0, SESSION_CLOSE_MINUTES[0], SESSION_CLOSE_MINUTES[1])
+    return days + close_minutes.astype('timedelta64[m]')
+
+def build_120min_bars(bars_30min: pd.DataFrame) -> pd.DataFrame:
+    """将多只股票的30分钟K线一次性合成为120分钟K线
+
+    每个交易日按交易所时段固定两根：上午4根30分钟K线合成 11:30 一根，
+    下午4根合成 15:00 一根。分桶完全由时间戳计算，不经过 resample。
+
+    Args:
+        bars_30min: 包含 stock_code, datetime, open, high, low, close, volume, amount 列，
+                    datetime 为30分钟K线的结束时间
+
+    Returns:
+        DataFrame with columns: stock_code, datetime, open, high, low, close, volume, amount,
+        complete（该时段4根30分钟K线是否已齐）
+    """
+    columns = MINUTE_BAR_COLUMNS + ['complete']
+    if bars_30min is None or bars_30min.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = bars_30min[MINUTE_BAR_COLUMNS].sort_values(
+        ['stock_code', 'datetime'], kind='stable'
+    ).reset_index(drop=True)
+
+    codes = df['stock_code'].values
+    bar_ids = session_bar_ids(df['datetime'])
+
+    boundary = np.ones(len(df), dtype=bool)
+    boundary[1:] = (codes[1:] != codes[:-1]) | (bar_ids[1:] != bar_ids[:-1])
+    agg = _aggregate(df, boundary, ['volume', 'amount'])
+    counts = agg['ends'] - agg['starts'] + 1
+
+    return pd.DataFrame({
+        'stock_code': codes[agg['starts']],
+        'datetime': session_bar_times(bar_ids[agg['starts']]),
+        'open': agg['open'],
+        'high': agg['high'],
+        'low': agg['low'],
+        'close': agg['close'],
+        'volume': agg['volume'],
+        'amount': agg['amount'],
+        'complete': counts >= BARS_PER_SESSION,
+    })
+
+class SessionBarBuilder:
+    """增量120分钟K线合成器
+
+    保留每只股票最后一个时段内的30分钟K线（最多4根），新的30分钟K线到达时
+    与其合并重算，输出受影响的120分钟K线（走完的和仍在进行中的）。
+    与已处理的最后一根时间相同的30分钟K线（上游修正后重发）替换原K线，并重新输出所属的120分钟K线。
+    """
+
+    def __init__(self):
+        self._pending = pd.DataFrame(columns=MINUTE_BAR_COLUMNS)
+        self._last_seen: Dict[str, pd.Timestamp] = {}
+
+    def last_seen(self, stock_code: str) -> Optional[pd.Timestamp]:
+        """该股票已处理的最后一根30分钟K线时间"""
+        return self._last_seen.get(stock_code)
+
+    def update(self, bars_30min: pd.DataFrame) -> pd.DataFrame:
+        """输入新到达的30分钟K线（可包含多只股票），返回受影响的120分钟K线"""
+        if bars_30min is None or bars_30min.empty:
+            return pd.DataFrame(columns=MINUTE_BAR_COLUMNS + ['complete'])
+
+        new = bars_30min[MINUTE_BAR_COLUMNS].copy()
+        new['datetime'] = pd.to_datetime(new['datetime'])
+
+        # 丢弃早于已处理位置的K线，时间相同的视为重发，替换原K线
+        seen = pd.to_datetime(new['stock_code'].map(self._last_seen))
+        new = new[seen.isna() | (new['datetime'] >= seen)]
+        if new.empty:
+            return pd.DataFrame(columns=MINUTE_BAR_COLUMNS + ['complete'])
+
+        touched = self._pending['stock_code'].isin(new['stock_code'].unique())
+        pending = self._pending[touched]
+        combined = pd.concat([pending, new], ignore_index=True) if not pending.empty else new
+        combined = combined.drop_duplicates(['stock_code', 'datetime'], keep='last')
+        combined = combined.sort_values(['stock_code', 'datetime'], kind='stable').reset_index(drop=True)
+        bars = build_120min_bars(combined)
+
+        # 只输出包含新到达K线的时段
+        bar_ids = session_bar_ids(bars['datetime'])
+        new_keys = pd.MultiIndex.from_arrays([new['stock_code'].values, session_bar_ids(new['datetime'])])
+        affected = pd.MultiIndex.from_arrays([bars['stock_code'].values, bar_ids]).isin(new_keys)
+
+        # 每只股票最后一个时段的K线留待下次合并（已走完的也保留，以便重发时重算）
+        combined_ids = session_bar_ids(combined['datetime'])
+        last_ids = pd.Series(combined_ids).groupby(combined['stock_code'].values).transform('max').values
+        self._pending = pd.concat(
+            [self._pending[~touched], combined[combined_ids == last_ids]], ignore_index=True
+        )
+        self._last_seen.update(combined.groupby('stock_code')['datetime'].max().to_dict())
+
+        return bars[affected].reset_index(drop=True)
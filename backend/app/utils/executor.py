@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+import asyncio
+import logging
+
+from app.config import settings
+from app.utils.rate_limiter import upstream_limiter
+from app.utils.resilience import upstream_breaker
+
+logger = logging.getLogger(__name__)
+
+# AKShare专用线程池，首次使用时创建
+_executor: Optional[ThreadPoolExecutor] = None
+
+def get_executor() -> ThreadPoolExecutor:
+    """获取AKShare调用专用线程池"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.akshare_max_workers,
+            thread_name_prefix="akshare"
+        )
+        logger.info(f"Created AKShare executor with {settings.akshare_max_workers} workers")
+    return _executor
+
+async def run_blocking(
+    func: Callable[..., Any],
+    *args,
+    call_timeout: Optional[float] = None,
+    limited: bool = True,
+    **kwargs
+) -> Any:
+    """在线程池中执行阻塞调用，避免阻塞事件循环
+
+    Args:
+        func: 阻塞函数（如 ak.stock_zh_a_hist）
+        call_timeout: 单次调用超时（秒），默认使用 settings.akshare_timeout
+        limited: 是否经过共享的上游限流器和熔断器
+
+    Raises:
+        asyncio.TimeoutError: 调用超时。注意线程本身无法被中断，会在后台自然结束
+        CircuitOpenError: 上游错误率过高，熔断器打开
+    """
+    loop = asyncio.get_running_loop()
+    timeout = settings.akshare_timeout if call_timeout is None else call_timeout
+
+    async def _call():
+        future = loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Call to {getattr(func, '__name__', func)} timed out after {timeout}s")
+            raise
+
+    if not limited:
+        return await _call()
+    # 熔断检查在限流之前，上游故障时不必排队等待令牌
+    return await upstream_breaker.call(lambda: upstream_limiter.call(_call))
+
+def shutdown_executor(wait: bool = True):
+    """关闭线程池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+        logger.info("AKShare executor shutdown")
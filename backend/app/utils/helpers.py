@@ -1,9 +1,9 @@
 import datetime
 from typing import List, Optional, Dict, Any
-import akshare as ak
 import pandas as pd
 import logging
 import asyncio
+import functools
 from datetime import date, timedelta
 
 logger = logging.getLogger(__name__)
@@ -11,7 +11,9 @@ logger = logging.getLogger(__name__)
 def get_trading_calendar() -> pd.DataFrame:
     """获取交易日历"""
     try:
-        return ak.tool_trade_date_hist_sina()
+        from app.services.market_data import get_provider
+
+        return get_provider().tool_trade_date_hist_sina()
     except Exception as e:
         logger.error(f"Failed to get trading calendar: {e}")
         return pd.DataFrame()
@@ -45,6 +47,15 @@ def get_previous_trading_day(check_date: date) -> date:
         prev_day -= timedelta(days=1)
     return prev_day
 
+def week_monday(day: date) -> date:
+    """所在周的周一"""
+    return day - timedelta(days=day.weekday())
+
+def session_date(today: Optional[date] = None) -> date:
+    """行情对应的交易日：今天是交易日取今天，否则取上一个交易日"""
+    today = today or datetime.datetime.now().date()
+    return today if is_trading_day(today) else get_previous_trading_day(today)
+
 def format_number(num: float, decimals: int = 2) -> str:
     """格式化数字显示"""
     if abs(num) >= 100000000:
@@ -97,8 +108,10 @@ def validate_stock_code(code: str) -> bool:
 def get_stock_list() -> pd.DataFrame:
     """获取A股股票列表"""
     try:
-        stock_info = ak.stock_zh_a_spot_em()
-        return stock_info[["代码", "名称"]]
+        from app.services.spot_snapshot import spot_snapshot
+
+        stock_info = spot_snapshot.get_frame_sync()
+        return stock_info[["代码", "名称"]].reset_index(drop=True)
     except Exception as e:
         logger.error(f"Failed to get stock list: {e}")
         return pd.DataFrame()
@@ -124,19 +137,23 @@ def get_date_range(start_date: date, end_date: date) -> List[date]:
     delta = end_date - start_date
     return [start_date + timedelta(days=i) for i in range(delta.days + 1)]
 
-def retry(max_attempts: int = 3, delay: float = 1.0):
-    """重试装饰器"""
+def retry(max_attempts: int = 3, delay: float = 1.0, policy=None):
+    """重试装饰器
+
+    默认使用带抖动的指数退避，只重试网络/超时/限流等临时故障，
+    并受当前扫描的重试预算约束（见 app.utils.resilience）。
+
+    Args:
+        policy: 自定义 RetryPolicy，指定后忽略 max_attempts/delay
+    """
+    from app.utils.resilience import RetryPolicy
+
+    retry_policy = policy or RetryPolicy(max_attempts=max_attempts, base_delay=delay)
+
     def decorator(func):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            for attempt in range(max_attempts):
-                try:
-                    return await func(*args, **kwargs)
-                except Exception as e:
-                    if attempt == max_attempts - 1:
-                        raise
-                    logger.warning(f"Attempt {attempt + 1} failed: {e}")
-                    await asyncio.sleep(delay * (2 ** attempt))
-            return None
+            return await retry_policy.run(func, *args, **kwargs)
         return wrapper
     return decorator
 
@@ -0,0 +1,202 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Optional, Type
+from abc import ABC, abstractmethod
+import logging
+
+from app.utils import panel
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 指标计算后端：输入输出均为一维 float64 数组，由 indicators.py 包装成 pd.Series。
+# 各后端口径一致（均线 min_periods=1，EMA adjust=False，标准差 ddof=1，RSI 为涨跌幅简单均值）。
+
+class IndicatorBackend(ABC):
+    """指标计算后端基类"""
+
+    name = ''
+
+    @abstractmethod
+    def ma(self, values: np.ndarray, period: int) -> np.ndarray:
+        """移动平均（不足 period 根时取已有K线的均值）"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def ema(self, values: np.ndarray, period: int) -> np.ndarray:
+        raise NotImplementedError
+
+    @abstractmethod
+    def std(self, values: np.ndarray, period: int) -> np.ndarray:
+        """滑动样本标准差（不足 period 根为 NaN）"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def rsi(self, values: np.ndarray, period: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def macd(
+        self,
+        values: np.ndarray,
+        fast_period: int,
+        slow_period: int,
+        signal_period: int
+    ) -> Dict[str, np.ndarray]:
+        line = self.ema(values, fast_period) - self.ema(values, slow_period)
+        signal = self.ema(line, signal_period)
+        return {'macd': line, 'macd_signal': signal, 'macd_hist': line - signal}
+
+BACKENDS: Dict[str, Type[IndicatorBackend]] = {}
+
+def register_backend(cls: Type[IndicatorBackend]) -> Type[IndicatorBackend]:
+    """注册指标后端（类装饰器）"""
+    BACKENDS[cls.name] = cls
+    return cls
+
+@register_backend
+class PandasBackend(IndicatorBackend):
+    """pandas rolling/ewm 实现（原实现，作为基准口径）"""
+
+    name = 'pandas'
+
+    def ma(self, values, period):
+        return pd.Series(values).rolling(window=period, min_periods=1).mean().to_numpy()
+
+    def ema(self, values, period):
+        return pd.Series(values).ewm(span=period, adjust=False).mean().to_numpy()
+
+    def std(self, values, period):
+        return pd.Series(values).rolling(window=period).std().to_numpy()
+
+    def rsi(self, values, period):
+        delta = pd.Series(values).diff()
+        gain = delta.where(delta > 0, 0).rolling(window=period).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+        return (100 - 100 / (1 + gain / loss)).to_numpy()
+
+@register_backend
+class NumpyBackend(IndicatorBackend):
+    """纯 NumPy 实现（前缀和滑动窗口，与 IndicatorPanel 共用）"""
+
+    name = 'numpy'
+
+    def ma(self, values, period):
+        return panel.rolling_mean(values[np.newaxis, :], period)[0]
+
+    # 分块递推的块大小：块内权重 (1-alpha)^-k 不会溢出
+    EWM_BLOCK = 128
+
+    def ema(self, values, period):
+        if len(values) == 0 or np.isnan(values).any():
+            return panel.ewm_mean(values[np.newaxis, :], period)[0]
+
+        # y_t = (1-a)^t * y_0 + a * sum (1-a)^(t-k) * x_k，按块用累加和一次算完，块间传递末值
+        alpha = 2.0 / (period + 1)
+        decay = 1.0 - alpha
+        if decay <= 0:
+            return values.copy()
+        result = np.empty_like(values)
+        result[0] = values[0]
+        for start in range(1, len(values), self.EWM_BLOCK):
+            block = values[start:start + self.EWM_BLOCK]
+            powers = decay ** np.arange(1, len(block) + 1)
+            result[start:start + len(block)] = powers * (
+                result[start - 1] + alpha * np.cumsum(block / powers)
+            )
+        return result
+
+    def std(self, values, period):
+        return panel.rolling_std(values[np.newaxis, :], period)[0]
+
+    def rsi(self, values, period):
+        # 与 pandas 的 where 口径一致：缺失值和首根K线的涨跌记为0
+        delta = np.diff(values, prepend=np.nan)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        avg_gain = panel.rolling_mean(gain[np.newaxis, :], period, min_periods=period)[0]
+        avg_loss = panel.rolling_mean(loss[np.newaxis, :], period, min_periods=period)[0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return 100 - 100 / (1 + avg_gain / avg_loss)
+
+@register_backend
+class TalibBackend(IndicatorBackend):
+    """TA-Lib 实现（C 实现的滑动窗口）
+
+    TA-Lib 的口径与现有实现不同，这里做了对齐：
+    - SMA 前 period-1 根为 NaN，用累计均值补齐（min_periods=1）
+    - STDDEV 为总体标准差，乘以 sqrt(n/(n-1)) 换算为样本标准差
+    - RSI 为 Wilder 平滑，改为对涨跌幅做 SMA
+    - EMA 以前 period 根的 SMA 为初值，与 adjust=False 不一致，EMA/MACD 使用 NumPy 实现
+    """
+
+    name = 'talib'
+
+    def __init__(self):
+        import talib
+        self._talib = talib
+        self._numpy = NumpyBackend()
+
+    def _sma(self, values: np.ndarray, period: int) -> np.ndarray:
+        if len(values) < period:
+            return np.full(len(values), np.nan)
+        return self._talib.SMA(values, timeperiod=period)
+
+    def ma(self, values, period):
+        if period <= 1 or np.isnan(values).any():
+            # TA-Lib 不跳过中间的缺失值，含 NaN 时按 NumPy 口径计算
+            return self._numpy.ma(values, period)
+        result = self._sma(values, period)
+        head = min(period - 1, len(values))
+        result[:head] = np.cumsum(values[:head]) / np.arange(1, head + 1)
+        return result
+
+    def ema(self, values, period):
+        return self._numpy.ema(values, period)
+
+    def std(self, values, period):
+        if period < 2 or len(values) < period or np.isnan(values).any():
+            return self._numpy.std(values, period)
+        return self._talib.STDDEV(values, timeperiod=period, nbdev=1) * np.sqrt(period / (period - 1))
+
+    def rsi(self, values, period):
+        delta = np.diff(values, prepend=np.nan)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return 100 - 100 / (1 + self._sma(gain, period) / self._sma(loss, period))
+
+_instances: Dict[str, IndicatorBackend] = {}
+
+def get_backend(name: Optional[str] = None) -> IndicatorBackend:
+    """按名称获取后端实例，默认使用 settings.indicator_backend
+
+    后端不可用（如未安装 TA-Lib）时回退到 NumPy 实现。
+    """
+    if name is None:
+        name = settings.indicator_backend
+
+    backend = _instances.get(name)
+    if backend is not None:
+        return backend
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown indicator backend: {name}, available: {sorted(BACKENDS)}")
+    try:
+        backend = BACKENDS[name]()
+    except ImportError as e:
+        logger.warning(f"Indicator backend '{name}' unavailable ({e}), falling back to numpy")
+        backend = get_backend('numpy')
+
+    _instances[name] = backend
+    return backend
+
+def available_backends() -> Dict[str, bool]:
+    """各后端在当前环境是否可用"""
+    result = {}
+    for name, cls in BACKENDS.items():
+        try:
+            cls()
+            result[name] = True
+        except ImportError:
+            result[name] = False
+    return result
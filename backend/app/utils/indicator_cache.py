@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+import hashlib
+import inspect
+import json
+import logging
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 指标结果缓存：键由 (股票代码, 周期类型, 最后一根K线时间, K线指纹, 指标名, 参数) 组成。
+# 指纹是参与计算的K线数值的哈希，K线数量或任何一个值变化（如前复权重算）都会得到新键，
+# 旧结果不会再被命中，随 LRU 淘汰或 Redis 过期，不需要显式失效。
+
+def fingerprint(*arrays: np.ndarray) -> str:
+    """K线数值指纹（长度 + 内容哈希）"""
+    digest = hashlib.blake2b(digest_size=12)
+    for values in arrays:
+        values = np.ascontiguousarray(values, dtype='float64')
+        digest.update(len(values).to_bytes(8, 'little'))
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+def make_key(
+    code: str,
+    period_type: str,
+    last_bar: Any,
+    bars_fingerprint: str,
+    name: str,
+    params: Dict[str, Any]
+) -> str:
+    last = last_bar.isoformat() if hasattr(last_bar, 'isoformat') else str(last_bar)
+    param_str = ','.join(f"{k}={params[k]}" for k in sorted(params))
+    return f"{code}:{period_type}:{last}:{bars_fingerprint}:{name}({param_str})"
+
+class IndicatorCache:
+    """指标结果缓存：进程内有界 LRU，可选溢出到 Redis
+
+    Args:
+        max_entries: 进程内最多缓存的结果数
+        redis_enabled: 是否把结果写入 Redis（跨进程/重启复用）
+        redis_ttl: Redis 中结果的保留时间（秒）
+    """
+
+    REDIS_PREFIX = "indicator:"
+
+    def __init__(self, max_entries: int = 20000, redis_enabled: bool = False, redis_ttl: int = 604800):
+        self.max_entries = max_entries
+        self.redis_enabled = redis_enabled
+        self.redis_ttl = redis_ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取进程内缓存（不计入命中率）"""
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """批量查询，进程内未命中的再查 Redis，返回命中的键"""
+        found = {}
+        remote = []
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                remote.append(key)
+        self.hits += len(found)
+
+        if remote and self.redis_enabled:
+            for key, value in (await self._redis_get(remote)).items():
+                found[key] = value
+                self.put(key, value)
+                self.redis_hits += 1
+
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def put_many(self, values: Dict[str, Any]):
+        for key, value in values.items():
+            self.put(key, value)
+        if values and self.redis_enabled:
+            await self._redis_set(values)
+
+    async def _redis_get(self, keys: List[str]) -> Dict[str, Any]:
+        from app.utils.redis_client import redis_client
+        try:
+            raw = await redis_client.mget([self.REDIS_PREFIX + key for key in keys])
+            return {key: json.loads(value) for key, value in zip(keys, raw) if value}
+        except Exception as e:
+            logger.error(f"Error reading indicator cache from redis: {e}")
+            return {}
+
+    async def _redis_set(self, values: Dict[str, Any]):
+        from app.utils.redis_client import redis_client
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.setex(self.REDIS_PREFIX + key, self.redis_ttl, json.dumps(value))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error writing indicator cache to redis: {e}")
+
+    def stats(self) -> Dict:
+        total = self.hits + self.redis_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.redis_hits) / total, 4) if total else 0.0,
+            'redis_enabled': self.redis_enabled,
+        }
+
+async def memoize_rows(
+    panel,
+    period_type: str,
+    name: str,
+    params: Dict[str, Any],
+    fields: Iterable[str],
+    compute: Callable[[Any], Dict[str, Any]]
+) -> Dict[str, Any]:
+    """按股票逐行缓存面板上的指标结果
+
+    每只股票以其 fields 的有效K线值计算指纹，命中的直接取缓存，
+    只把未命中的股票组成子面板交给 compute 计算。
+
+    Args:
+        panel: IndicatorPanel
+        compute: 输入子面板，返回（或异步返回） 股票代码 -> 结果（需可 JSON 序列化）
+
+    Returns:
+        股票代码 -> 结果
+    """
+    fields = list(fields)
+    keys = {}
+    for i, code in enumerate(panel.codes):
+        rows = [panel[f][i] for f in fields]
+        rows = [row[~np.isnan(row)] for row in rows]
+        last_bar = panel.times[i, -1] if panel.times is not None else len(rows[0])
+        keys[code] = make_key(code, period_type, last_bar, fingerprint(*rows), name, params)
+
+    cached = await indicator_cache.get_many(list(keys.values()))
+    results = {code: cached[key] for code, key in keys.items() if key in cached}
+
+    missing = [code for code in panel.codes if code not in results]
+    if missing:
+        computed = compute(panel.subset(missing) if len(missing) < len(panel.codes) else panel)
+        if inspect.isawaitable(computed):
+            computed = await computed
+        await indicator_cache.put_many({keys[code]: value for code, value in computed.items()})
+        results.update(computed)
+
+    return results
+
+# 进程内共享的指标缓存
+indicator_cache = IndicatorCache(
+    max_entries=settings.indicator_cache_size,
+    redis_enabled=settings.indicator_cache_redis,
+    redis_ttl=settings.indicator_cache_ttl
+)
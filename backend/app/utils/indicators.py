@@ -3,65 +3,51 @@ import numpy as np
 from typing import Union, Optional
 import logging
 
+from app.utils.indicator_backends import get_backend
+
 logger = logging.getLogger(__name__)
 
-def calculate_ma(data: pd.Series, period: int) -> pd.Series:
+def _values(data: pd.Series) -> np.ndarray:
+    return np.asarray(data, dtype='float64')
+
+def calculate_ma(data: pd.Series, period: int, backend: Optional[str] = None) -> pd.Series:
     """计算移动平均线"""
-    return data.rolling(window=period, min_periods=1).mean()
+    return pd.Series(get_backend(backend).ma(_values(data), period), index=data.index)
 
-def calculate_ema(data: pd.Series, period: int) -> pd.Series:
+def calculate_ema(data: pd.Series, period: int, backend: Optional[str] = None) -> pd.Series:
     """计算指数移动平均线"""
-    return data.ewm(span=period, adjust=False).mean()
+    return pd.Series(get_backend(backend).ema(_values(data), period), index=data.index)
 
 def calculate_macd(
     data: pd.Series,
     fast_period: int = 12,
     slow_period: int = 26,
-    signal_period: int = 9
+    signal_period: int = 9,
+    backend: Optional[str] = None
 ) -> pd.DataFrame:
     """计算MACD指标
 
     Returns:
         DataFrame with columns: macd, macd_signal, macd_hist
     """
-    # 计算EMA
-    ema_fast = calculate_ema(data, fast_period)
-    ema_slow = calculate_ema(data, slow_period)
-
-    # 计算MACD线
-    macd = ema_fast - ema_slow
+    result = get_backend(backend).macd(_values(data), fast_period, slow_period, signal_period)
+    return pd.DataFrame(result, index=data.index)
 
-    # 计算信号线
-    macd_signal = calculate_ema(macd, signal_period)
-
-    # 计算柱状图
-    macd_hist = macd - macd_signal
-
-    return pd.DataFrame({
-        'macd': macd,
-        'macd_signal': macd_signal,
-        'macd_hist': macd_hist
-    })
-
-def calculate_rsi(data: pd.Series, period: int = 14) -> pd.Series:
+def calculate_rsi(data: pd.Series, period: int = 14, backend: Optional[str] = None) -> pd.Series:
     """计算RSI相对强弱指标"""
-    delta = data.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-
-    return rsi
+    return pd.Series(get_backend(backend).rsi(_values(data), period), index=data.index)
 
 def calculate_bollinger_bands(
     data: pd.Series,
     period: int = 20,
-    std_dev: float = 2.0
+    std_dev: float = 2.0,
+    backend: Optional[str] = None
 ) -> pd.DataFrame:
     """计算布林带"""
-    middle_band = calculate_ma(data, period)
-    std = data.rolling(window=period).std()
+    indicator_backend = get_backend(backend)
+    values = _values(data)
+    middle_band = indicator_backend.ma(values, period)
+    std = indicator_backend.std(values, period)
 
     upper_band = middle_band + (std * std_dev)
     lower_band = middle_band - (std * std_dev)
@@ -70,15 +56,96 @@ def calculate_bollinger_bands(
         'middle': middle_band,
         'upper': upper_band,
         'lower': lower_band
-    })
+    }, index=data.index)
 
-def calculate_volatility(data: pd.Series, period: int = 20) -> pd.Series:
+def calculate_volatility(data: pd.Series, period: int = 20, backend: Optional[str] = None) -> pd.Series:
     """计算波动率（标准差）"""
-    return data.rolling(window=period).std()
+    return pd.Series(get_backend(backend).std(_values(data), period), index=data.index)
 
-def calculate_volume_ma(volume: pd.Series, period: int) -> pd.Series:
+def calculate_volume_ma(volume: pd.Series, period: int, backend: Optional[str] = None) -> pd.Series:
     """计算成交量均线"""
-    return volume.rolling(window=period, min_periods=1).mean()
+    return calculate_ma(volume, period, backend)
+
+def calculate_grouped_ma(values: np.ndarray, groups: np.ndarray, period: int) -> np.ndarray:
+    """按分组计算移动平均（与 calculate_ma 的 min_periods=1 口径一致）
+
+    values 需已按 (分组, 时间) 排序，用前缀和一次算完所有分组，不逐组循环。
+    """
+    values = np.asarray(values, dtype='float64')
+    n = len(values)
+    if n == 0:
+        return values
+
+    groups = np.asarray(groups)
+    boundary = np.ones(n, dtype=bool)
+    boundary[1:] = groups[1:] != groups[:-1]
+    group_start = np.maximum.accumulate(np.where(boundary, np.arange(n), 0))
+
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    idx = np.arange(n)
+    window_start = np.maximum(group_start, idx - period + 1)
+    return (csum[idx + 1] - csum[window_start]) / (idx + 1 - window_start)
+
+def _as_2d(values) -> np.ndarray:
+    """一维序列视为只有一只股票的面板"""
+    return np.atleast_2d(np.asarray(values, dtype='float64'))
+
+def _series_lengths(short: np.ndarray, long: np.ndarray) -> np.ndarray:
+    """每行去掉左侧补齐空位（两条线均为 NaN）后的长度"""
+    padded = np.isnan(short) & np.isnan(long)
+    return short.shape[1] - np.logical_and.accumulate(padded, axis=1).sum(axis=1)
+
+def _cross_matrix(short: np.ndarray, long: np.ndarray, direction: str) -> np.ndarray:
+    """相邻两根K线之间是否交叉，第 j 列表示第 j 根到第 j+1 根之间"""
+    if direction == 'up':
+        return (short[:, :-1] <= long[:, :-1]) & (short[:, 1:] > long[:, 1:])
+    return (short[:, :-1] >= long[:, :-1]) & (short[:, 1:] < long[:, 1:])
+
+def find_crosses(
+    short_ma,
+    long_ma,
+    days_back: int = 5,
+    direction: str = 'up'
+) -> Union[bool, np.ndarray]:
+    """最近 days_back 根K线内是否出现交叉（向量化）
+
+    Args:
+        short_ma: 短期均线，一维序列或 (股票数, K线数) 面板（右对齐，左侧补 NaN）
+        long_ma: 长期均线，形状同 short_ma
+        days_back: 检查最近N根K线
+        direction: 'up' 金叉 / 'down' 死叉
+
+    Returns:
+        一维输入返回 bool，面板返回每只股票的 bool 数组
+    """
+    short, long = _as_2d(short_ma), _as_2d(long_ma)
+    if short.shape[1] < 2 or days_back < 1:
+        found = np.zeros(short.shape[0], dtype=bool)
+    else:
+        cross = _cross_matrix(short, long, direction)[:, -days_back:]
+        found = cross.any(axis=1) & (_series_lengths(short, long) >= days_back + 1)
+    return bool(found[0]) if np.ndim(short_ma) == 1 else found
+
+def bars_since_cross(short_ma, long_ma, direction: str = 'up') -> Union[int, np.ndarray]:
+    """距最近一次交叉的K线数（交叉发生在最新一根为0，从未交叉为-1）"""
+    short, long = _as_2d(short_ma), _as_2d(long_ma)
+    if short.shape[1] < 2:
+        result = np.full(short.shape[0], -1)
+    else:
+        reversed_cross = _cross_matrix(short, long, direction)[:, ::-1]
+        result = np.where(reversed_cross.any(axis=1), reversed_cross.argmax(axis=1), -1)
+    return int(result[0]) if np.ndim(short_ma) == 1 else result
+
+def rising_positive_streak(macd_hist) -> Union[int, np.ndarray]:
+    """从最新一根往前，连续满足“红柱且比前一根放大”的根数（向量化）"""
+    hist = _as_2d(macd_hist)
+    if hist.shape[1] < 2:
+        result = np.zeros(hist.shape[0], dtype=int)
+    else:
+        rising = (hist[:, 1:] > 0) & (hist[:, 1:] > hist[:, :-1])
+        broken = ~rising[:, ::-1]
+        result = np.where(broken.any(axis=1), broken.argmax(axis=1), broken.shape[1])
+    return int(result[0]) if np.ndim(macd_hist) == 1 else result
 
 def detect_golden_cross(
     short_ma: pd.Series,
@@ -98,17 +165,9 @@ def detect_golden_cross(
     if len(short_ma) < days_back + 1 or len(long_ma) < days_back + 1:
         return False
 
-    # 获取最近N+1天的数据
-    recent_short = short_ma.tail(days_back + 1)
-    recent_long = long_ma.tail(days_back + 1)
-
-    # 检查是否有金叉
-    for i in range(days_back):
-        if (recent_short.iloc[i] <= recent_long.iloc[i] and
-            recent_short.iloc[i + 1] > recent_long.iloc[i + 1]):
-            return True
-
-    return False
+    recent_short = _as_2d(short_ma.tail(days_back + 1))
+    recent_long = _as_2d(long_ma.tail(days_back + 1))
+    return bool(_cross_matrix(recent_short, recent_long, 'up').any())
 
 def detect_death_cross(
     short_ma: pd.Series,
@@ -119,17 +178,9 @@ def detect_death_cross(
     if len(short_ma) < days_back + 1 or len(long_ma) < days_back + 1:
         return False
 
-    # 获取最近N+1天的数据
-    recent_short = short_ma.tail(days_back + 1)
-    recent_long = long_ma.tail(days_back + 1)
-
-    # 检查是否有死叉
-    for i in range(days_back):
-        if (recent_short.iloc[i] >= recent_long.iloc[i] and
-            recent_short.iloc[i + 1] < recent_long.iloc[i + 1]):
-            return True
-
-    return False
+    recent_short = _as_2d(short_ma.tail(days_back + 1))
+    recent_long = _as_2d(long_ma.tail(days_back + 1))
+    return bool(_cross_matrix(recent_short, recent_long, 'down').any())
 
 def check_macd_red_bar_increase(macd_hist: pd.Series, days: int = 3) -> int:
     """检查MACD红柱是否连续放大
@@ -140,15 +191,7 @@ def check_macd_red_bar_increase(macd_hist: pd.Series, days: int = 3) -> int:
     if len(macd_hist) < days + 1:
         return 0
 
-    consecutive = 0
-    # 从最新数据开始往前检查
-    for i in range(len(macd_hist) - 1, 0, -1):
-        if (macd_hist.iloc[i] > 0 and  # 当前是红柱
-            macd_hist.iloc[i] > macd_hist.iloc[i-1]):  # 比前一根大
-            consecutive += 1
-        else:
-            break
-
+    consecutive = rising_positive_streak(macd_hist)
     return consecutive if consecutive >= days else 0
 
 def calculate_price_change(current: float, previous: float) -> float:
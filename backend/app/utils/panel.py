@@ -0,0 +1,264 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 面板上的指标计算：输入均为 (股票数, K线数) 的二维数组，沿时间轴（axis=1）一次算完所有股票。
+# 缺失值（左侧补齐的空位、停牌等）为 NaN，均值类指标只统计有效值。
+
+def _window_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """沿时间轴的滑动窗口求和（前缀和相减）"""
+    csum = np.cumsum(values, axis=1)
+    result = csum.copy()
+    result[:, window:] = csum[:, window:] - csum[:, :-window]
+    return result
+
+def rolling_mean(values: np.ndarray, window: int, min_periods: int = 1) -> np.ndarray:
+    """滑动均值（与 pandas rolling(window, min_periods).mean() 一致）
+
+    缺失值位置同样输出窗口内有效值的均值，窗口内有效值不足 min_periods 时为 NaN。
+    """
+    values = np.asarray(values, dtype='float64')
+    valid = ~np.isnan(values)
+    total = _window_sum(np.where(valid, values, 0.0), window)
+    count = _window_sum(valid.astype('float64'), window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    mean[(count < max(min_periods, 1))] = np.nan
+    return mean
+
+def rolling_std(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    """滑动标准差（样本标准差 ddof=1，与 pandas rolling(window).std() 一致）"""
+    values = np.asarray(values, dtype='float64')
+    min_periods = window if min_periods is None else min_periods
+
+    # 先减去每行均值，降低平方和相减时的精度损失
+    valid = ~np.isnan(values)
+    # 全部缺失的行按0处理，避免 nanmean 对空行告警
+    row_mean = np.nanmean(np.where(valid.any(axis=1, keepdims=True), values, 0.0), axis=1, keepdims=True)
+    centered = values - row_mean
+    x = np.where(valid, centered, 0.0)
+    total = _window_sum(x, window)
+    total_sq = _window_sum(x * x, window)
+    count = _window_sum(valid.astype('float64'), window)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (total_sq - total * total / count) / (count - 1)
+    std = np.sqrt(np.maximum(var, 0.0))
+
+    # 窗口内有效值全部相同时标准差为0（与 pandas 一致），不受平方和相减的舍入误差影响
+    if window > 1:
+        positions = np.where(valid, np.arange(values.shape[1]), 0)
+        last_valid = np.maximum.accumulate(positions, axis=1)
+        previous = np.full_like(values, np.nan)
+        previous[:, 1:] = np.take_along_axis(values, last_valid[:, :-1], axis=1)
+        changed = valid & ~(values == previous)
+        std[_window_sum(changed.astype('float64'), window - 1) == 0] = 0.0
+
+    std[count < max(min_periods, 2)] = np.nan
+    return std
+
+def ewm_mean(values: np.ndarray, period: int) -> np.ndarray:
+    """指数移动平均（与 pandas ewm(span=period, adjust=False).mean() 一致）
+
+    每行从第一个有效值开始递推；沿时间轴逐列递推，但每一步对所有股票向量化。
+    与 pandas 默认的 ignore_na=False 一致：缺失值位置输出上一个值，
+    缺失值期间上一个值的权重继续按 (1-alpha) 衰减。
+    """
+    values = np.asarray(values, dtype='float64')
+    alpha = 2.0 / (period + 1)
+    decay = 1.0 - alpha
+    result = np.full_like(values, np.nan)
+    prev = np.full(values.shape[0], np.nan)
+    old_weight = np.ones(values.shape[0])
+
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        observed = ~np.isnan(x)
+        started = ~np.isnan(prev)
+        old_weight = np.where(started, old_weight * decay, old_weight)
+        with np.errstate(invalid='ignore'):
+            blended = (old_weight * prev + alpha * x) / (old_weight + alpha)
+        prev = np.where(observed, np.where(started, blended, x), prev)
+        old_weight = np.where(observed, 1.0, old_weight)
+        result[:, t] = prev
+
+    return result
+
+def macd(
+    values: np.ndarray,
+    fast_period: int = 12,
+    slow_period: int = 26,
+    signal_period: int = 9
+) -> Dict[str, np.ndarray]:
+    """MACD（与 calculate_macd 一致）"""
+    line = ewm_mean(values, fast_period) - ewm_mean(values, slow_period)
+    signal = ewm_mean(line, signal_period)
+    return {'macd': line, 'macd_signal': signal, 'macd_hist': line - signal}
+
+def rsi(values: np.ndarray, period: int = 14) -> np.ndarray:
+    """RSI（与 calculate_rsi 一致：涨跌幅的简单滑动均值；左侧补齐的空位不计入窗口）"""
+    values = np.asarray(values, dtype='float64')
+    delta = np.full_like(values, np.nan)
+    delta[:, 1:] = values[:, 1:] - values[:, :-1]
+
+    # 与 pandas 的 where 口径一致：首根K线的涨跌记为0
+    valid = ~np.isnan(values)
+    gain = np.where(valid, np.where(delta > 0, delta, 0.0), np.nan)
+    loss = np.where(valid, np.where(delta < 0, -delta, 0.0), np.nan)
+    avg_gain = rolling_mean(gain, period, min_periods=period)
+    avg_loss = rolling_mean(loss, period, min_periods=period)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+
+def bollinger_bands(values: np.ndarray, period: int = 20, std_dev: float = 2.0) -> Dict[str, np.ndarray]:
+    """布林带（与 calculate_bollinger_bands 一致）"""
+    middle = rolling_mean(values, period)
+    std = rolling_std(values, period)
+    return {'middle': middle, 'upper': middle + std * std_dev, 'lower': middle - std * std_dev}
+
+class IndicatorPanel:
+    """全市场指标面板：股票 × K线 的对齐二维数组
+
+    每只股票的K线右对齐（最后一列均为各自最新一根K线），历史较短的股票左侧补 NaN。
+    按K线序号而不是日历日期对齐，停牌不会在序列中间产生空位，
+    指标结果与逐只股票用 pandas 计算一致。
+
+    Args:
+        codes: 股票代码（行）
+        fields: 字段名 -> (股票数, K线数) 数组，如 close、volume
+        times: 每个位置对应的K线时间，可选
+    """
+
+    def __init__(
+        self,
+        codes: List[str],
+        fields: Dict[str, np.ndarray],
+        times: Optional[np.ndarray] = None
+    ):
+        self.codes = list(codes)
+        self.fields = {name: np.asarray(arr, dtype='float64') for name, arr in fields.items()}
+        self.times = times
+        self._rows = {code: i for i, code in enumerate(self.codes)}
+
+        shapes = {arr.shape for arr in self.fields.values()}
+        if len(shapes) > 1:
+            raise ValueError(f"Panel fields have different shapes: {shapes}")
+        self.shape = shapes.pop() if shapes else (len(self.codes), 0)
+
+    @property
+    def n_bars(self) -> int:
+        return self.shape[1]
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def row(self, code: str) -> int:
+        return self._rows[code]
+
+    def subset(self, codes: List[str]) -> 'IndicatorPanel':
+        """取部分股票组成新面板（保持K线对齐）"""
+        rows = [self._rows[code] for code in codes]
+        times = self.times[rows] if self.times is not None else None
+        return IndicatorPanel(codes, {name: arr[rows] for name, arr in self.fields.items()}, times)
+
+    def lengths(self, field: str = 'close') -> np.ndarray:
+        """每只股票的有效K线数量"""
+        return (~np.isnan(self.fields[field])).sum(axis=1)
+
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Dict[str, pd.DataFrame],
+        fields: Iterable[str] = ('close', 'volume'),
+        time_column: Optional[str] = None,
+        max_bars: Optional[int] = None
+    ) -> 'IndicatorPanel':
+        """由每只股票一个 DataFrame（按时间升序）构建面板"""
+        fields = list(fields)
+        codes = [code for code, df in frames.items() if df is not None and not df.empty]
+        n_bars = max((len(frames[c]) for c in codes), default=0)
+        if max_bars is not None:
+            n_bars = min(n_bars, max_bars)
+
+        arrays = {f: np.full((len(codes), n_bars), np.nan) for f in fields}
+        times = np.full((len(codes), n_bars), np.datetime64('NaT'), dtype='datetime64[ns]') if time_column else None
+
+        for i, code in enumerate(codes):
+            df = frames[code].tail(n_bars)
+            n = len(df)
+            if n == 0:
+                continue
+            for f in fields:
+                arrays[f][i, n_bars - n:] = df[f].to_numpy(dtype='float64')
+            if times is not None:
+                times[i, n_bars - n:] = pd.to_datetime(df[time_column]).values
+
+        return cls(codes, arrays, times)
+
+    @classmethod
+    def from_long(
+        cls,
+        df: pd.DataFrame,
+        fields: Iterable[str] = ('close', 'volume'),
+        code_column: str = 'stock_code',
+        time_column: str = 'trade_date',
+        max_bars: Optional[int] = None
+    ) -> 'IndicatorPanel':
+        """由长表（每行一根K线，如数据库查询结果）一次性构建面板"""
+        fields = list(fields)
+        if df.empty:
+            return cls([], {f: np.empty((0, 0)) for f in fields})
+
+        df = df.sort_values([code_column, time_column], kind='stable')
+        codes, row_index = np.unique(df[code_column].to_numpy(), return_inverse=True)
+
+        # 每根K线距该股票最新一根的位置，用于右对齐
+        counts = np.bincount(row_index)
+        position_from_end = df.groupby(code_column, sort=False).cumcount(ascending=False).to_numpy()
+        n_bars = int(counts.max())
+        if max_bars is not None:
+            n_bars = min(n_bars, max_bars)
+        keep = position_from_end < n_bars
+        rows = row_index[keep]
+        cols = n_bars - 1 - position_from_end[keep]
+
+        arrays = {}
+        for f in fields:
+            arr = np.full((len(codes), n_bars), np.nan)
+            arr[rows, cols] = df[f].to_numpy(dtype='float64')[keep]
+            arrays[f] = arr
+
+        times = np.full((len(codes), n_bars), np.datetime64('NaT'), dtype='datetime64[ns]')
+        times[rows, cols] = pd.to_datetime(df[time_column]).values[keep]
+
+        return cls([str(c) for c in codes], arrays, times)
+
+    # 指标
+
+    def ma(self, period: int, field: str = 'close') -> np.ndarray:
+        return rolling_mean(self.fields[field], period)
+
+    def ema(self, period: int, field: str = 'close') -> np.ndarray:
+        return ewm_mean(self.fields[field], period)
+
+    def macd(
+        self,
+        fast_period: int = 12,
+        slow_period: int = 26,
+        signal_period: int = 9,
+        field: str = 'close'
+    ) -> Dict[str, np.ndarray]:
+        return macd(self.fields[field], fast_period, slow_period, signal_period)
+
+    def rsi(self, period: int = 14, field: str = 'close') -> np.ndarray:
+        return rsi(self.fields[field], period)
+
+    def bollinger(self, period: int = 20, std_dev: float = 2.0, field: str = 'close') -> Dict[str, np.ndarray]:
+        return bollinger_bands(self.fields[field], period, std_dev)
+
+    def volume_ma(self, period: int) -> np.ndarray:
+        return rolling_mean(self.fields['volume'], period)
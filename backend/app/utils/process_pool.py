@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import multiprocessing
+import logging
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 扫描计算专用进程池：事件循环只做 I/O，指标和条件判断分批交给子进程。
+# 进程池常驻，首次使用时创建，子进程只在启动时导入一次计算模块。
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _init_worker():
+    # 预先导入计算模块，首批任务不再承担导入开销
+    import app.utils.screening  # noqa: F401
+
+def _noop() -> int:
+    return 0
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """获取扫描计算进程池，SCAN_PROCESSES <= 0 时返回 None（在当前进程计算）"""
+    global _pool
+    if settings.scan_processes <= 0:
+        return None
+    if _pool is None:
+        # spawn 启动的子进程不继承事件循环、数据库连接和线程池
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.scan_processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        logger.info(f"Created scan process pool with {settings.scan_processes} workers")
+    return _pool
+
+async def warm_up_process_pool():
+    """预先启动全部子进程，避免首次扫描承担进程启动开销"""
+    pool = get_process_pool()
+    if pool is None:
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[
+        loop.run_in_executor(pool, _noop) for _ in range(settings.scan_processes)
+    ])
+    logger.info("Scan process pool warmed up")
+
+async def map_batches(
+    func: Callable[..., Dict[str, Any]],
+    codes: List[str],
+    fields: Dict[str, np.ndarray],
+    batch_size: Optional[int] = None,
+    **params
+) -> Dict[str, Any]:
+    """按股票分批计算，合并各批结果
+
+    每批以 func(批内股票代码, {字段: 二维数组}, **params) 调用，返回 股票代码 -> 结果。
+    进程池启用时各批并发在子进程中执行，否则在当前进程依次执行，结果相同。
+
+    Args:
+        func: 模块级函数（需可被 pickle）
+        codes: 股票代码，与 fields 各数组的行对应
+        fields: 字段 -> (股票数, K线数) 数组
+        batch_size: 每批股票数，默认 settings.scan_batch_size
+    """
+    if not codes:
+        return {}
+
+    size = max(1, batch_size or settings.scan_batch_size)
+    batches = [
+        (codes[start:start + size], {name: arr[start:start + size] for name, arr in fields.items()})
+        for start in range(0, len(codes), size)
+    ]
+
+    pool = get_process_pool()
+    if pool is None:
+        parts = [func(batch_codes, batch_fields, **params) for batch_codes, batch_fields in batches]
+    else:
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(*[
+            loop.run_in_executor(pool, _call, func, batch_codes, batch_fields, params)
+            for batch_codes, batch_fields in batches
+        ])
+
+    results: Dict[str, Any] = {}
+    for part in parts:
+        results.update(part)
+    return results
+
+def _call(func: Callable[..., Dict[str, Any]], codes: List[str], fields: Dict[str, np.ndarray], params: Dict) -> Dict[str, Any]:
+    return func(codes, fields, **params)
+
+def shutdown_process_pool(wait: bool = True):
+    """关闭进程池"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+        logger.info("Scan process pool shutdown")
@@ -0,0 +1,226 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import time
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """获取令牌，不足时等待"""
+        if self.rate <= 0:
+            return
+
+        async with self._get_lock():
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD并发控制：成功时加性增加并发上限，错误或超时时乘性减少
+
+    上限每个往返时间（RTT，按请求耗时平滑估计）最多 +1；减少后，减少之前放行的请求
+    的结果不再参与调整（它们是按旧上限发出的），避免过载时成功请求把上限立即推回去，
+    也避免同一批过载错误连续减少多次。回到上次出错时的上限之前，
+    需要距上次减少至少 probe_rtts 个RTT，避免在上游容量附近反复过载。
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        decrease_factor: float = 0.5,
+        cooldown: float = 0.0,
+        probe_rtts: float = 10.0
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown  # 两次减少之间的最小间隔（秒）
+        self.probe_rtts = probe_rtts
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._last_increase = 0.0
+        self._failure_limit = float('inf')  # 上次出错时的上限
+        self._rtt: Optional[float] = None
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def rtt(self) -> Optional[float]:
+        return self._rtt
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def acquire(self) -> float:
+        """等待空闲并发槽位，返回放行时间（传给 release）"""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        return time.monotonic()
+
+    async def release(self, success: bool, admitted_at: Optional[float] = None):
+        """释放槽位并根据结果调整并发上限
+
+        Args:
+            admitted_at: acquire 返回的放行时间，为空时视为当前上限下放行的请求
+        """
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if admitted_at is not None:
+                latency = now - admitted_at
+                self._rtt = latency if self._rtt is None else 0.8 * self._rtt + 0.2 * latency
+
+            # 上次减少之前放行的请求不参与调整
+            if admitted_at is None or admitted_at >= self._last_decrease:
+                if success:
+                    rtt = self._rtt or 0.0
+                    # 每个RTT最多 +1，接近上次出错的上限时放慢试探
+                    probing = self._limit + 1.0 >= self._failure_limit
+                    wait = rtt * self.probe_rtts if probing else rtt
+                    if now - max(self._last_increase, self._last_decrease) >= wait:
+                        self._limit = min(self.max_limit, self._limit + 1.0)
+                        self._last_increase = now
+                        if self._limit > self._failure_limit:
+                            # 越过上次出错的上限后恢复正常增长
+                            self._failure_limit = float('inf')
+                elif now - self._last_decrease >= self.cooldown:
+                    self._failure_limit = self._limit
+                    self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.warning(f"Upstream errors, concurrency limit reduced to {self.limit}")
+            condition.notify_all()
+
+class UpstreamLimiter:
+    """上游数据请求限流器（令牌桶 + AIMD并发控制），附带实时指标"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        metrics_window: float = 60.0
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial_concurrency,
+            min_limit=min_concurrency,
+            max_limit=max_concurrency
+        )
+        self.metrics_window = metrics_window
+        self._events: deque = deque()  # (完成时间, 是否成功, 是否超时, 耗时)
+        self._total = 0
+        self._errors = 0
+        self._timeouts = 0
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """在限流下执行一次上游请求"""
+        await self.bucket.acquire()
+        admitted_at = await self.concurrency.acquire()
+
+        started = time.monotonic()
+        success = False
+        timed_out = False
+        try:
+            result = await func()
+            success = True
+            return result
+        except asyncio.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            await self.concurrency.release(success, admitted_at)
+            self._record(success, timed_out, time.monotonic() - started)
+
+    def _record(self, success: bool, timed_out: bool, latency: float):
+        now = time.monotonic()
+        self._events.append((now, success, timed_out, latency))
+        self._total += 1
+        if not success:
+            self._errors += 1
+        if timed_out:
+            self._timeouts += 1
+        self._prune(now)
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] > self.metrics_window:
+            self._events.popleft()
+
+    def metrics(self) -> Dict:
+        """实时指标：当前并发、请求速率、错误率（最近 metrics_window 秒）"""
+        self._prune(time.monotonic())
+        events = list(self._events)
+        count = len(events)
+        errors = sum(1 for e in events if not e[1])
+        timeouts = sum(1 for e in events if e[2])
+        latency = sum(e[3] for e in events) / count if count else 0.0
+
+        return {
+            'concurrency_limit': self.concurrency.limit,
+            'in_flight': self.concurrency.in_flight,
+            'request_rate': round(count / self.metrics_window, 3),
+            'error_rate': round(errors / count, 4) if count else 0.0,
+            'timeout_rate': round(timeouts / count, 4) if count else 0.0,
+            'avg_latency': round(latency, 3),
+            'rate_limit': self.bucket.rate,
+            'total_requests': self._total,
+            'total_errors': self._errors,
+            'total_timeouts': self._timeouts,
+        }
+
+# 所有 DataFetcher 和扫描器共享的上游限流器
+upstream_limiter = UpstreamLimiter(
+    rate=settings.upstream_rate_limit,
+    burst=settings.upstream_burst,
+    initial_concurrency=settings.upstream_initial_concurrency,
+    min_concurrency=settings.upstream_min_concurrency,
+    max_concurrency=settings.upstream_max_concurrency
+)
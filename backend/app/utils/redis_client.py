@@ -1,7 +1,8 @@
 import redis.asyncio as redis
 import json
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List
 import logging
+from app.utils.singleflight import cache_flight
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -30,7 +31,10 @@ async def check_redis_connection() -> bool:
         return False
 
 async def get_cache(key: str) -> Optional[Any]:
-    """获取缓存数据"""
+    """获取缓存数据（同一键的并发读取合并为一次请求）"""
+    return await cache_flight.do(key, lambda: _get_cache(key))
+
+async def _get_cache(key: str) -> Optional[Any]:
     try:
         value = await redis_client.get(key)
         if value:
@@ -64,4 +68,30 @@ async def cache_exists(key: str) -> bool:
         return await redis_client.exists(key) > 0
     except Exception as e:
         logger.error(f"Error checking cache existence for key {key}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+async def get_hash_fields(key: str, fields: List[str]) -> Dict[str, Any]:
+    """批量读取哈希表中的字段，返回存在的字段"""
+    if not fields:
+        return {}
+    try:
+        values = await redis_client.hmget(key, fields)
+        return {field: json.loads(value) for field, value in zip(fields, values) if value}
+    except Exception as e:
+        logger.error(f"Error getting hash fields for key {key}: {e}")
+        return {}
+
+async def set_hash_fields(key: str, mapping: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+    """批量写入哈希表字段"""
+    if not mapping:
+        return True
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping={field: json.dumps(value) for field, value in mapping.items()})
+            if ttl:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Error setting hash fields for key {key}: {e}")
+        return False
@@ -0,0 +1,267 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import random
+import re
+import time
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求被直接拒绝"""
+
+# 可重试的异常类名（requests/urllib3/http.client 的网络错误，不直接依赖这些库）
+RETRYABLE_ERROR_NAMES = {
+    'ConnectionError',
+    'ConnectTimeout',
+    'ReadTimeout',
+    'Timeout',
+    'ChunkedEncodingError',
+    'ProtocolError',
+    'RemoteDisconnected',
+    'IncompleteRead',
+    'SSLError',
+}
+
+# 错误信息中的限流/服务端错误
+RETRYABLE_MESSAGE = re.compile(r'\b(429|5\d\d)\b|too many requests|timed? ?out|reset by peer', re.IGNORECASE)
+
+def is_retryable(exc: BaseException) -> bool:
+    """判断异常是否为上游的临时故障（网络、超时、限流、5xx）"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(exc).__mro__):
+        return True
+    return bool(RETRYABLE_MESSAGE.search(str(exc)))
+
+class CircuitBreaker:
+    """熔断器：最近窗口内上游错误率超过阈值时打开，直接拒绝请求
+
+    状态:
+        closed: 正常放行，统计错误率
+        open: 拒绝所有请求，open_duration 秒后进入 half_open
+        half_open: 放行少量试探请求，全部成功则关闭，任一失败重新打开
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        name: str,
+        error_threshold: float = 0.5,
+        min_requests: int = 20,
+        window: float = 60.0,
+        open_duration: float = 30.0,
+        half_open_calls: int = 3
+    ):
+        self.name = name
+        self.error_threshold = error_threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+
+        self._state = self.CLOSED
+        self._events: deque = deque()  # (时间, 是否失败)
+        self._opened_at = 0.0
+        self._trial_started = 0
+        self._trial_succeeded = 0
+        self._rejected = 0
+        self._opened_count = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker '{self.name}' {self._state} -> {state}")
+        self._state = state
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+            self._opened_count += 1
+        elif state == self.HALF_OPEN:
+            self._trial_started = 0
+            self._trial_succeeded = 0
+        elif state == self.CLOSED:
+            self._events.clear()
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def _error_rate(self) -> float:
+        if not self._events:
+            return 0.0
+        return sum(1 for e in self._events if e[1]) / len(self._events)
+
+    def allow(self):
+        """请求前检查，熔断时抛出 CircuitOpenError"""
+        state = self.state
+        if state == self.OPEN:
+            self._rejected += 1
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        if state == self.HALF_OPEN:
+            if self._trial_started >= self.half_open_calls:
+                self._rejected += 1
+                raise CircuitOpenError(f"Circuit '{self.name}' is half-open, trial calls in progress")
+            self._trial_started += 1
+
+    def record_success(self):
+        if self._state == self.HALF_OPEN:
+            self._trial_succeeded += 1
+            if self._trial_succeeded >= self.half_open_calls:
+                self._transition(self.CLOSED)
+            return
+        self._record(False)
+
+    def record_failure(self):
+        if self._state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+            return
+        self._record(True)
+        if len(self._events) >= self.min_requests and self._error_rate() >= self.error_threshold:
+            self._transition(self.OPEN)
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+        self._events.append((now, failed))
+        self._prune(now)
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """在熔断保护下执行一次请求，只有可重试类错误计入失败"""
+        self.allow()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # 调用方取消不代表上游状态，归还试探名额
+            if self._state == self.HALF_OPEN:
+                self._trial_started = max(0, self._trial_started - 1)
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                self.record_failure()
+            else:
+                # 非上游故障（如数据解析错误）不影响熔断判断
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict:
+        """熔断器状态（用于健康检查）"""
+        state = self.state
+        self._prune(time.monotonic())
+        snapshot = {
+            'state': state,
+            'error_rate': round(self._error_rate(), 4),
+            'window_requests': len(self._events),
+            'rejected': self._rejected,
+            'opened_count': self._opened_count,
+        }
+        if state == self.OPEN:
+            snapshot['retry_in'] = round(max(0.0, self.open_duration - (time.monotonic() - self._opened_at)), 1)
+        return snapshot
+
+class RetryBudget:
+    """一次扫描内允许的重试总次数，耗尽后失败不再重试"""
+
+    def __init__(self, max_retries: int):
+        self.max_retries = max_retries
+        self.used = 0
+        self._warned = False
+
+    def try_spend(self) -> bool:
+        if self.used >= self.max_retries:
+            if not self._warned:
+                logger.warning(f"Retry budget of {self.max_retries} exhausted, failures will not be retried")
+                self._warned = True
+            return False
+        self.used += 1
+        return True
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.max_retries
+
+# 当前扫描的重试预算，随 asyncio 任务的上下文传递
+_current_budget: ContextVar[Optional[RetryBudget]] = ContextVar('retry_budget', default=None)
+
+@contextmanager
+def retry_budget(max_retries: Optional[int] = None):
+    """在 with 块内（及其中创建的任务）共享一个重试预算"""
+    budget = RetryBudget(settings.scan_retry_budget if max_retries is None else max_retries)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+        if budget.used:
+            logger.info(f"Retry budget used: {budget.used}/{budget.max_retries}")
+
+class RetryPolicy:
+    """重试策略：指数退避 + 全抖动，只重试临时故障，受重试预算约束
+
+    Args:
+        max_attempts: 最多尝试次数（含第一次）
+        base_delay: 第一次重试的退避上限（秒），之后每次翻倍
+        max_delay: 单次退避上限（秒）
+        classify: 判断异常是否可重试
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: Optional[float] = None,
+        classify: Callable[[BaseException], bool] = is_retryable
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = settings.retry_max_delay if max_delay is None else max_delay
+        self.classify = classify
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间（全抖动，避免大量请求同时重试）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def should_retry(self, exc: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_attempts - 1 or not self.classify(exc):
+            return False
+        budget = _current_budget.get()
+        if budget is not None and not budget.try_spend():
+            return False
+        return True
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        for attempt in range(self.max_attempts):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+# 所有上游请求共享的熔断器
+upstream_breaker = CircuitBreaker(
+    'upstream',
+    error_threshold=settings.circuit_breaker_error_threshold,
+    min_requests=settings.circuit_breaker_min_requests,
+    window=settings.circuit_breaker_window,
+    open_duration=settings.circuit_breaker_open_seconds,
+    half_open_calls=settings.circuit_breaker_half_open_calls
+)
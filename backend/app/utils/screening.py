@@ -0,0 +1,154 @@
+import pandas as pd
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import itertools
+import logging
+
+from app.utils.indicators import find_crosses
+from app.utils.panel import IndicatorPanel
+
+logger = logging.getLogger(__name__)
+
+# 筛选规则：基于前缀和，任意周期的均线在任意位置都是 O(1) 的两次相减，
+# 一次构建后可以评估多组周期参数（参数寻优），扫描器也使用同一套规则。
+
+class PrefixSums:
+    """面板各字段沿时间轴的前缀和（含有效K线计数），构建一次，复用于所有周期
+
+    Args:
+        panel: IndicatorPanel（右对齐，左侧补 NaN）
+        fields: 需要的字段
+    """
+
+    def __init__(self, panel: IndicatorPanel, fields: Iterable[str] = ('close', 'volume')):
+        self.panel = panel
+        self.codes = panel.codes
+        self.n_bars = panel.n_bars
+        self._sums: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, np.ndarray] = {}
+        self._valid: Dict[str, np.ndarray] = {}
+
+        for field in fields:
+            values = panel[field]
+            valid = ~np.isnan(values)
+            zeros = np.zeros((len(self.codes), 1))
+            self._sums[field] = np.hstack([zeros, np.cumsum(np.where(valid, values, 0.0), axis=1)])
+            self._counts[field] = np.hstack([zeros, np.cumsum(valid, axis=1)])
+            self._valid[field] = valid
+
+    def lengths(self, field: str) -> np.ndarray:
+        """每只股票的有效K线数量"""
+        return self._counts[field][:, -1].astype(int)
+
+    def last(self, field: str) -> np.ndarray:
+        return self.panel[field][:, -1]
+
+    def window_means(self, field: str, period: int, last: int = 1) -> np.ndarray:
+        """最近 last 根K线上的 period 周期均线，形状 (股票数, last)
+
+        与 calculate_ma 口径一致（min_periods=1）：不足 period 根时取已有K线的均值。
+        """
+        last = min(last, self.n_bars)
+        end = np.arange(self.n_bars - last + 1, self.n_bars + 1)
+        start = np.maximum(end - period, 0)
+
+        sums, counts = self._sums[field], self._counts[field]
+        total = sums[:, end] - sums[:, start]
+        count = counts[:, end] - counts[:, start]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+        mean[(count == 0) | ~self._valid[field][:, end - 1]] = np.nan
+        return mean
+
+    def mean(self, field: str, period: int) -> np.ndarray:
+        """最新一根K线上的 period 周期均线"""
+        return self.window_means(field, period, last=1)[:, 0]
+
+def weekly_trend_rule(
+    sums: PrefixSums,
+    ma_period: int,
+    vol_ma_period: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """周末扫描规则：收盘价 > N周均线 且 周成交量 > 周均量，至少需要 N 周数据
+
+    Returns:
+        (是否通过, 均线, 均量)
+    """
+    ma = sums.mean('close', ma_period)
+    vol_ma = sums.mean('volume', vol_ma_period)
+    passed = (
+        (sums.last('close') > ma) &
+        (sums.last('volume') > vol_ma) &
+        (sums.lengths('close') >= ma_period)
+    )
+    return passed, ma, vol_ma
+
+def volume_golden_cross_rule(
+    sums: PrefixSums,
+    short_period: int,
+    long_period: int,
+    days_back: int = 9,
+    min_bars: Optional[int] = None
+) -> np.ndarray:
+    """日筛选规则：短期均量在最近 days_back+1 根K线内上穿长期均量
+
+    Args:
+        min_bars: 至少需要的K线数，默认 long_period + 10
+    """
+    min_bars = long_period + 10 if min_bars is None else min_bars
+    short = sums.window_means('volume', short_period, last=days_back + 1)
+    long = sums.window_means('volume', long_period, last=days_back + 1)
+    return find_crosses(short, long, days_back=days_back) & (sums.lengths('volume') >= min_bars)
+
+# 分批计算函数：供 process_pool.map_batches 在子进程中调用，只接收和返回紧凑的数组/列表
+
+def weekly_trend_batch(
+    codes: List[str],
+    fields: Dict[str, np.ndarray],
+    ma_period: int,
+    vol_ma_period: int
+) -> Dict[str, list]:
+    """一批股票的周末扫描规则，返回 股票代码 -> [是否通过, 均线, 均量]"""
+    passed, ma, vol_ma = weekly_trend_rule(
+        PrefixSums(IndicatorPanel(codes, fields), ['close', 'volume']), ma_period, vol_ma_period
+    )
+    return {
+        code: [bool(passed[i]), float(ma[i]), float(vol_ma[i])]
+        for i, code in enumerate(codes)
+    }
+
+def volume_golden_cross_batch(
+    codes: List[str],
+    fields: Dict[str, np.ndarray],
+    short_period: int,
+    long_period: int,
+    days_back: int = 9
+) -> Dict[str, bool]:
+    """一批股票的均量线金叉规则，返回 股票代码 -> 是否金叉"""
+    has_cross = volume_golden_cross_rule(
+        PrefixSums(IndicatorPanel(codes, fields), ['volume']), short_period, long_period, days_back=days_back
+    )
+    return dict(zip(codes, has_cross.tolist()))
+
+def parameter_grid(**values: Iterable) -> List[Dict]:
+    """参数网格：parameter_grid(a=[1, 2], b=[3]) -> [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]"""
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*[list(values[n]) for n in names])]
+
+def sweep(
+    sums: PrefixSums,
+    rule: Callable[..., np.ndarray],
+    grid: List[Dict]
+) -> pd.DataFrame:
+    """对每组参数评估规则，返回 股票 × 参数组 的通过矩阵
+
+    列名形如 "ma_period=233,vol_ma_period=20"。
+    """
+    columns = {}
+    for params in grid:
+        result = rule(sums, **params)
+        passed = result[0] if isinstance(result, tuple) else result
+        label = ','.join(f"{k}={v}" for k, v in params.items())
+        columns[label] = passed
+
+    return pd.DataFrame(columns, index=pd.Index(sums.codes, name='code'))
@@ -0,0 +1,91 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import copy
+import functools
+import inspect
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """进程内请求合并：同一键的并发调用共享一次执行和同一个结果
+
+    第一个调用方真正执行请求，执行期间到达的相同键调用直接等待该结果，
+    请求结束后键即释放（不做缓存）。
+
+    Args:
+        name: 分组名称（用于指标）
+        copy_result: 复制结果的函数，每个调用方（包括发起方）都拿到各自的副本，
+            避免修改共享对象
+    """
+
+    def __init__(self, name: str, copy_result: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self.copy_result = copy_result
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 func，若同一键已有进行中的请求则等待其结果"""
+        loop = asyncio.get_running_loop()
+        future = self._calls.get(key)
+
+        if future is not None and future.get_loop() is loop:
+            self.deduplicated += 1
+        else:
+            self.calls += 1
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(functools.partial(self._forget, key))
+
+        # shield: 单个调用方被取消不影响其他等待者
+        result = await asyncio.shield(future)
+        return self.copy_result(result) if self.copy_result else result
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # 取出异常，避免没有等待者时产生 "exception was never retrieved" 警告
+            future.exception()
+
+    def stats(self) -> Dict:
+        total = self.calls + self.deduplicated
+        return {
+            'calls': self.calls,
+            'deduplicated': self.deduplicated,
+            'in_flight': len(self._calls),
+            'dedup_ratio': round(self.deduplicated / total, 4) if total else 0.0,
+        }
+
+def coalesce(group: SingleFlight, key_func: Callable[[Dict[str, Any]], Hashable]):
+    """装饰异步函数，按参数生成的键合并并发调用
+
+    Args:
+        key_func: 接收补全默认值后的参数字典，返回合并键
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = key_func(dict(bound.arguments))
+            return await group.do(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+def _copy_frame(result: Any) -> Any:
+    return result.copy() if hasattr(result, 'copy') else result
+
+# 行情数据请求（DataFetcher）
+fetch_flight = SingleFlight('fetch', copy_result=_copy_frame)
+
+# Redis缓存读取
+cache_flight = SingleFlight('cache', copy_result=copy.deepcopy)
+
+def singleflight_stats() -> Dict:
+    """各分组的合并统计"""
+    return {group.name: group.stats() for group in (fetch_flight, cache_flight)}
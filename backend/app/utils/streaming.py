@@ -0,0 +1,319 @@
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+from abc import ABC, abstractmethod
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 增量指标：每根新K线 O(1) 更新，状态可序列化后持久化（Redis），下次运行从断点续算。
+# 计算口径与 indicators.py 一致（RollingMean 对应 calculate_ma，EMA/MACD 对应 adjust=False）。
+
+class StreamingIndicator(ABC):
+    """增量指标基类"""
+
+    kind = ''
+
+    @abstractmethod
+    def update(self, value: float) -> Optional[Any]:
+        """输入一根新K线的值，返回最新指标值"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def peek(self, value: float) -> Optional[Any]:
+        """若下一根K线取 value 时的指标值，不改变状态（用于未走完的K线）"""
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def value(self) -> Optional[Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def params(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def state(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_state(self, state: Dict[str, Any]):
+        raise NotImplementedError
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'params': self.params(), 'state': self.state()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StreamingIndicator':
+        indicator_cls = INDICATOR_TYPES[data['kind']]
+        indicator = indicator_cls(**data['params'])
+        indicator.load_state(data['state'])
+        return indicator
+
+class RollingMean(StreamingIndicator):
+    """滑动均值（min_periods=1：不足 period 根时取已有K线的均值）
+
+    维护窗口内的值与滚动和，每根K线加入新值、移出最旧的值。
+    """
+
+    kind = 'rolling_mean'
+
+    # 每隔若干次更新按窗口重新求和，消除浮点累计误差
+    RESYNC_INTERVAL = 1000
+
+    def __init__(self, period: int):
+        self.period = period
+        self._window: deque = deque(maxlen=period)
+        self._sum = 0.0
+        self._updates = 0
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        if len(self._window) == self.period:
+            self._sum -= self._window[0]
+        self._window.append(value)
+        self._sum += value
+
+        self._updates += 1
+        if self._updates % self.RESYNC_INTERVAL == 0:
+            self._sum = math.fsum(self._window)
+        return self.value
+
+    def peek(self, value: float) -> float:
+        total = self._sum + float(value)
+        count = len(self._window) + 1
+        if len(self._window) == self.period:
+            total -= self._window[0]
+            count -= 1
+        return total / count
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._sum / len(self._window) if self._window else None
+
+    def params(self) -> Dict[str, Any]:
+        return {'period': self.period}
+
+    def state(self) -> Dict[str, Any]:
+        return {'window': list(self._window)}
+
+    def load_state(self, state: Dict[str, Any]):
+        self._window = deque((float(v) for v in state['window']), maxlen=self.period)
+        self._sum = math.fsum(self._window)
+
+class EMA(StreamingIndicator):
+    """指数移动平均（与 calculate_ema 一致，以第一根K线为初值）"""
+
+    kind = 'ema'
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self._value: Optional[float] = None
+
+    def _next(self, value: float) -> float:
+        if self._value is None:
+            return float(value)
+        return self._value + self.alpha * (float(value) - self._value)
+
+    def update(self, value: float) -> float:
+        self._value = self._next(value)
+        return self._value
+
+    def peek(self, value: float) -> float:
+        return self._next(value)
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._value
+
+    def params(self) -> Dict[str, Any]:
+        return {'period': self.period}
+
+    def state(self) -> Dict[str, Any]:
+        return {'value': self._value}
+
+    def load_state(self, state: Dict[str, Any]):
+        self._value = state['value']
+
+class MACD(StreamingIndicator):
+    """MACD（与 calculate_macd 一致）
+
+    Returns:
+        (macd, macd_signal, macd_hist)
+    """
+
+    kind = 'macd'
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        self.fast = EMA(fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+
+    def update(self, value: float) -> Tuple[float, float, float]:
+        line = self.fast.update(value) - self.slow.update(value)
+        signal = self.signal.update(line)
+        return line, signal, line - signal
+
+    def peek(self, value: float) -> Tuple[float, float, float]:
+        line = self.fast.peek(value) - self.slow.peek(value)
+        signal = self.signal.peek(line)
+        return line, signal, line - signal
+
+    @property
+    def value(self) -> Optional[Tuple[float, float, float]]:
+        if self.signal.value is None:
+            return None
+        line = self.fast.value - self.slow.value
+        return line, self.signal.value, line - self.signal.value
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            'fast_period': self.fast.period,
+            'slow_period': self.slow.period,
+            'signal_period': self.signal.period
+        }
+
+    def state(self) -> Dict[str, Any]:
+        return {'fast': self.fast.value, 'slow': self.slow.value, 'signal': self.signal.value}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.fast.load_state({'value': state['fast']})
+        self.slow.load_state({'value': state['slow']})
+        self.signal.load_state({'value': state['signal']})
+
+class WilderRSI(StreamingIndicator):
+    """RSI（Wilder 平滑）
+
+    前 period 个涨跌幅取简单平均作为初值，之后按 avg = (avg * (period - 1) + x) / period 递推。
+    注意与 calculate_rsi（涨跌幅的简单滑动均值）口径不同。
+    """
+
+    kind = 'wilder_rsi'
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self._prev: Optional[float] = None
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+        self._count = 0  # 已累计的涨跌幅个数
+
+    def _next(self, value: float) -> Tuple[Optional[float], float, float, int]:
+        value = float(value)
+        if self._prev is None:
+            return None, self._avg_gain, self._avg_loss, self._count
+
+        delta = value - self._prev
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        count = self._count + 1
+        if count <= self.period:
+            # 初始阶段累计简单平均
+            avg_gain = self._avg_gain + (gain - self._avg_gain) / count
+            avg_loss = self._avg_loss + (loss - self._avg_loss) / count
+        else:
+            avg_gain = (self._avg_gain * (self.period - 1) + gain) / self.period
+            avg_loss = (self._avg_loss * (self.period - 1) + loss) / self.period
+
+        if count < self.period:
+            return None, avg_gain, avg_loss, count
+        return self._rsi(avg_gain, avg_loss), avg_gain, avg_loss, count
+
+    @staticmethod
+    def _rsi(avg_gain: float, avg_loss: float) -> float:
+        if avg_loss == 0:
+            return 100.0 if avg_gain > 0 else 50.0
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+
+    def update(self, value: float) -> Optional[float]:
+        rsi, self._avg_gain, self._avg_loss, self._count = self._next(value)
+        self._prev = float(value)
+        return rsi
+
+    def peek(self, value: float) -> Optional[float]:
+        return self._next(value)[0]
+
+    @property
+    def value(self) -> Optional[float]:
+        if self._count < self.period:
+            return None
+        return self._rsi(self._avg_gain, self._avg_loss)
+
+    def params(self) -> Dict[str, Any]:
+        return {'period': self.period}
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            'prev': self._prev,
+            'avg_gain': self._avg_gain,
+            'avg_loss': self._avg_loss,
+            'count': self._count
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        self._prev = state['prev']
+        self._avg_gain = state['avg_gain']
+        self._avg_loss = state['avg_loss']
+        self._count = state['count']
+
+INDICATOR_TYPES = {
+    cls.kind: cls for cls in (RollingMean, EMA, MACD, WilderRSI)
+}
+
+class IndicatorState:
+    """单只股票的一组增量指标，以及已处理到的最后一根K线时间
+
+    Args:
+        indicators: 名称 -> 增量指标
+        last_time: 最后一根已计入的K线时间（ISO格式字符串）
+    """
+
+    def __init__(self, indicators: Dict[str, StreamingIndicator], last_time: Optional[str] = None):
+        self.indicators = indicators
+        self.last_time = last_time
+
+    def __getitem__(self, name: str) -> StreamingIndicator:
+        return self.indicators[name]
+
+    def is_new(self, bar_time: Any) -> bool:
+        """该K线是否尚未计入"""
+        return self.last_time is None or _iso(bar_time) > self.last_time
+
+    def update(self, bar_time: Any, values: Dict[str, float]) -> Dict[str, Any]:
+        """按名称输入新K线的值（如 {'vol_ma20': volume}），返回各指标最新值"""
+        result = {name: self.indicators[name].update(value) for name, value in values.items()}
+        self.last_time = _iso(bar_time)
+        return result
+
+    def catch_up(self, bars: Iterable[Tuple[Any, Dict[str, float]]]) -> list:
+        """依次计入错过的K线（跳过已计入的），返回 [(K线时间, 指标值)]"""
+        return [
+            (bar_time, self.update(bar_time, values))
+            for bar_time, values in bars
+            if self.is_new(bar_time)
+        ]
+
+    def matches(self, template: 'IndicatorState') -> bool:
+        """指标组合与参数是否与模板一致（参数调整后旧状态作废）"""
+        if self.indicators.keys() != template.indicators.keys():
+            return False
+        return all(
+            type(ind) is type(template.indicators[name]) and ind.params() == template.indicators[name].params()
+            for name, ind in self.indicators.items()
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'last_time': self.last_time,
+            'indicators': {name: ind.to_dict() for name, ind in self.indicators.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'IndicatorState':
+        return cls(
+            {name: StreamingIndicator.from_dict(d) for name, d in data['indicators'].items()},
+            data.get('last_time')
+        )
+
+def _iso(bar_time: Any) -> str:
+    return bar_time.isoformat() if hasattr(bar_time, 'isoformat') else str(bar_time)
@@ -0,0 +1,127 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+# 各运行器最近一次运行的统计（用于健康检查）
+_last_runs: Dict[str, Dict] = {}
+
+class BoundedRunner:
+    """有界并发运行器：始终保持最多 concurrency 个任务在执行，完成一个立即补充下一个
+
+    与按批 gather 不同，单个慢任务不会拖住其他任务；任务按需从输入中取出，
+    不会一开始就为全部股票创建任务。结果按完成顺序流式返回。
+
+    Args:
+        name: 运行器名称（用于日志和统计）
+        concurrency: 最大并发数
+        timeout: 单个任务超时（秒），超时记为失败，None 表示不限制
+    """
+
+    def __init__(self, name: str, concurrency: int, timeout: Optional[float] = None):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self._reset()
+
+    def _reset(self):
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.in_flight = 0
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    async def stream(
+        self,
+        items: Iterable,
+        func: Callable[[Any], Awaitable[Any]]
+    ) -> AsyncIterator[Tuple[Any, Any, Optional[BaseException]]]:
+        """并发执行 func(item)，按完成顺序产出 (item, 结果, 异常)
+
+        任务出错或超时时结果为 None、异常为对应错误。调用方被取消或生成器关闭时，
+        仍在执行的任务会被取消；需要中途 break 时用 contextlib.aclosing 包裹，
+        以便立即关闭生成器。
+        """
+        self._reset()
+        self._started_at = time.monotonic()
+        source = iter(items)
+        # 有界队列：消费方处理不过来时工作协程暂停，不会无限堆积结果
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def _worker():
+            for item in source:
+                self.in_flight += 1
+                try:
+                    if self.timeout is not None:
+                        result = await asyncio.wait_for(func(item), self.timeout)
+                    else:
+                        result = await func(item)
+                    outcome = (item, result, None)
+                except asyncio.TimeoutError as e:
+                    self.timed_out += 1
+                    outcome = (item, None, e)
+                except Exception as e:
+                    self.failed += 1
+                    outcome = (item, None, e)
+                finally:
+                    self.in_flight -= 1
+                await queue.put(outcome)
+            await queue.put(_DONE)
+
+        workers = [asyncio.create_task(_worker()) for _ in range(self.concurrency)]
+        running = len(workers)
+        try:
+            while running:
+                outcome = await queue.get()
+                if outcome is _DONE:
+                    running -= 1
+                    continue
+                self.completed += 1
+                yield outcome
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._finished_at = time.monotonic()
+            _last_runs[self.name] = self.stats()
+            self._log()
+
+    async def run(self, items: Iterable, func: Callable[[Any], Awaitable[Any]]) -> List[Tuple[Any, Any]]:
+        """执行全部任务，返回成功的 (item, 结果)，按完成顺序"""
+        results = []
+        async for item, result, error in self.stream(items, func):
+            if error is not None:
+                logger.error(f"{self.name}: {item} failed: {error!r}")
+                continue
+            results.append((item, result))
+        return results
+
+    def stats(self) -> Dict:
+        end = self._finished_at or time.monotonic()
+        elapsed = end - self._started_at if self._started_at else 0.0
+        return {
+            'concurrency': self.concurrency,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'in_flight': self.in_flight,
+            'elapsed': round(elapsed, 3),
+            'throughput': round(self.completed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def _log(self):
+        stats = _last_runs[self.name]
+        logger.info(
+            f"{self.name}: {stats['completed']} items in {stats['elapsed']:.2f}s "
+            f"({stats['throughput']}/s, concurrency {self.concurrency}), "
+            f"{stats['failed']} failed, {stats['timed_out']} timed out"
+        )
+
+def worker_pool_stats() -> Dict[str, Dict]:
+    """各运行器最近一次运行的统计"""
+    return dict(_last_runs)
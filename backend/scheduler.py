@@ -14,6 +14,7 @@ sys.path.insert(0, str(project_root))
 
 from app.scheduler.jobs import setup_scheduler, shutdown_scheduler
 from app.utils.helpers import setup_logging
+from app.utils.executor import shutdown_executor
 
 # 设置日志
 logger = setup_logging('scheduler')
@@ -62,6 +63,7 @@ async def main():
     finally:
         # 关闭调度器
         shutdown_scheduler()
+        shutdown_executor(wait=False)
         logger.info("Scheduler service stopped.")
 
 if __name__ == "__main__":
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+指标、检测器与筛选条件基准测试：在合成面板上测量吞吐量和峰值内存，
+可保存为 JSON 基线，并与基线比较，性能回退超过阈值时返回非零退出码（离线运行）。
+计时前先核对逐只股票与面板上的检测器结果一致。
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.utils import panel as panel_ops
+from app.utils.indicators import (
+    calculate_ma,
+    calculate_macd,
+    calculate_rsi,
+    calculate_bollinger_bands,
+    detect_golden_cross,
+    check_macd_red_bar_increase,
+    find_crosses,
+    rising_positive_streak,
+    bars_since_cross,
+)
+from app.utils.panel import IndicatorPanel
+from app.utils.screening import PrefixSums, weekly_trend_rule, volume_golden_cross_rule
+
+DEFAULT_BASELINE = project_root / 'data' / 'benchmarks' / 'indicators.json'
+
+# 检测器参数（与日筛选一致）
+DAYS_BACK = 9
+STREAK_DAYS = 2
+
+def make_panel(n_stocks: int, n_bars: int, seed: int = 42) -> IndicatorPanel:
+    """合成面板：对数正态收益的收盘价、对数正态成交量，约1/5的股票历史较短（左侧补 NaN）"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_stocks, n_bars)), axis=1))
+    volume = rng.lognormal(12, 0.6, (n_stocks, n_bars))
+
+    short = rng.random(n_stocks) < 0.2
+    starts = rng.integers(0, n_bars // 2, n_stocks)
+    for i in np.flatnonzero(short):
+        close[i, :starts[i]] = np.nan
+        volume[i, :starts[i]] = np.nan
+
+    codes = [f"{i:06d}" for i in range(n_stocks)]
+    return IndicatorPanel(codes, {'close': close, 'volume': volume})
+
+def _trimmed(values: np.ndarray, n: int) -> list:
+    """面板前 n 行去掉左侧补齐的 NaN，转为逐只股票的序列"""
+    return [pd.Series(row[~np.isnan(row)]) for row in values[:n]]
+
+def detector_inputs(panel: IndicatorPanel, series_sample: int) -> dict:
+    """检测器用例的输入：面板上的均量线、MACD柱，以及抽样股票的逐只序列"""
+    macd_hist = panel_ops.macd(panel['close'])['macd_hist']
+    vol_ma20 = panel_ops.rolling_mean(panel['volume'], 20)
+    vol_ma60 = panel_ops.rolling_mean(panel['volume'], 60)
+    return {
+        'macd_hist': macd_hist,
+        'vol_ma20': vol_ma20,
+        'vol_ma60': vol_ma60,
+        'sample_ma20': _trimmed(vol_ma20, series_sample),
+        'sample_ma60': _trimmed(vol_ma60, series_sample),
+        'sample_hist': _trimmed(macd_hist, series_sample),
+    }
+
+def check_detectors(inputs: dict) -> list:
+    """逐只股票与面板上的检测器结果应一致，返回不一致的检测器名称"""
+    n = len(inputs['sample_hist'])
+    per_stock_cross = [
+        detect_golden_cross(s, l, DAYS_BACK) for s, l in zip(inputs['sample_ma20'], inputs['sample_ma60'])
+    ]
+    panel_cross = find_crosses(inputs['vol_ma20'][:n], inputs['vol_ma60'][:n], DAYS_BACK).tolist()
+    per_stock_streak = [check_macd_red_bar_increase(h, STREAK_DAYS) for h in inputs['sample_hist']]
+    panel_streak = [
+        int(c) if c >= STREAK_DAYS else 0 for c in rising_positive_streak(inputs['macd_hist'][:n])
+    ]
+
+    mismatches = []
+    if per_stock_cross != panel_cross:
+        mismatches.append('golden_cross')
+    if per_stock_streak != panel_streak:
+        mismatches.append('red_bar_streak')
+    return mismatches
+
+def build_cases(panel: IndicatorPanel, series_sample: int, inputs: dict):
+    """基准用例：名称 -> (函数, 每次调用处理的K线数)"""
+    close = panel['close']
+    n_stocks, n_bars = panel.shape
+
+    # 逐只股票的 pandas 接口只取部分股票，避免大面板耗时过长
+    sample = _trimmed(close, series_sample)
+    sample_bars = sum(len(s) for s in sample)
+    detector_bars = sum(len(s) for s in inputs['sample_hist'])
+
+    macd_hist, vol_ma20, vol_ma60 = inputs['macd_hist'], inputs['vol_ma20'], inputs['vol_ma60']
+    sample_ma20, sample_ma60, sample_hist = inputs['sample_ma20'], inputs['sample_ma60'], inputs['sample_hist']
+    sums = PrefixSums(panel, ['close', 'volume'])
+    panel_bars = n_stocks * n_bars
+
+    return {
+        # 逐只股票（indicators.py，当前 INDICATOR_BACKEND）
+        'series.ma20': (lambda: [calculate_ma(s, 20) for s in sample], sample_bars),
+        'series.macd': (lambda: [calculate_macd(s) for s in sample], sample_bars),
+        'series.rsi14': (lambda: [calculate_rsi(s, 14) for s in sample], sample_bars),
+        'series.bollinger20': (lambda: [calculate_bollinger_bands(s, 20) for s in sample], sample_bars),
+        # 面板（全部股票一次计算）
+        'panel.ma233': (lambda: panel_ops.rolling_mean(close, 233), panel_bars),
+        'panel.ema12': (lambda: panel_ops.ewm_mean(close, 12), panel_bars),
+        'panel.macd': (lambda: panel_ops.macd(close), panel_bars),
+        'panel.rsi14': (lambda: panel_ops.rsi(close, 14), panel_bars),
+        'panel.bollinger20': (lambda: panel_ops.bollinger_bands(close, 20), panel_bars),
+        # 检测器：逐只股票 / 面板
+        'series.golden_cross': (
+            lambda: [detect_golden_cross(s, l, DAYS_BACK) for s, l in zip(sample_ma20, sample_ma60)],
+            detector_bars
+        ),
+        'series.red_bar_streak': (
+            lambda: [check_macd_red_bar_increase(h, STREAK_DAYS) for h in sample_hist], detector_bars
+        ),
+        'detect.golden_cross': (lambda: find_crosses(vol_ma20, vol_ma60, days_back=DAYS_BACK), panel_bars),
+        'detect.red_bar_streak': (lambda: rising_positive_streak(macd_hist), panel_bars),
+        'detect.bars_since_cross': (lambda: bars_since_cross(vol_ma20, vol_ma60), panel_bars),
+        # 筛选条件
+        'rule.prefix_sums': (lambda: PrefixSums(panel, ['close', 'volume']), panel_bars),
+        'rule.weekly_trend': (lambda: weekly_trend_rule(sums, 233, 20), panel_bars),
+        'rule.volume_golden_cross': (lambda: volume_golden_cross_rule(sums, 20, 60), panel_bars),
+    }
+
+def measure(func, repeat: int, min_time: float):
+    """返回 (每秒调用次数, 峰值内存MB)：计时取最快一次，峰值内存单独用 tracemalloc 测一次"""
+    func()  # 预热
+    best = float('inf')
+    runs = 0
+    started = time.perf_counter()
+    while runs < repeat or (time.perf_counter() - started < min_time and runs < repeat * 10):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+        runs += 1
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return 1.0 / best, peak / 1024 / 1024
+
+def run(args) -> tuple:
+    """返回 (结果, 检测器不一致项)"""
+    results = {}
+    mismatches = []
+    for n_stocks in args.stocks:
+        for n_bars in args.bars:
+            panel = make_panel(n_stocks, n_bars, args.seed)
+            inputs = detector_inputs(panel, min(args.series_sample, n_stocks))
+            mismatches.extend(f"{name}@{n_stocks}x{n_bars}" for name in check_detectors(inputs))
+            cases = build_cases(panel, min(args.series_sample, n_stocks), inputs)
+            for name, (func, bars) in cases.items():
+                if args.only and not any(pattern in name for pattern in args.only):
+                    continue
+                ops, peak_mb = measure(func, args.repeat, args.min_time)
+                key = f"{name}@{n_stocks}x{n_bars}"
+                results[key] = {
+                    'ops_per_sec': round(ops, 3),
+                    'bars_per_sec': round(ops * bars, 1),
+                    'peak_mb': round(peak_mb, 3),
+                }
+                print(f"{key:<44}{ops:>12.2f} ops/s{ops * bars / 1e6:>10.1f} Mbar/s{peak_mb:>10.1f} MB")
+            del panel, inputs, cases
+            gc.collect()
+    return results, mismatches
+
+def compare(results: dict, baseline: dict, threshold: float, memory_threshold: float) -> list:
+    """与基线比较，返回回退项描述"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if current['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+            change = current['ops_per_sec'] / base['ops_per_sec'] - 1
+            regressions.append(f"{key}: throughput {change:+.1%} ({base['ops_per_sec']} -> {current['ops_per_sec']} ops/s)")
+        # 很小的分配量波动不计入
+        if current['peak_mb'] > max(base['peak_mb'] * (1 + memory_threshold), base['peak_mb'] + 1.0):
+            change = current['peak_mb'] / base['peak_mb'] - 1 if base['peak_mb'] else float('inf')
+            regressions.append(f"{key}: peak memory {change:+.1%} ({base['peak_mb']} -> {current['peak_mb']} MB)")
+    return regressions
+
+def _sizes(value: str):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description='指标与筛选条件基准测试')
+    parser.add_argument('--stocks', type=_sizes, default=[100, 1000, 5000], help='股票数量，逗号分隔')
+    parser.add_argument('--bars', type=_sizes, default=[250, 2500], help='K线数量，逗号分隔')
+    parser.add_argument('--series-sample', type=int, default=200, help='逐只股票接口测试的股票数')
+    parser.add_argument('--only', action='append', help='只运行名称包含该字符串的用例（可多次指定）')
+    parser.add_argument('--repeat', type=int, default=5, help='最少重复次数（取最快）')
+    parser.add_argument('--min-time', type=float, default=0.5, help='每个用例最少计时秒数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help='基线文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基线文件')
+    parser.add_argument('--require-baseline', action='store_true', help='基线文件不存在或没有可比较的用例时返回非零退出码')
+    parser.add_argument('--threshold', type=float, default=0.2, help='吞吐量下降超过该比例视为回退')
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help='峰值内存增加超过该比例视为回退')
+    args = parser.parse_args()
+
+    print(f"Indicator backend: {settings.indicator_backend}, numpy {np.__version__}, pandas {pd.__version__}")
+    results, mismatches = run(args)
+    if mismatches:
+        print(f"\nPer-stock and panel detectors disagree: {', '.join(mismatches)}")
+        sys.exit(1)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        existing = {}
+        if args.baseline.exists():
+            existing = json.loads(args.baseline.read_text()).get('results', {})
+        existing.update(results)
+        args.baseline.write_text(json.dumps({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'indicator_backend': settings.indicator_backend,
+            },
+            'results': existing,
+        }, indent=2, ensure_ascii=False))
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline first")
+        sys.exit(2 if args.require_baseline else 0)
+
+    baseline = json.loads(args.baseline.read_text())['results']
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+    compared = len(set(results) & set(baseline))
+    if args.require_baseline and not compared:
+        print(f"\nNo cases in {args.baseline} match this run")
+        sys.exit(2)
+    if regressions:
+        print(f"\n{len(regressions)} regressions against {args.baseline} ({compared} cases compared):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline} ({compared} cases compared)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+指标后端一致性检查：各后端（numpy、talib）与 pandas 基准口径逐项比对，
+包括 calculate_ma 的 min_periods=1 预热段；可选输出各后端吞吐量
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils.indicator_backends import BACKENDS, available_backends
+from app.utils.indicators import (
+    calculate_ma,
+    calculate_ema,
+    calculate_macd,
+    calculate_rsi,
+    calculate_bollinger_bands,
+    calculate_volatility,
+    calculate_volume_ma,
+)
+
+REFERENCE = 'pandas'
+
+# 指标名 -> (计算函数, 周期参数列表)
+CHECKS = {
+    'ma': (lambda s, p, b: calculate_ma(s, p, backend=b), [1, 5, 20, 60, 233]),
+    'volume_ma': (lambda s, p, b: calculate_volume_ma(s, p, backend=b), [20, 60]),
+    'ema': (lambda s, p, b: calculate_ema(s, p, backend=b), [1, 2, 5, 12, 26, 233]),
+    'macd': (lambda s, p, b: calculate_macd(s, backend=b), [None]),
+    'rsi': (lambda s, p, b: calculate_rsi(s, p, backend=b), [6, 14]),
+    'bollinger': (lambda s, p, b: calculate_bollinger_bands(s, p, backend=b), [20]),
+    'volatility': (lambda s, p, b: calculate_volatility(s, p, backend=b), [20]),
+}
+
+def _series_cases(rng: np.random.Generator):
+    """测试序列：覆盖短于周期的预热段、平盘、整数成交量等情况"""
+    cases = {}
+    for length in (1, 2, 10, 59, 60, 61, 300, 1500):
+        cases[f'price_{length}'] = pd.Series(rng.normal(0, 1, length).cumsum() + 50)
+    cases['volume_300'] = pd.Series(rng.integers(1_000, 10_000_000, 300).astype('float64'))
+    cases['flat_100'] = pd.Series(np.full(100, 10.0))
+    cases['limit_moves_300'] = pd.Series(10 * np.cumprod(1 + rng.choice([-0.1, 0.0, 0.1], 300)))
+
+    # 缺失值：中间零散缺失、连续缺失（停牌）、开头缺失（上市前）
+    gaps = pd.Series(rng.normal(0, 1, 300).cumsum() + 50)
+    gaps[rng.random(300) < 0.05] = np.nan
+    gaps[120:135] = np.nan
+    cases['interior_nan_300'] = gaps
+    leading = pd.Series(rng.normal(0, 1, 300).cumsum() + 50)
+    leading[:40] = np.nan
+    cases['leading_nan_300'] = leading
+    cases['all_nan_30'] = pd.Series(np.full(30, np.nan))
+
+    # 停牌日成交量为0
+    volume = pd.Series(rng.integers(1_000, 10_000_000, 300).astype('float64'))
+    volume[100:130] = 0.0
+    volume[rng.random(300) < 0.03] = 0.0
+    cases['suspended_volume_300'] = volume
+    return cases
+
+def _as_frame(result) -> pd.DataFrame:
+    return result.to_frame() if isinstance(result, pd.Series) else result
+
+def compare(expected, actual, rtol: float, atol: float) -> str:
+    """比较两个结果，一致返回空字符串，否则返回差异描述"""
+    expected, actual = _as_frame(expected), _as_frame(actual)
+    if expected.shape != actual.shape:
+        return f"shape {actual.shape} != {expected.shape}"
+
+    exp = expected.to_numpy(dtype='float64')
+    act = actual.to_numpy(dtype='float64')
+    nan_diff = np.isnan(exp) != np.isnan(act)
+    if nan_diff.any():
+        return f"NaN positions differ at {int(np.argmax(nan_diff.any(axis=1)))}"
+
+    valid = ~np.isnan(exp)
+    if not np.allclose(act[valid], exp[valid], rtol=rtol, atol=atol):
+        diff = np.abs(act[valid] - exp[valid]).max()
+        return f"max abs diff {diff:.3g}"
+    return ''
+
+def check_parity(backends, rtol: float, atol: float) -> int:
+    rng = np.random.default_rng(7)
+    cases = _series_cases(rng)
+    failures = 0
+
+    for backend in backends:
+        checked = 0
+        for indicator, (func, periods) in CHECKS.items():
+            for period in periods:
+                for case_name, series in cases.items():
+                    expected = func(series, period, REFERENCE)
+                    actual = func(series, period, backend)
+                    error = compare(expected, actual, rtol, atol)
+                    checked += 1
+                    if error:
+                        failures += 1
+                        print(f"FAIL {backend:<8}{indicator}({period}) on {case_name}: {error}")
+        print(f"{backend:<8}{checked} checks against {REFERENCE}")
+
+    return failures
+
+def benchmark(backends, n_series: int, n_bars: int, repeat: int):
+    rng = np.random.default_rng(11)
+    series = [pd.Series(rng.normal(0, 1, n_bars).cumsum() + 50) for _ in range(n_series)]
+    period_for = {'macd': None, 'rsi': 14, 'ema': 12}
+
+    print(f"\nThroughput: {n_series} series x {n_bars} bars, best of {repeat} (million bars/s)")
+    print(f"{'indicator':<12}" + ''.join(f"{b:>10}" for b in [REFERENCE] + backends))
+    for indicator, (func, periods) in CHECKS.items():
+        period = period_for.get(indicator, periods[-1] if periods[-1] else None)
+        row = f"{indicator:<12}"
+        for backend in [REFERENCE] + backends:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for s in series:
+                    func(s, period, backend)
+                best = min(best, time.perf_counter() - start)
+            row += f"{n_series * n_bars / best / 1e6:>10.2f}"
+        print(row)
+
+def main():
+    parser = argparse.ArgumentParser(description='指标后端一致性检查')
+    parser.add_argument('--backend', action='append', help='只检查指定后端（可多次指定）')
+    parser.add_argument('--rtol', type=float, default=1e-9)
+    parser.add_argument('--atol', type=float, default=1e-8)
+    parser.add_argument('--benchmark', action='store_true', help='输出各后端吞吐量')
+    parser.add_argument('--series', type=int, default=500, help='基准测试的序列数')
+    parser.add_argument('--bars', type=int, default=1000, help='基准测试每个序列的K线数')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    availability = available_backends()
+    requested = args.backend or [name for name in BACKENDS if name != REFERENCE]
+    backends = []
+    for name in requested:
+        if name not in BACKENDS:
+            parser.error(f"unknown backend {name}, available: {sorted(BACKENDS)}")
+        if not availability[name]:
+            # 明确指定的后端未安装视为失败（CI 中不能静默跳过）
+            if args.backend:
+                parser.error(f"backend {name} is not installed")
+            print(f"SKIP {name}: not installed")
+            continue
+        backends.append(name)
+
+    failures = check_parity(backends, args.rtol, args.atol)
+    if args.benchmark:
+        benchmark(backends, args.series, args.bars, args.repeat)
+
+    if failures:
+        print(f"\n{failures} parity failures")
+        sys.exit(1)
+    print("\nAll backends agree")
+
+if __name__ == "__main__":
+    main()
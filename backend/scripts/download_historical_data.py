@@ -3,6 +3,7 @@
 下载历史数据
 """
 
+import argparse
 import asyncio
 import sys
 from pathlib import Path
@@ -17,21 +18,23 @@ from app.database import AsyncSessionLocal
 from app.models.stock import Stock, DailyKline, WeeklyKline
 from app.utils.helpers import setup_logging
 from app.utils.indicators import calculate_ma
+from app.services.kline_sync import KlineSyncer
+from app.services.daily_scanner import DailyScanner
+from app.utils.redis_client import get_redis
+from app.services.market_data import get_provider
 
 logger = setup_logging('download_historical_data')
 
 async def download_daily_data(stock_code: str, days: int = 365):
     """下载日线数据"""
     try:
-        import akshare as ak
-
         logger.info(f"Downloading daily data for {stock_code}...")
 
         # 获取日线数据
         end_date = datetime.now().strftime("%Y%m%d")
         start_date = (datetime.now() - timedelta(days=days)).strftime("%Y%m%d")
 
-        df = ak.stock_zh_a_hist(
+        df = get_provider().stock_zh_a_hist(
             symbol=stock_code,
             period="daily",
             start_date=start_date,
@@ -56,11 +59,7 @@ async def download_daily_data(stock_code: str, days: int = 365):
         # 转换日期格式
         df['trade_date'] = pd.to_datetime(df['trade_date']).dt.date
 
-        # 计算均量线
-        df['vol_ma20'] = calculate_ma(df['volume'], 20)
-        df['vol_ma60'] = calculate_ma(df['volume'], 60)
-
-        # 转换为字典列表
+        # 转换为字典列表（均量线由 DailyScanner.update_daily_klines 统一计算）
         records = []
         for _, row in df.iterrows():
             records.append({
@@ -71,8 +70,8 @@ async def download_daily_data(stock_code: str, days: int = 365):
                 'high': row['high'],
                 'low': row['low'],
                 'volume': int(row['volume']),
-                'vol_ma20': int(row['vol_ma20']) if not pd.isna(row['vol_ma20']) else None,
-                'vol_ma60': int(row['vol_ma60']) if not pd.isna(row['vol_ma60']) else None
+                'vol_ma20': None,
+                'vol_ma60': None
             })
 
         return records
@@ -84,12 +83,10 @@ async def download_daily_data(stock_code: str, days: int = 365):
 async def download_weekly_data(stock_code: str, weeks: int = 104):
     """下载周线数据"""
     try:
-        import akshare as ak
-
         logger.info(f"Downloading weekly data for {stock_code}...")
 
         # 获取周线数据
-        df = ak.stock_zh_a_hist(
+        df = get_provider().stock_zh_a_hist(
             symbol=stock_code,
             period="weekly",
             adjust="qfq"
@@ -229,15 +226,41 @@ async def download_all_stocks():
                 # 短暂休眠，避免请求过快
                 await asyncio.sleep(1)
 
+            # 计算日线均量线
+            await DailyScanner(db, await get_redis()).update_daily_klines()
+
             logger.info("Historical data download completed")
 
         except Exception as e:
             logger.error(f"Error downloading historical data: {e}")
             raise
 
+async def sync_all_stocks():
+    """增量同步：只下载每只股票最后一根K线之后的数据"""
+    logger.info("Starting incremental kline sync...")
+
+    async with AsyncSessionLocal() as db:
+        syncer = KlineSyncer(db)
+        daily_count = await syncer.sync_daily()
+        weekly_count = await syncer.sync_weekly()
+        await DailyScanner(db, await get_redis()).update_daily_klines()
+
+    logger.info(f"Incremental sync completed: {daily_count} daily, {weekly_count} weekly klines")
+
 async def main():
     """主函数"""
-    await download_all_stocks()
+    parser = argparse.ArgumentParser(description="下载历史数据")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量同步模式，只获取数据库中缺失的K线"
+    )
+    args = parser.parse_args()
+
+    if args.incremental:
+        await sync_all_stocks()
+    else:
+        await download_all_stocks()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -14,6 +14,7 @@ sys.path.insert(0, str(project_root))
 from app.database import AsyncSessionLocal
 from app.models.stock import Stock
 from app.utils.helpers import setup_logging
+from app.services.market_data import get_provider
 
 logger = setup_logging('init_stock_list')
 
@@ -22,11 +23,10 @@ async def init_stock_list():
     logger.info("Starting stock list initialization...")
 
     try:
-        import akshare as ak
-
         # 获取A股列表
-        logger.info("Fetching stock list from AKShare...")
-        stock_info = ak.stock_zh_a_spot_em()
+        provider = get_provider()
+        logger.info(f"Fetching stock list from {provider.name}...")
+        stock_info = provider.stock_zh_a_spot_em()
 
         if stock_info.empty:
             logger.error("Failed to fetch stock list")
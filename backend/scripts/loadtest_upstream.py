@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+上游限流器压测：本地模拟上游（注入延迟、失败和限流），观察AIMD并发调整
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils.executor import run_blocking, shutdown_executor
+from app.utils.rate_limiter import UpstreamLimiter
+from app.utils.helpers import setup_logging
+
+logger = setup_logging('loadtest_upstream')
+
+class FakeUpstream:
+    """模拟上游数据源
+
+    - latency/jitter: 每次请求的延迟（秒）
+    - failure_rate: 随机失败概率
+    - capacity: 上游可承受的并发数，超过时返回限流错误
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        failure_rate: float = 0.01,
+        capacity: int = 6,
+        seed: int = 42
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.capacity = capacity
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def __call__(self, stock_code: str) -> str:
+        with self._lock:
+            self._in_flight += 1
+            overloaded = self._in_flight > self.capacity
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.failure_rate
+
+        try:
+            # 过载时延迟变大并返回限流错误
+            time.sleep(delay * (3 if overloaded else 1))
+            if overloaded:
+                raise RuntimeError("429 Too Many Requests")
+            if failed:
+                raise RuntimeError("502 Bad Gateway")
+            return stock_code
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+async def run_loadtest(args):
+    upstream = FakeUpstream(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        capacity=args.capacity
+    )
+    limiter = UpstreamLimiter(
+        rate=args.rate,
+        burst=args.burst,
+        initial_concurrency=args.initial_concurrency,
+        max_concurrency=args.max_concurrency
+    )
+
+    async def _request(i: int):
+        try:
+            await limiter.call(lambda: run_blocking(
+                upstream, f"{i:06d}", call_timeout=args.timeout, limited=False
+            ))
+        except Exception:
+            pass
+
+    async def _report(stop: asyncio.Event):
+        while not stop.is_set():
+            await asyncio.sleep(1)
+            logger.info(f"metrics: {limiter.metrics()}")
+
+    stop = asyncio.Event()
+    reporter = asyncio.create_task(_report(stop))
+
+    started = time.monotonic()
+    await asyncio.gather(*[_request(i) for i in range(args.requests)])
+    elapsed = time.monotonic() - started
+
+    stop.set()
+    await reporter
+
+    metrics = limiter.metrics()
+    logger.info(f"Completed {args.requests} requests in {elapsed:.2f}s "
+                f"({args.requests / elapsed:.1f} req/s)")
+    logger.info(f"Final metrics: {metrics}")
+    shutdown_executor()
+    return metrics
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="上游限流器压测")
+    parser.add_argument("--requests", type=int, default=1000, help="请求总数")
+    parser.add_argument("--rate", type=float, default=100.0, help="令牌桶速率（每秒）")
+    parser.add_argument("--burst", type=float, default=100.0, help="令牌桶容量")
+    parser.add_argument("--initial-concurrency", type=int, default=2)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="上游平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="延迟抖动（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="随机失败概率")
+    parser.add_argument("--capacity", type=int, default=6, help="上游可承受并发数")
+    parser.add_argument("--timeout", type=float, default=2.0, help="单次调用超时（秒）")
+    parser.add_argument("--max-error-rate", type=float, default=None,
+                        help="整体错误率超过该值时退出码非零（用于CI）")
+    args = parser.parse_args()
+
+    metrics = asyncio.run(run_loadtest(args))
+
+    if args.max_error_rate is not None:
+        error_rate = metrics['total_errors'] / max(metrics['total_requests'], 1)
+        if error_rate > args.max_error_rate:
+            logger.error(f"Error rate {error_rate:.3f} exceeds {args.max_error_rate}")
+            sys.exit(1)
+        logger.info(f"Error rate {error_rate:.3f} within {args.max_error_rate}")
+
+if __name__ == "__main__":
+    main()
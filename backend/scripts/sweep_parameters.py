@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+筛选参数寻优：一次读取K线，评估多组均线周期参数，输出 股票 × 参数组 的通过矩阵
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.database import AsyncSessionLocal
+from app.services.parameter_sweep import ParameterSweep
+from app.utils.helpers import setup_logging
+
+logger = setup_logging('sweep_parameters')
+
+def _periods(value: str):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+async def run_sweep(args):
+    async with AsyncSessionLocal() as db:
+        sweeper = ParameterSweep(db)
+        if args.type == 'weekly':
+            matrix = await sweeper.sweep_weekly(args.ma, args.vol_ma)
+        else:
+            matrix = await sweeper.sweep_daily(args.short, args.long, days_back=args.days_back)
+
+    counts = matrix.sum().sort_values(ascending=False)
+    print(f"{len(matrix)} stocks, {len(matrix.columns)} parameter sets")
+    for label, count in counts.items():
+        print(f"{label:<40}{int(count):>8}")
+
+    if args.output:
+        matrix.astype(int).to_csv(args.output)
+        print(f"Pass/fail matrix written to {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description='筛选参数寻优')
+    parser.add_argument('--type', choices=['weekly', 'daily'], default='weekly')
+    parser.add_argument('--ma', type=_periods, default=[144, 233, 250], help='周均线周期，逗号分隔')
+    parser.add_argument('--vol-ma', type=_periods, default=[10, 20, 30], help='周均量周期，逗号分隔')
+    parser.add_argument('--short', type=_periods, default=[5, 10, 20], help='日短期均量周期，逗号分隔')
+    parser.add_argument('--long', type=_periods, default=[30, 60, 120], help='日长期均量周期，逗号分隔')
+    parser.add_argument('--days-back', type=int, default=9, help='金叉检查最近N根')
+    parser.add_argument('--output', help='通过矩阵输出路径（CSV）')
+    args = parser.parse_args()
+
+    asyncio.run(run_sweep(args))
+
+if __name__ == "__main__":
+    main()
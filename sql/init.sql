@@ -4,10 +4,14 @@ CREATE TABLE IF NOT EXISTS stocks (
     code VARCHAR(10) UNIQUE NOT NULL,
     name VARCHAR(50) NOT NULL,
     market VARCHAR(10),  -- 'SH' or 'SZ'
+    list_date DATE,      -- 上市日期
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 已有数据库补充上市日期列
+ALTER TABLE stocks ADD COLUMN IF NOT EXISTS list_date DATE;
+
 -- 2. 周线数据表
 CREATE TABLE IF NOT EXISTS weekly_klines (
     id SERIAL PRIMARY KEY,
@@ -24,6 +28,22 @@ CREATE TABLE IF NOT EXISTS weekly_klines (
     FOREIGN KEY (stock_code) REFERENCES stocks(code)
 );
 
+-- 2b. 周末扫描通过阈值表（由本周之前的周线预先计算）
+CREATE TABLE IF NOT EXISTS weekly_thresholds (
+    stock_code VARCHAR(10) PRIMARY KEY,
+    week_start DATE NOT NULL,          -- 阈值适用的周（周一）
+    base_date DATE NOT NULL,           -- 计算所用最后一根周线的日期
+    base_close DECIMAL(10,2),          -- 计算时 base_date 的日线收盘价（复权基准）
+    history_weeks INT,                 -- 计算所用的周线数量
+    close_threshold DECIMAL(12,4),     -- 前232周收盘价之和 / 232，历史不足时为空
+    volume_threshold DECIMAL(20,2),    -- 前19周成交量之和 / 19
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (stock_code) REFERENCES stocks(code)
+);
+
+-- 已有数据库补充复权基准列
+ALTER TABLE weekly_thresholds ADD COLUMN IF NOT EXISTS base_close DECIMAL(10,2);
+
 -- 3. 日线数据表
 CREATE TABLE IF NOT EXISTS daily_klines (
     id SERIAL PRIMARY KEY,